@@ -1,31 +1,27 @@
 # -*- coding: utf-8 -*-
-"""CLI principale: view/import/reset-included/set-target/export.
+"""CLI principale: view/import/reset-included/set-target/apply/export/render/fleet-pull.
 Se lanci senza subcomando, parte "view" di default.
+
+Gli import dei moduli pesanti stanno nei rami dei subcomandi: matplotlib, plot_view
+(ftplib, Tk) solo per "view", ftp_pull per "fleet-pull", dbio/parser solo dove servono; così i comandi sul DB
+partono senza il costo del viewer (controllo: bench.py startup).
+
+--profile stampa i tempi per fase (perf.py) a fine comando, --profile-json li scrive
+in un file, --profile-pstats aggiunge un dump cProfile (da leggere con pstats).
 """
 import argparse
 from pathlib import Path
 import sys
-import matplotlib.pyplot as plt
 
 import config as CFG
-from util_paths import auto_pick_file
-from recipe_parser import parse_recipe_indexed
-from recipe import load_io_recipe, load_grid_recipe
-from plot_view import (
-    view_from_file,
-    ensure_local_grid_recipe_pulled,
-    ensure_local_io_recipe_pulled,
-)
-
-from dbio import (
-    init_db, import_recipe_to_db,
-    reset_included, set_target_value,
-    export_recipe_from_db,
-)
+import perf
 
 
 def cli():
     ap = argparse.ArgumentParser(prog="gps_grid")
+    ap.add_argument("--profile", action="store_true", help="Stampa i tempi per fase a fine comando")
+    ap.add_argument("--profile-json", metavar="FILE", help="Scrive i tempi per fase in JSON")
+    ap.add_argument("--profile-pstats", metavar="FILE", help="Dump cProfile (pstats) dell'intero comando")
     sub = ap.add_subparsers(dest="cmd")  # non-required: gestiamo default noi
 
     # view
@@ -41,6 +37,8 @@ def cli():
     p_imp.add_argument("path", help="File ricetta GRIGLIA (.txtrecipe / .txrtrecipe)")
     p_imp.add_argument("--db", default="workspace.sqlite", help="Percorso DB (default: workspace.sqlite)")
     p_imp.add_argument("--io", help="(Facoltativo) File IO.txtrecipe da unire all'import")
+    p_imp.add_argument("--incremental", action="store_true",
+                       help="Aggiorna solo righe/celle cambiate e tiene le modifiche locali (conflitti segnalati)")
 
     # reset-included
     p_reset = sub.add_parser("reset-included", help="Imposta Included=FALSE su un set di celle già presenti nel file")
@@ -55,11 +53,37 @@ def cli():
     p_set.add_argument("--coords", required=True, help="Lista 'x,y;x,y;...'")
     p_set.add_argument("--value", required=True, type=float, help="Valore in cm")
 
+    # apply
+    p_app = sub.add_parser("apply", help="Applica un file CSV/JSONL di operazioni (reset-included, set-included, set-target)")
+    p_app.add_argument("path", help="File .csv (op,x,y,value) o .jsonl ({\"op\",\"x\",\"y\",\"value\"})")
+    p_app.add_argument("--db", default="workspace.sqlite")
+    p_app.add_argument("--batch", type=int, default=5000, help="Operazioni per transazione (default: 5000)")
+    p_app.add_argument("--strict", action="store_true",
+                       help="Tutto o niente: se un'operazione non è valida non si applica nulla")
+
     # export
     p_exp = sub.add_parser("export", help="Esporta file ricetta fedele all'originale con le modifiche da DB")
     p_exp.add_argument("--db", default="workspace.sqlite")
     p_exp.add_argument("--out", default="edited.txtrecipe")
 
+    # render
+    p_ren = sub.add_parser("render", help="Immagini PNG/SVG di una o più ricette GRID senza viewer (Agg, niente FTP/Tk)")
+    p_ren.add_argument("paths", nargs="+", help="File ricetta GRIGLIA (anche backup GPS_Grid_<timestamp>)")
+    p_ren.add_argument("--io", help="File IO per tutte le griglie (default: cercato accanto a ogni griglia)")
+    p_ren.add_argument("--out-dir", help="Cartella delle immagini (default: accanto a ogni griglia)")
+    p_ren.add_argument("--format", choices=("png", "svg"), help="Formato (default: RENDER_FORMAT)")
+    p_ren.add_argument("--dpi", type=float, help="Risoluzione (default: RENDER_DPI)")
+    p_ren.add_argument("--workers", type=int, help="Processi in parallelo (default: RENDER_WORKERS, 0 = uno per CPU)")
+    p_ren.add_argument("--overlays", help="Numeri nelle celle: lettere p (Path_Index), l (Last_Depth), t (Target_Depth); "
+                                          "'' per nessuno (default: SHOW_* di config)")
+
+    # fleet-pull
+    p_fleet = sub.add_parser("fleet-pull", help="Pull GRID+IO da tutti i PLC dell'inventario in parallelo, con riepilogo")
+    p_fleet.add_argument("names", nargs="*", help="Solo queste macchine (default: tutte)")
+    p_fleet.add_argument("--inventory", help="File JSON delle macchine (default: FLEET_INVENTORY o FLEET_MACHINES)")
+    p_fleet.add_argument("--workers", type=int, help="Macchine in parallelo (default: FLEET_WORKERS)")
+    p_fleet.add_argument("--force", action="store_true", help="Scarica sempre (niente salto via SIZE/MDTM)")
+
     return ap.parse_args()
 
 
@@ -89,25 +113,29 @@ def _pick_view_paths(path_arg, args):
     if getattr(args, "no_ftp", False):
         want_ftp = False
 
+    # Pull FTP: GRIGLIA (se non passata a mano) e IO in una sola sessione
+    which = ("IO",) if path_arg else ("GRID", "IO")
+    pulled = {}
+    if want_ftp:
+        try:
+            from plot_view import ensure_local_recipes_pulled
+            pulled = ensure_local_recipes_pulled(which, silent=False, popup=True, parent_tk=None)
+        except Exception:
+            pulled = {}
+
     # 1) GRID path
+    from util_paths import auto_pick_file
     if path_arg:  # passato a mano: è il file GRIGLIA
         grid_path = Path(path_arg)
+    elif "GRID" in pulled:
+        grid_path = Path(pulled["GRID"])
     else:
-        if want_ftp:
-            try:
-                grid_path = Path(ensure_local_grid_recipe_pulled(silent=False, popup=True, parent_tk=None))
-            except Exception:
-                grid_path = auto_pick_file("GPS_Grid.txtrecipe")
-        else:
-            grid_path = auto_pick_file("GPS_Grid.txtrecipe")
+        grid_path = auto_pick_file("GPS_Grid.txtrecipe")
 
     # 2) IO path
     io_filename = getattr(CFG, "LOCAL_IO_RECIPE_FILENAME", "IO.txtrecipe")
-    if want_ftp:
-        try:
-            io_path = Path(ensure_local_io_recipe_pulled(silent=False, popup=True, parent_tk=None))
-        except Exception:
-            io_path = auto_pick_file(io_filename)
+    if "IO" in pulled:
+        io_path = Path(pulled["IO"])
     else:
         io_path = auto_pick_file(io_filename)
 
@@ -120,76 +148,153 @@ def _pick_view_path(path_arg, args):
     return grid_path
 
 
+def _profile_done(args, prof):
+    if prof is not None:
+        prof.disable(); prof.dump_stats(args.profile_pstats)
+        print(f"[profile] cProfile salvato in {args.profile_pstats}")
+    if args.profile_json:
+        perf.write_json(args.profile_json)
+        print(f"[profile] Tempi per fase salvati in {args.profile_json}")
+    if args.profile or not args.profile_json:
+        perf.print_report()
+
+
 def main():
     args = cli()
+    profiling = bool(args.profile or args.profile_json or args.profile_pstats)
+    prof = None
+    if profiling:
+        perf.enable()
+        if args.profile_pstats:
+            import cProfile
+            prof = cProfile.Profile(); prof.enable()
+    try:
+        _run(args)
+    finally:
+        if profiling:
+            _profile_done(args, prof)
+
 
+def _run(args):
     try:
         # DEFAULT: se nessun subcomando, apri il viewer
         if args.cmd is None or args.cmd == "view":
             path_arg = getattr(args, "path", None)
+            import matplotlib.pyplot as plt
+            from plot_view import view_from_file
+            from recipe import load_io_recipe, load_grid_recipe
 
             # Scegli i due file
             io_path, grid_path = _pick_view_paths(path_arg, args)
             print(f"[view] IO:   {io_path}")
             print(f"[view] GRID: {grid_path}")
 
-            # Carica separatamente e unisci
+            # Carica separatamente: parametri IO + griglia colonnare
             io_only = load_io_recipe(str(io_path))  # solo IO.GPS.Cfg/Vis/Sts.*
-            grid_only, lines, key_to_line = load_grid_recipe(str(grid_path))  # solo GVL.GPS_Grid_data[..]
-
-            merged = {}
-            merged.update(io_only)
-            merged.update(grid_only)
+            grid, lines, key_to_line = load_grid_recipe(str(grid_path))  # solo GVL.GPS_Grid_data[..]
 
             # Apri il viewer passando RIGHE/MAPPA del SOLO file GRIGLIA (edit sicuri)
-            view_from_file(merged, lines, key_to_line, str(grid_path))
+            view_from_file(io_only, lines, key_to_line, str(grid_path), grid=grid, io_path=str(io_path))
             plt.show()
             return
 
         if args.cmd == "import":
-            print(f"[import] Inizializzo DB: {args.db}")
-            init_db(args.db)
-
-            # Importa GRIGLIA
+            # GRIGLIA (+ IO facoltativo), poi schema e import su UNA connessione, in una transazione
+            from recipe_parser import parse_recipe_indexed
+            from dbio import Workspace
             print(f"[import] Import GRID da: {args.path}")
             data, lines, key_to_line = parse_recipe_indexed(args.path)
 
             # (Facoltativo) unisci IO se fornito
             if args.io:
                 print(f"[import] Unisco IO da: {args.io}")
+                from recipe import load_io_recipe
                 io_only = load_io_recipe(args.io)
                 data.update(io_only)
 
-            import_recipe_to_db(args.db, data, lines, key_to_line)
+            print(f"[import] Inizializzo DB: {args.db}")
+            with Workspace(args.db) as ws, ws.transaction():
+                ws.init_schema()
+                if not args.incremental:
+                    ws.import_recipe(data, lines, key_to_line)
+                else:
+                    rep = ws.sync_recipe(data, lines, key_to_line)
+                    print(f"[import] Sync {rep.mode}: {rep.lines} righe, {rep.cells} celle, {rep.cfg} cfg cambiate; "
+                          f"modifiche locali mantenute su {rep.kept} celle" + (f", PERSE su {rep.lost}" if rep.lost else ""))
+                    for key, base, plc, local in rep.conflicts:
+                        print(f"[import] CONFLITTO {key}: base {base}, PLC {plc}, locale {local} (resta il locale)")
             print(f"[import] Completato su {args.db}")
             return
 
         if args.cmd == "reset-included":
+            from dbio import reset_included
             if args.coords:
                 coords = parse_coords(args.coords)
                 print(f"[reset-included] Coords: {coords}")
-                reset_included(args.db, coords=coords)
+                n = reset_included(args.db, coords=coords)
             elif args.rect:
                 x0, x1, y0, y1 = args.rect
                 print(f"[reset-included] Rect: ({x0},{x1},{y0},{y1})")
-                reset_included(args.db, rect=(x0, x1, y0, y1))
+                n = reset_included(args.db, rect=(x0, x1, y0, y1))
             else:
                 print("Specificare --coords o --rect")
                 return
-            print("[reset-included] Operazione completata.")
+            print(f"[reset-included] Operazione completata: {n} celle aggiornate.")
             return
 
         if args.cmd == "set-target":
+            from dbio import set_target_value
             coords = parse_coords(args.coords)
             print(f"[set-target] Coords: {coords}  -> value={args.value}")
-            set_target_value(args.db, coords, args.value)
-            print("[set-target] Target aggiornati.")
+            n = set_target_value(args.db, coords, args.value)
+            print(f"[set-target] Target aggiornati: {n} celle.")
+            return
+
+        if args.cmd == "apply":
+            from batch_ops import iter_ops
+            from dbio import Workspace
+            print(f"[apply] {args.path} -> {args.db}")
+            with Workspace(args.db) as ws:
+                rep = ws.apply_ops(iter_ops(args.path), batch=max(1, args.batch), strict=args.strict)
+            for lineno, msg in sorted(rep.errors)[:20]:
+                print(f"[apply] riga {lineno}: {msg}")
+            if rep.rejected > 20:
+                print(f"[apply] (+ altre {rep.rejected - 20} operazioni scartate)")
+            if rep.rolled_back:
+                sys.exit(f"[apply] --strict: {rep.rejected} operazioni non valide su {rep.read}, nessuna modifica applicata.")
+            print(f"[apply] {rep.read} operazioni lette, {rep.valid} applicate ({rep.changed} valori cambiati), "
+                  f"{rep.rejected} scartate.")
+            return
+
+        if args.cmd == "render":
+            from render import render_files
+            flags = None if args.overlays is None else tuple(c in args.overlays.lower() for c in "plt")
+            res = render_files(args.paths, io_path=args.io, out_dir=args.out_dir, fmt=args.format,
+                               workers=args.workers, dpi=args.dpi, flags=flags)
+            failed = sum(1 for r in res if r[3])
+            if failed:
+                sys.exit(f"[render] {failed} file non riusciti su {len(res)}.")
+            return
+
+        if args.cmd == "fleet-pull":
+            from fleet import load_inventory, fleet_pull
+            machines = load_inventory(args.inventory)
+            if args.names:
+                unknown = sorted(set(args.names) - {m.name for m in machines})
+                if unknown:
+                    sys.exit(f"[fleet-pull] Macchine non in inventario: {', '.join(unknown)}")
+                machines = [m for m in machines if m.name in args.names]
+            res = fleet_pull(machines, workers=args.workers, conditional=False if args.force else None)
+            failed = sum(1 for r in res if r.errors)
+            if failed:
+                sys.exit(f"[fleet-pull] {failed} macchine con errori su {len(res)}.")
             return
 
         if args.cmd == "export":
+            from dbio import export_recipe_from_db
             print(f"[export] DB: {args.db}  -> out: {args.out}")
-            export_recipe_from_db(args.db, args.out)
-            print(f"[export] Esportato su: {args.out}")
+            n = export_recipe_from_db(args.db, args.out)
+            print(f"[export] Esportato su: {args.out} ({n} valori modificati)")
             return
 
     except SystemExit as e:
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Lettura in streaming di file di operazioni per il comando `apply` (CSV o JSONL).
+
+Operazioni, una per riga:
+    reset-included  x y            Included=FALSE
+    set-included    x y TRUE|FALSE
+    set-target      x y valore     Target_Depth_cm
+CSV: colonne op,x,y,value (intestazione facoltativa). JSONL: {"op": ..., "x": ..., "y": ..., "value": ...}.
+
+iter_ops() produce tuple (riga, tipo, x, y, valore) con tipo "included" (valore 0/1) o "target"
+(valore float); per una riga non valida tipo è None e valore è il messaggio d'errore.
+La validazione sulle celle del DB avviene dopo, a blocchi (dbio.Workspace.apply_ops).
+"""
+from __future__ import annotations
+import csv, json, math
+from pathlib import Path
+from typing import Any, Iterator, Optional, Tuple
+
+Op = Tuple[int, Optional[str], int, int, Any]
+
+_BOOL = {"true": 1, "false": 0, "1": 1, "0": 0}
+
+
+def _make_op(lineno: int, op: Any, x: Any, y: Any, value: Any) -> Op:
+    try:
+        x, y = int(x), int(y)
+    except (TypeError, ValueError):
+        return lineno, None, -1, -1, f"coordinate non intere: {x!r}, {y!r}"
+    op = str(op or "").strip().lower()
+    if op == "reset-included":
+        return lineno, "included", x, y, 0
+    if op == "set-included":
+        v = _BOOL.get(str(value).strip().lower())
+        if v is None:
+            return lineno, None, x, y, f"Included non booleano: {value!r}"
+        return lineno, "included", x, y, v
+    if op == "set-target":
+        try: v = float(value)
+        except (TypeError, ValueError): v = math.nan
+        if not math.isfinite(v):
+            return lineno, None, x, y, f"Target_Depth_cm non numerico: {value!r}"
+        return lineno, "target", x, y, v
+    return lineno, None, x, y, f"operazione sconosciuta: {op!r}"
+
+
+def iter_ops(path: str | Path) -> Iterator[Op]:
+    """Operazioni del file una alla volta (memoria costante); JSONL se l'estensione è .jsonl/.json."""
+    path = Path(path)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() in (".jsonl", ".json"):
+            for lineno, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try: rec = json.loads(line)
+                except ValueError:
+                    yield lineno, None, -1, -1, "JSON non valido"; continue
+                if not isinstance(rec, dict):
+                    yield lineno, None, -1, -1, "riga JSON non è un oggetto"; continue
+                yield _make_op(lineno, rec.get("op"), rec.get("x"), rec.get("y"), rec.get("value"))
+        else:
+            reader = csv.reader(f)
+            for row in reader:
+                if not row or not "".join(row).strip() or row[0].lstrip().startswith("#"):
+                    continue
+                if row[0].strip().lower() == "op":
+                    continue  # intestazione
+                row += [""] * (4 - len(row))
+                yield _make_op(reader.line_num, row[0], row[1], row[2], row[3])
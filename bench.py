@@ -0,0 +1,1101 @@
+# -*- coding: utf-8 -*-
+"""Benchmark del viewer (headless, backend Agg).
+
+Uso:
+    python bench.py hit [--sizes 25 100 400]
+    python bench.py included [--sizes 25 100 400]
+    python bench.py grid [--sizes 25 100 400]
+    python bench.py reload [--n 100] [--reloads 300]
+    python bench.py parse [--sizes 100 400]
+    python bench.py iostream [--lines 200000 1000000]
+    python bench.py lines [--sizes 100 400]
+    python bench.py save [--sizes 100 400] [--edits 50]
+    python bench.py db [--sizes 100 400] [--ops 50]
+    python bench.py startup [--n 25]
+    python bench.py ftp [--files 5] [--n 25]
+    python bench.py fleet [--hosts 4] [--n 100] [--dead 1]
+    python bench.py check
+    python bench.py suite [--sizes 25 100 400 1000] [--save-dir bench_results] [--compare FILE]
+
+Le ricette sintetiche vengono da synth_recipe.py; `suite` salva i risultati in JSON e li
+confronta con l'ultima esecuzione salvata. `check` esegue i controlli veloci con esito
+(uscita 0 = tutti passati, 1 = almeno uno fallito, 77 = nessun fallimento ma qualcuno saltato
+perché manca pyftpdlib: vedi requirements-dev.txt).
+"""
+import argparse
+import gc
+import json
+import platform
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.patches import Rectangle
+
+import plot_view
+from plot_view import _cell_at, _add_included_cells, _add_grid_lines
+from grid_model import GridArrays, GRID_BOOL_PROPS, GRID_NUM_PROPS
+import recipe_parser
+from recipe import load_io_recipe, _IO_PREFIX
+from recipe_lines import RecipePatcher, patch_value, write_lines
+import dbio
+import synth_recipe
+from grid_model import collect_grid_data
+
+
+def _synth_grid(N: int, step: float = 10.0, included_ratio: float = 0.6, seed: int = 0) -> GridArrays:
+    """Griglia N×N sintetica: centri regolari, ~included_ratio celle Included con Path_Index crescente."""
+    rng = np.random.default_rng(seed)
+    g = GridArrays.empty(N)
+    g.present[:] = True
+    inc = rng.random((N, N)) < included_ratio
+    g.included[:] = inc.astype(np.int8)
+    g.error[:] = 0
+    ii, jj = np.meshgrid(np.arange(N), np.arange(N), indexing="ij")
+    g.center_east[:] = ii * step + step / 2.0
+    g.center_north[:] = jj * step + step / 2.0
+    g.path_index[:] = 0
+    g.path_index[inc] = np.arange(1, int(inc.sum()) + 1)
+    for name in ("first_depth", "last_depth", "target_depth", "edges_crossed"):
+        getattr(g, name)[:] = 0
+    return g
+
+
+def _fake_events(ax, N: int, step: float, count: int):
+    """Eventi mouse sintetici distribuiti sulla griglia (coordinate dati + pixel)."""
+    evs = []
+    for k in range(count):
+        x = ((k * 7919) % (N * 100)) / 100.0 * step
+        y = ((k * 104729) % (N * 100)) / 100.0 * step
+        px, py = ax.transData.transform((x, y))
+        evs.append(SimpleNamespace(x=px, y=py, xdata=x, ydata=y, inaxes=ax, canvas=ax.figure.canvas))
+    return evs
+
+
+def bench_hit(sizes, events: int = 200, step: float = 10.0, max_hitbox_n: int = 100):
+    """Costo per evento: N×N Rectangle.contains (vecchio) vs calcolo diretto (_cell_at).
+
+    Il percorso a hitbox viene misurato solo fino a max_hitbox_n: oltre, già la sola
+    costruzione delle N² patch richiede minuti.
+    """
+    print(f"{'N':>6} {'hitbox us/ev':>14} {'diretto us/ev':>14}")
+    for N in sizes:
+        fig = plt.figure(); ax = fig.gca()
+        ax.set_xlim(0, N * step); ax.set_ylim(0, N * step)
+        evs = _fake_events(ax, N, step, events)
+
+        old_us = _bench_hitbox(ax, N, step, evs) if N <= max_hitbox_n else float("nan")
+
+        t0 = time.perf_counter()
+        for ev in evs:
+            _cell_at(ev.xdata, ev.ydata, N, step)
+        new_us = (time.perf_counter() - t0) / len(evs) * 1e6
+
+        print(f"{N:>6} {old_us:>14.1f} {new_us:>14.2f}")
+        plt.close(fig)
+
+
+def _bench_hitbox(ax, N: int, step: float, evs) -> float:
+    """Vecchio percorso: un hitbox per cella e scansione lineare (us/evento)."""
+    rects = []
+    for ix in range(N):
+        for iy in range(N):
+            r = Rectangle((ix * step, iy * step), step, step, facecolor="none", edgecolor="none", linewidth=0.0)
+            ax.add_patch(r); rects.append(r)
+    # per N grandi si misurano solo i primi eventi
+    slow_evs = evs[: max(1, min(len(evs), 20_000 // (N * N)))]
+    t0 = time.perf_counter()
+    for ev in slow_evs:
+        for r in rects:
+            if r.contains(ev)[0]:
+                break
+    return (time.perf_counter() - t0) / len(slow_evs) * 1e6
+
+
+def bench_included(sizes, redraws: int = 5, step: float = 10.0):
+    """Celle Included: startup (creazione + primo draw) e redraw, patch per cella vs PolyCollection."""
+    print(f"{'N':>6} {'modo':>11} {'artisti':>8} {'startup s':>10} {'redraw ms':>10}")
+    for N in sizes:
+        grid = _synth_grid(N, step)
+        for mode in ("patches", "collection"):
+            fig = plt.figure(figsize=plot_view.FIG_SIZE); ax = fig.gca()
+            ax.set_xlim(0, N * step); ax.set_ylim(0, N * step)
+            t0 = time.perf_counter()
+            _add_included_cells(ax, grid, step, mode=mode)
+            fig.canvas.draw()
+            startup = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            for _ in range(redraws):
+                fig.canvas.draw()
+            redraw_ms = (time.perf_counter() - t0) / redraws * 1e3
+            n_art = len(ax.patches) + len(ax.collections)
+            print(f"{N:>6} {mode:>11} {n_art:>8} {startup:>10.3f} {redraw_ms:>10.1f}")
+            plt.close(fig)
+
+
+def bench_grid(sizes, redraws: int = 5, step: float = 10.0):
+    """Redraw completo con la sola griglia: axvline/axhline per linea vs LineCollection."""
+    print(f"{'N':>6} {'modo':>15} {'artisti':>8} {'crea ms':>8} {'redraw ms':>10}")
+    for N in sizes:
+        for mode in ("axvline/axhline", "LineCollection"):
+            fig = plt.figure(figsize=plot_view.FIG_SIZE); ax = fig.gca()
+            t0 = time.perf_counter()
+            if mode == "LineCollection":
+                _add_grid_lines(ax, N, step)
+            else:
+                for k in range(N + 1):
+                    ax.axvline(x=k * step, linewidth=plot_view.GRID_LINEWIDTH, alpha=plot_view.GRID_ALPHA,
+                               color=plot_view.GRID_COLOR, zorder=plot_view.Z_GRID)
+                    ax.axhline(y=k * step, linewidth=plot_view.GRID_LINEWIDTH, alpha=plot_view.GRID_ALPHA,
+                               color=plot_view.GRID_COLOR, zorder=plot_view.Z_GRID)
+            build_ms = (time.perf_counter() - t0) * 1e3
+            ax.set_xlim(0, N * step); ax.set_ylim(0, N * step)
+            fig.canvas.draw()
+            t0 = time.perf_counter()
+            for _ in range(redraws):
+                fig.canvas.draw()
+            redraw_ms = (time.perf_counter() - t0) / redraws * 1e3
+            n_art = len(ax.lines) + len(ax.collections)
+            print(f"{N:>6} {mode:>15} {n_art:>8} {build_ms:>8.1f} {redraw_ms:>10.1f}")
+            plt.close(fig)
+
+
+def _rss_mb() -> float:
+    """RSS corrente (Linux: /proc); altrove il picco da resource, se disponibile."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    except Exception:
+        return float("nan")
+
+
+def bench_reload(N: int = 100, reloads: int = 300, step: float = 10.0, max_rss_growth_mb: float = 20.0) -> bool:
+    """Reload ripetuti sulla stessa figura (GridViewer.set_data) con poche celle cambiate ogni volta.
+
+    Verifica che numero di artisti, callback e RSS restino piatti; ritorna False se crescono.
+    """
+    io = synth_recipe.io_values(N, step)
+    base = _synth_grid(N, step)
+    viewer = plot_view.view_from_file(io, [], {}, "bench.txtrecipe", grid=base)
+    fig, ax = viewer.fig, viewer.ax
+    fig.canvas.draw()
+
+    def _counts():
+        n_cb = sum(len(v) for v in fig.canvas.callbacks.callbacks.values())
+        return len(ax.get_children()), n_cb
+
+    rng = np.random.default_rng(1)
+    art0, cb0 = _counts()
+    gc.collect(); rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    for k in range(reloads):
+        g = GridArrays.empty(N)
+        for name in ("present", "included", "error", "path_index", "first_depth", "last_depth",
+                     "target_depth", "center_east", "center_north", "edges_crossed"):
+            getattr(g, name)[:] = getattr(base, name)
+        cells = rng.integers(0, N, size=(5, 2))
+        g.last_depth[cells[:, 0], cells[:, 1]] = rng.integers(1, 300, size=5)
+        g.included[cells[0, 0], cells[0, 1]] = k % 2
+        viewer.set_data(io, [], {}, "bench.txtrecipe", grid=g)  # su Agg draw_idle() disegna subito
+        if k == 10:  # regime: cache e pool già allocati
+            gc.collect(); rss0 = _rss_mb()
+    dt = (time.perf_counter() - t0) / reloads
+    gc.collect()
+    art1, cb1 = _counts(); rss1 = _rss_mb()
+    print(f"N={N} reload={reloads}  ms/reload (incl. draw)={dt * 1e3:.1f}")
+    print(f"artisti {art0} -> {art1}   callback {cb0} -> {cb1}   RSS {rss0:.1f} -> {rss1:.1f} MB")
+    ok = art1 == art0 and cb1 == cb0 and (rss1 - rss0) <= max_rss_growth_mb
+    print("OK" if ok else "CRESCITA RILEVATA")
+    plt.close(fig)
+    return ok
+
+
+# --------------------------------- parser ---------------------------------
+_REF_KEY_RE = re.compile(r"^([A-Za-z0-9_.\[\]]+)\s*:=\s*(.+?)\s*$")
+
+
+def _ref_parse_value(raw: str):
+    """Parser valori originale (regex), riferimento per l'equivalenza."""
+    s = re.split(r"\s*//", raw, maxsplit=1)[0]
+    s = s.replace("\u00A0", " ").replace("\u2007", " ").replace("\u202F", " ").strip()
+    return recipe_parser._parse_value_regex(s)
+
+
+def _ref_parse_lines(lines):
+    data, key_to_line = {}, {}
+    for idx, raw in enumerate(lines):
+        line = raw.strip()
+        if not line or line.startswith("//") or line.startswith("#"):
+            continue
+        m = _REF_KEY_RE.match(line)
+        if not m:
+            continue
+        data[m.group(1)] = _ref_parse_value(m.group(2))
+        key_to_line[m.group(1)] = idx
+    return data, key_to_line
+
+
+_EDGE_VALUES = ["0", "-12", "+7", "3.25", "-0.5", "1.", ".5", "16#FF", "16#ff", "16#", "16#zz", "16#1_0",
+                "TRUE", "false", "True // c", "FALSE//x", "282 // note", "12\u00A0", "1\u00A02", "\u00A0TRUE",
+                "١٢٣", "１２", "abc", "'txt'", "-", "+", "", "// solo commento", "1e5", "0x10", "1_000",
+                "truex", "T", "  4  ", "5;", "ß", "\x1c7", "8\x1c", "\u20039"]
+_EDGE_LINES = ["a.b:=1", "a.b := 1 ", "a b := 1", "a:=", "a:=   // c", ":=1", "a:b:=1", "a:=b:=1", "a\t:=\t2",
+               "// x:=1", "# x:=1", "arr[1][2].x:=TRUE", "è:=1", "a\u00A0:=1", "\u00A0b:=1", "\x1cc:=2",
+               "d\x1f:=3", "a.b=1", "  k:=v  ", "crlf:=4\r", "crlf2:=TRUE // c\r", "\ufeffbom:=1"]
+
+
+def _synth_recipe_lines(N: int) -> list:
+    """Righe GRID sintetiche N×N con valori di ogni tipo (bool, int, float, hex, commenti, NBSP)."""
+    out = []
+    for ix in range(N):
+        for iy in range(N):
+            b = f"GVL.GPS_Grid_data[{ix}][{iy}]."
+            k = ix * N + iy
+            for j, prop in enumerate(list(GRID_BOOL_PROPS) + list(GRID_NUM_PROPS)):
+                if j < len(GRID_BOOL_PROPS):
+                    v = "TRUE" if (k + j) % 3 == 0 else "FALSE"
+                elif j % 4 == 0:
+                    v = f"{k * 0.5 - 3:.1f}"
+                elif j % 5 == 0:
+                    v = f"16#{k:X}"
+                elif j % 7 == 0:
+                    v = f"{k} // nota"
+                else:
+                    v = str(k % 300)
+                out.append(f"{b}{prop}:={v}\n")
+    out.append("IO.GPS.Cfg.Nome:=\u00A0campo\u00A0nord // commento\n")
+    return out
+
+
+def _same_parse(path: str) -> bool:
+    data, lines, k2l = recipe_parser.parse_recipe_indexed(path, use_cache=False)
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        text_lines = f.readlines()
+    rdata, rk2l = _ref_parse_lines(text_lines)
+    if list(lines) == text_lines and data == rdata and k2l == rk2l \
+            and all(type(data[k]) is type(rdata[k]) for k in data):
+        return True
+    print(f"[parse] DIVERSO file {path}")
+    return False
+
+
+def check_parser_equivalence(paths=()) -> bool:
+    """Il tokenizer veloce deve dare esattamente lo stesso output del parser regex originale.
+
+    Senza `paths` controlla valori e righe limite (scritte in un file temporaneo).
+    """
+    ok = True
+    if not paths:
+        for v in _EDGE_VALUES:
+            a, b = recipe_parser.parse_value(v), _ref_parse_value(v)
+            if a != b or type(a) is not type(b):
+                print(f"[parse] DIVERSO valore {v!r}: {a!r} vs {b!r}"); ok = False
+        with tempfile.TemporaryDirectory() as tmp:
+            edge = os.path.join(tmp, "edge.txtrecipe")
+            with open(edge, "w", encoding="utf-8") as f:
+                f.writelines(ln + "\n" for ln in _EDGE_LINES + [f"x{i}:={v}" for i, v in enumerate(_EDGE_VALUES)])
+            ok &= _same_parse(edge)
+    for p in paths:
+        ok &= _same_parse(p)
+    return ok
+
+
+def bench_parse(sizes, repeat: int = 3) -> bool:
+    """Throughput del parser (righe/s) su ricette sintetiche: regex originale vs tokenizer veloce."""
+    print(f"{'N':>6} {'righe':>9} {'regex kl/s':>11} {'veloce kl/s':>12} {'x':>6}")
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for N in sizes:
+            lines = _synth_recipe_lines(N)
+            path = os.path.join(tmp, f"GRID_{N}.txtrecipe")
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            ok &= check_parser_equivalence([path])
+            t_ref = min(_timed(lambda: _ref_parse_lines(open(path, encoding="utf-8", errors="ignore").readlines()))
+                        for _ in range(repeat))
+            t_new = min(_timed(lambda: recipe_parser.parse_recipe_indexed(path, use_cache=False)) for _ in range(repeat))
+            n = len(lines)
+            print(f"{N:>6} {n:>9} {n / t_ref / 1e3:>11.0f} {n / t_new / 1e3:>12.0f} {t_ref / t_new:>6.1f}")
+    ok &= check_parser_equivalence()
+    print("equivalenza OK" if ok else "equivalenza FALLITA")
+    return ok
+
+
+def bench_io_stream(sizes) -> bool:
+    """load_io_recipe: parse completo + filtro (vecchio) vs iter_recipe con prefissi.
+
+    Il picco di memoria (tracemalloc) del percorso in streaming non deve crescere con il file.
+    """
+    print(f"{'righe':>9} {'MB':>6} {'completo s':>11} {'picco MB':>9} {'stream s':>9} {'picco MB':>9}")
+    peaks = []
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"IO_{n}.txtrecipe")
+            synth_recipe.write_io_recipe(path, 25, extra=n)
+            runs = []
+            for fn in (lambda: {k: v for k, v in recipe_parser.parse_recipe_indexed(path, use_cache=False)[0].items()
+                                if k.startswith(_IO_PREFIX)},
+                       lambda: load_io_recipe(path)):
+                gc.collect(); tracemalloc.start()
+                t0 = time.perf_counter(); res = fn(); dt = time.perf_counter() - t0
+                peak = tracemalloc.get_traced_memory()[1] / 2**20
+                tracemalloc.stop()
+                runs.append((res, dt, peak))
+            ok &= runs[0][0] == runs[1][0]
+            peaks.append(runs[1][2])
+            print(f"{n:>9} {os.path.getsize(path) / 2**20:>6.0f} {runs[0][1]:>11.2f} {runs[0][2]:>9.1f} "
+                  f"{runs[1][1]:>9.2f} {runs[1][2]:>9.1f}")
+    ok &= max(peaks) - min(peaks) < 1.0
+    print("memoria costante, risultati uguali" if ok else "DIFFERENZA rilevata")
+    return ok
+
+
+def bench_lines(sizes) -> bool:
+    """Righe tenute dal viewer: lista di str (lettore testo) vs RecipeLines (mmap + offset).
+
+    Misura parse, memoria trattenuta dal risultato (tracemalloc) ed export di un file con una riga modificata;
+    i due export devono essere identici byte per byte.
+    """
+    print(f"{'N':>6} {'righe':>9} {'lettore':>8} {'parse s':>8} {'trattenuti MB':>14} {'righe MB':>9} {'export ms':>10}")
+    ok = True
+    old = getattr(recipe_parser.CFG, "RECIPE_MMAP", True)
+    with tempfile.TemporaryDirectory() as tmp:
+        for N in sizes:
+            path = os.path.join(tmp, f"GRID_{N}.txtrecipe")
+            synth_recipe.write_grid_recipe(path, N)
+            outs = []
+            for use_mmap in (False, True):
+                recipe_parser.CFG.RECIPE_MMAP = use_mmap
+                gc.collect(); tracemalloc.start()
+                t0 = time.perf_counter()
+                data, lines, k2l = recipe_parser.parse_recipe_indexed(path, use_cache=False)
+                dt = time.perf_counter() - t0
+                kept = tracemalloc.get_traced_memory()[0] / 2**20
+                key = f"GVL.GPS_Grid_data[{N // 2}][{N // 2}].Target_Depth_cm"
+                idx = k2l[key]
+                del data, k2l; gc.collect()
+                kept_lines = tracemalloc.get_traced_memory()[0] / 2**20
+                tracemalloc.stop()
+                lines[idx] = f"{key}:=123\n"
+                out = os.path.join(tmp, f"out_{N}_{int(use_mmap)}.txtrecipe")
+                t0 = time.perf_counter(); write_lines(lines, out); t_exp = (time.perf_counter() - t0) * 1e3
+                with open(out, "rb") as f:
+                    outs.append(f.read())
+                print(f"{N:>6} {len(lines):>9} {'mmap' if use_mmap else 'testo':>8} {dt:>8.2f} {kept:>14.1f} "
+                      f"{kept_lines:>9.1f} {t_exp:>10.1f}")
+                del lines
+            ok &= outs[0] == outs[1]
+    recipe_parser.CFG.RECIPE_MMAP = old
+    print("export equivalenti" if ok else "EXPORT DIVERSI")
+    return ok
+
+
+def bench_save(sizes, edits: int = 50) -> bool:
+    """Salvataggio dopo ogni edit Target_Depth_cm: riscrittura completa (vecchio) vs RecipePatcher.
+
+    Valori a lunghezza costante (patch sul posto) e variabile (copia in streaming); il file finale
+    deve essere identico alla riscrittura completa.
+    """
+    print(f"{'N':>6} {'MB':>6} {'completa ms':>12} {'sul posto ms':>13} {'copia ms':>9}")
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for N in sizes:
+            path = os.path.join(tmp, f"GRID_{N}.txtrecipe")
+            synth_recipe.write_grid_recipe(path, N)
+            data, lines, k2l = recipe_parser.parse_recipe_indexed(path, use_cache=False)
+            keys = [k for k in k2l if k.endswith(".Target_Depth_cm")]
+            rng = np.random.default_rng(2)
+            picks = [keys[i] for i in rng.integers(0, len(keys), size=edits)]
+            row = [f"{N:>6} {os.path.getsize(path) / 2**20:>6.1f}"]
+
+            full = list(lines)
+            out_full = os.path.join(tmp, "full.txtrecipe")
+            t0 = time.perf_counter()
+            for k in picks:
+                full[k2l[k]] = patch_value(full[k2l[k]], "100")
+                with open(out_full, "w", encoding="utf-8") as f:
+                    f.writelines(full)
+            row.append(f"{(time.perf_counter() - t0) / edits * 1e3:>12.2f}")
+
+            for label, values in (("sul posto", [str(200 + j % 700) for j in range(edits)]),
+                                  ("copia", [str(10 ** (j % 4)) for j in range(edits)])):
+                _, lines, _ = recipe_parser.parse_recipe_indexed(path, use_cache=False)
+                out = os.path.join(tmp, f"{label}.txtrecipe")
+                patcher = RecipePatcher(lines, out)
+                # prima scrittura (copia dal sorgente) con i valori a 3 cifre: poi "sul posto" non cambia lunghezza
+                patcher.set_values({k2l[k]: "100" for k in picks})
+                ref = list(lines)
+                t0 = time.perf_counter()
+                for k, v in zip(picks, values):
+                    patcher.set_values({k2l[k]: v})
+                    ref[k2l[k]] = patch_value(ref[k2l[k]], v)
+                row.append(f"{(time.perf_counter() - t0) / edits * 1e3:>{13 if label == 'sul posto' else 9}.2f}")
+                with open(out, "r", encoding="utf-8") as f:
+                    ok &= f.readlines() == ref
+            print(" ".join(row))
+    print("file identici" if ok else "FILE DIVERSI")
+    return ok
+
+
+# ---- dbio di riferimento: una connessione per funzione, cfg riga per riga, pragma di default,
+# export con JOIN su keys_map per tutte le celle
+_REF_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS grid_cells(
+  x INT, y INT, included INTEGER, first_depth_cm REAL, last_depth_cm REAL,
+  target_depth_cm REAL, center_east_dm REAL, center_north_dm REAL, edges_crossed INT, error INTEGER,
+  PRIMARY KEY(x,y));
+CREATE TABLE IF NOT EXISTS cfg(key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS lines(idx INTEGER PRIMARY KEY, content TEXT);
+CREATE TABLE IF NOT EXISTS keys_map(key TEXT PRIMARY KEY, line_idx INT);
+"""
+
+
+def _ref_db_import(db_path: str, data, lines, k2l, grid):
+    db = sqlite3.connect(db_path); db.executescript(_REF_DB_SCHEMA); db.commit(); db.close()
+    db = sqlite3.connect(db_path); cur = db.cursor()
+    for k, v in data.items():
+        if k.startswith(dbio._CFG_PREFIXES):
+            cur.execute("INSERT OR REPLACE INTO cfg(key,value) VALUES(?,?)", (k, str(v)))
+    cur.executemany("INSERT OR REPLACE INTO lines(idx,content) VALUES(?,?)", [(i, s) for i, s in enumerate(lines)])
+    cur.executemany("INSERT OR REPLACE INTO keys_map(key,line_idx) VALUES(?,?)", k2l.items())
+    cur.executemany("INSERT OR REPLACE INTO grid_cells VALUES (?,?,?,?,?,?,?,?,?,?)",
+                    [r[:10] for r in dbio._grid_rows(grid)])
+    db.commit(); db.close()
+
+
+def _ref_db_set_target(db_path: str, coords, value: float):
+    db = sqlite3.connect(db_path); cur = db.cursor()
+    cur.executemany("UPDATE grid_cells SET target_depth_cm=? WHERE x=? AND y=? AND target_depth_cm IS NOT NULL",
+                    [(value, x, y) for x, y in coords])
+    db.commit(); db.close()
+
+
+def _ref_db_export(db_path: str, out_path: str):
+    db = sqlite3.connect(db_path)
+    edits = {}
+    for prop in ("Included", "Target_Depth_cm"):
+        col = "included" if prop == "Included" else "target_depth_cm"
+        for idx, val in db.execute(
+                f"""SELECT k.line_idx, g.{col} FROM grid_cells g
+                    JOIN keys_map k ON k.key = 'GVL.GPS_Grid_data[' || g.x || '][' || g.y || '].{prop}'
+                    WHERE g.{col} IS NOT NULL"""):
+            edits[idx] = ("TRUE" if val == 1 else "FALSE") if prop == "Included" else dbio.format_value(val)
+    with open(out_path, "w", encoding="utf-8") as f:
+        for idx, content in db.execute("SELECT idx, content FROM lines ORDER BY idx"):
+            new_val = edits.get(idx)
+            f.write(content if new_val is None else patch_value(content, new_val))
+    db.close()
+
+
+def bench_db(sizes, ops: int = 50) -> bool:
+    """Import, `ops` set-target da una cella ed export: dbio di riferimento vs Workspace (WAL, una connessione,
+    export delle sole celle dirty). I due export devono dare gli stessi valori. Infine un re-import
+    incrementale (sync) con `ops` letture di profondità cambiate dal PLC, da confrontare con l'import."""
+    print(f"{'N':>6} {'righe':>9} {'import rif s':>13} {'import ws s':>12} {'set rif ms':>11} {'set ws ms':>10} "
+          f"{'export rif s':>13} {'export ws s':>12} {'sync ws s':>10}")
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for N in sizes:
+            path = os.path.join(tmp, f"GRID_{N}.txtrecipe")
+            synth_recipe.write_grid_recipe(path, N)
+            data, lines, k2l = recipe_parser.parse_recipe_indexed(path, use_cache=False)
+            data.update(synth_recipe.io_values(N))
+            grid = GridArrays.from_data(data)
+            rng = np.random.default_rng(3)
+            cells = [tuple(c) for c in rng.integers(0, N, size=(ops, 2)).tolist()]
+            db_ref, db_ws = os.path.join(tmp, f"ref_{N}.sqlite"), os.path.join(tmp, f"ws_{N}.sqlite")
+            out_ref, out_ws = os.path.join(tmp, "ref.txtrecipe"), os.path.join(tmp, "ws.txtrecipe")
+
+            t_imp_ref = _timed(lambda: _ref_db_import(db_ref, data, lines, k2l, grid))
+            t0 = time.perf_counter()
+            for j, c in enumerate(cells):
+                _ref_db_set_target(db_ref, [c], 100 + j)
+            t_set_ref = (time.perf_counter() - t0) / ops
+            t_exp_ref = _timed(lambda: _ref_db_export(db_ref, out_ref))
+
+            with dbio.Workspace(db_ws) as ws:
+                def _imp():
+                    with ws.transaction():
+                        ws.init_schema(); ws.import_recipe(data, lines, k2l, grid)
+                t_imp_ws = _timed(_imp)
+                t0 = time.perf_counter()
+                for j, c in enumerate(cells):
+                    ws.set_target_value([c], 100 + j)
+                t_set_ws = (time.perf_counter() - t0) / ops
+                t_exp_ws = _timed(lambda: ws.export_recipe(out_ws))
+
+                plc = list(lines)
+                for j, (x, y) in enumerate(rng.integers(0, N, size=(ops, 2)).tolist()):
+                    i = k2l[f"GVL.GPS_Grid_data[{x}][{y}].Last_Depth_Read_cm"]
+                    plc[i] = patch_value(plc[i], str(1000 + j))
+                path2 = os.path.join(tmp, f"GRID_{N}_plc.txtrecipe")
+                with open(path2, "w", encoding="utf-8") as f:
+                    f.writelines(plc)
+                del plc
+                data2, lines2, k2l2 = recipe_parser.parse_recipe_indexed(path2, use_cache=False)
+                grid2 = GridArrays.from_data(data2)
+                t0 = time.perf_counter()
+                report = ws.sync_recipe(data2, lines2, k2l2, grid2)
+                t_sync = time.perf_counter() - t0
+                ok &= report.mode == "incrementale" and 0 < report.lines <= ops and not report.conflicts
+                del data2, lines2, k2l2, grid2
+            # il riferimento riscrive tutti i valori (es. "-3.0" -> "-3"), il Workspace solo le celle dirty:
+            # si confrontano i valori letti
+            ok &= recipe_parser.parse_recipe_indexed(out_ref, use_cache=False)[0] \
+                == recipe_parser.parse_recipe_indexed(out_ws, use_cache=False)[0]
+            print(f"{N:>6} {len(lines):>9} {t_imp_ref:>13.2f} {t_imp_ws:>12.2f} {t_set_ref * 1e3:>11.2f} "
+                  f"{t_set_ws * 1e3:>10.2f} {t_exp_ref:>13.2f} {t_exp_ws:>12.2f} {t_sync:>10.2f}")
+    print("export equivalenti, sync incrementale ok" if ok else "EXPORT/SYNC NON CORRETTI")
+    return ok
+
+
+# moduli del viewer che i subcomandi sul DB non devono importare (app.py li carica solo per "view")
+_VIEW_ONLY_MODULES = ("matplotlib", "plot_view", "tkinter", "tk_layer_ui", "ftplib", "ftp_pull")
+
+
+def _importtime(argv) -> tuple:
+    """Esegue `python -X importtime app.py argv`: (s totali, ms di import, moduli importati, returncode)."""
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    t0 = time.perf_counter()
+    r = subprocess.run([sys.executable, "-X", "importtime", app, *argv], capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    mods, us = set(), 0
+    for line in r.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line.split("|", 2)
+        if cum.strip().isdigit() and not name.startswith("  "):  # solo import di primo livello: cumulativo
+            us += int(cum)
+        mods.add(name.strip())
+    return wall, us / 1e3, mods, r.returncode
+
+
+def bench_startup(N: int = 25) -> bool:
+    """Avvio dei subcomandi CLI su un workspace N×N: tempo e import (-X importtime). Fallisce se un comando
+    diverso da view importa matplotlib / Tk / ftplib / plot_view."""
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        grid, db = os.path.join(tmp, "GRID.txtrecipe"), os.path.join(tmp, "ws.sqlite")
+        ops, out = os.path.join(tmp, "ops.csv"), os.path.join(tmp, "out.txtrecipe")
+        synth_recipe.write_grid_recipe(grid, N)
+        with open(ops, "w", encoding="utf-8") as f:
+            f.write("op,x,y,value\nset-target,1,1,150\nreset-included,2,2,\n")
+        cmds = [("--help", ["--help"]),
+                ("import", ["import", grid, "--db", db]),
+                ("import --incremental", ["import", grid, "--db", db, "--incremental"]),
+                ("reset-included", ["reset-included", "--db", db, "--coords", "0,0;1,1"]),
+                ("set-target", ["set-target", "--db", db, "--coords", "1,1", "--value", "120"]),
+                ("apply", ["apply", ops, "--db", db]),
+                ("export", ["export", "--db", db, "--out", out])]
+        print(f"{'comando':<22} {'totale ms':>10} {'import ms':>10} {'moduli':>7}  viewer")
+        for label, argv in cmds:
+            wall, imp_ms, mods, rc = _importtime(argv)
+            bad = sorted(m for m in mods if m.split(".")[0] in _VIEW_ONLY_MODULES)
+            top = sorted({m.split(".")[0] for m in bad})
+            print(f"{label:<22} {wall * 1e3:>10.0f} {imp_ms:>10.0f} {len(mods):>7}  {', '.join(top) or '-'}")
+            if rc != 0:
+                print(f"[startup] {label}: uscita {rc}"); ok = False
+            if bad:
+                ok = False
+    # riferimento: costo del solo stack del viewer
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", "import matplotlib.pyplot, plot_view"],
+                       capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    view_ms = sum(int(l.split("|")[1]) for l in r.stderr.splitlines()
+                  if l.startswith("import time:") and "|" in l and l.split("|")[1].strip().isdigit()
+                  and not l.split("|", 2)[2].startswith("  ")) / 1e3
+    print(f"(import di matplotlib.pyplot + plot_view, solo view: {view_ms:.0f} ms)")
+    print("nessun comando DB importa lo stack del viewer" if ok else "STACK DEL VIEWER IMPORTATO DA UN COMANDO DB")
+    return ok
+
+
+# ------------------------------ FTP su PLC finti ------------------------------
+# pyftpdlib (requirements-dev.txt) serve solo qui; senza, i controlli FTP ritornano SKIP.
+SKIP = None
+
+
+def _have_pyftpdlib(tag: str) -> bool:
+    try:
+        import pyftpdlib  # noqa: F401
+        return True
+    except ImportError:
+        print(f"[{tag}] SALTATO: pyftpdlib non installato (pip install -r requirements-dev.txt)")
+        return False
+
+
+def _ftp_standin(root: str, port: int, log: str | None = None):
+    """PLC finto (processo separato: pyftpdlib non va in più thread dello stesso processo).
+    Con `log` ogni comando ricevuto (USER, PASS, RETR, ...) viene aggiunto al file, uno per riga."""
+    import logging
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import FTPServer
+    logging.disable(logging.CRITICAL)
+
+    class _Handler(FTPHandler):
+        def pre_process_command(self, line, cmd, arg):
+            if log:
+                with open(log, "a", encoding="utf-8") as f:
+                    f.write(cmd + "\n")
+            return super().pre_process_command(line, cmd, arg)
+
+    auth = DummyAuthorizer(); auth.add_user("root", "pdm3", root, perm="elr")
+    _Handler.authorizer = auth
+    FTPServer(("127.0.0.1", port), _Handler).serve_forever()
+
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_standin(root: str, log: str | None = None):
+    """Avvia un PLC finto su una porta libera; ritorna (processo, porta) quando accetta connessioni."""
+    import multiprocessing, socket
+    port = _free_port()
+    proc = multiprocessing.Process(target=_ftp_standin, args=(root, port, log), daemon=True)
+    proc.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    if log:
+        open(log, "w").close()  # la connessione di prova non conta
+    return proc, port
+
+
+def _ftp_log(log: str) -> dict:
+    counts: dict = {}
+    with open(log, encoding="utf-8") as f:
+        for cmd in f.read().split():
+            counts[cmd] = counts.get(cmd, 0) + 1
+    return counts
+
+
+def bench_ftp(files: int = 5, N: int = 25):
+    """Motore di pull (ftp_pull.pull_files) contro un PLC finto: un solo USER/PASS per `files` file,
+    un RETR per file, errore solo sul file remoto mancante; con parallel=2 due login. Poi il pull
+    condizionale: salto via SIZE/MDTM, MDTM cambiato con hash uguale (niente backup), cambio reale."""
+    if not _have_pyftpdlib("ftp"):
+        return SKIP
+    from ftp_pull import pull_files
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        remote = os.path.join(tmp, "plc", "home", "cds-apps", "Backup")
+        os.makedirs(remote)
+        names = [f"R{i}.txtrecipe" for i in range(files)]
+        for i, name in enumerate(names):
+            synth_recipe.write_grid_recipe(os.path.join(remote, name), N + i, seed=i)
+        log = os.path.join(tmp, "ftp.log")
+        proc, port = _start_standin(os.path.join(tmp, "plc"), log)
+        conn = {"host": "127.0.0.1", "port": port, "user": "root", "password": "pdm3", "timeout": 5}
+
+        def _pull(local_dir: str, parallel: int, conditional: bool = False):
+            pairs = [(f"/home/cds-apps/Backup/{n}", os.path.join(tmp, local_dir, n)) for n in names + ["MANCANTE.txtrecipe"]]
+            open(log, "w").close()
+            t0 = time.perf_counter()
+            res = pull_files(pairs, parallel=parallel, verbose=False, conditional=conditional, **conn)
+            return res, _ftp_log(log), time.perf_counter() - t0
+
+        def _check(label: str, cond: bool, msg: str):
+            nonlocal ok
+            if not cond:
+                print(f"[ftp] {label}: {msg}"); ok = False
+
+        try:
+            print(f"{'modo':<16} {'sessioni':>8} {'USER':>5} {'PASS':>5} {'RETR':>5} {'ok':>4} {'s':>6}")
+            for label, parallel, logins in (("una sessione", 1, 1), ("due sessioni", 2, 2)):
+                res, cmds, wall = _pull(f"locale_{parallel}", parallel)
+                print(f"{label:<16} {parallel:>8} {cmds.get('USER', 0):>5} {cmds.get('PASS', 0):>5} "
+                      f"{cmds.get('RETR', 0):>5} {sum(r.ok for r in res):>4} {wall:>6.2f}")
+                _check(label, cmds.get("USER") == logins and cmds.get("PASS") == logins,
+                       f"login {cmds.get('USER')}/{cmds.get('PASS')}, attesi {logins}")
+                _check(label, cmds.get("RETR") == files + 1, f"{cmds.get('RETR')} RETR, attesi {files + 1}")
+                for r, name in zip(res, names):
+                    same = r.ok and open(r.local, "rb").read() == open(os.path.join(remote, name), "rb").read()
+                    _check(label, same and r.changed and r.error is None, f"{name}: ok={r.ok} errore={r.error}")
+                miss = res[-1]
+                _check(label, not miss.ok and miss.error and not os.path.exists(miss.local),
+                       f"file mancante: ok={miss.ok} errore={miss.error}")
+                _check(label, all(r.connected for r in res), "connected=False con il server attivo")
+
+            # pull condizionale: SIZE/MDTM uguali -> nessun RETR; solo MDTM diverso ma stesso contenuto ->
+            # scaricato, nessun backup; contenuto diverso -> scambio col backup del file precedente
+            print(f"{'condizionale':<28} {'RETR':>5} {'saltati':>7} {'cambiati':>8} {'backup':>6}")
+            local_dir = os.path.join(tmp, "locale_cond")
+            r0, r1 = os.path.join(remote, names[0]), os.path.join(remote, names[1])
+            steps = (("primo pull", None),
+                     ("invariato", None),
+                     ("MDTM nuovo, stesso hash", lambda: os.utime(r0, (time.time() + 120,) * 2)),
+                     ("contenuto nuovo", lambda: open(r1, "a", encoding="utf-8").write("GVL.Extra:=1\n")))
+            for label, change in steps:
+                if change is not None:
+                    change()
+                res, cmds, _wall = _pull("locale_cond", 1, conditional=True)
+                res = res[:-1]  # il file mancante si riprova sempre
+                retr = cmds.get("RETR", 0) - 1
+                backups = sorted(f for f in os.listdir(local_dir) if f.startswith(("R0_", "R1_")))
+                print(f"{label:<28} {retr:>5} {sum(r.skipped for r in res):>7} "
+                      f"{sum(r.changed for r in res):>8} {len(backups):>6}")
+                if label == "primo pull":
+                    _check(label, retr == files and all(r.changed for r in res), f"{retr} RETR")
+                elif label == "invariato":
+                    _check(label, retr == 0 and all(r.ok and r.skipped for r in res), f"{retr} RETR, attesi 0")
+                elif label.startswith("MDTM"):
+                    _check(label, retr == 1 and not res[0].skipped and not res[0].changed
+                           and res[0].backup is None and not backups,
+                           f"{retr} RETR, changed={res[0].changed}, backup={backups}")
+                    _check(label, all(r.skipped for r in res[1:]), "altri file riscaricati")
+                else:
+                    _check(label, retr == 1 and res[1].changed and res[1].backup is not None
+                           and backups == [res[1].backup.name]
+                           and open(res[1].local, "rb").read() == open(r1, "rb").read(),
+                           f"{retr} RETR, changed={res[1].changed}, backup={backups}")
+        finally:
+            proc.terminate(); proc.join()
+    print("pull FTP OK" if ok else "PULL FTP: CONTROLLI FALLITI")
+    return ok
+
+
+# ---------------------------------- flotta ----------------------------------
+def bench_fleet(hosts: int = 4, N: int = 100, dead: int = 1, timeout: float = 1.0):
+    """fleet-pull contro `hosts` PLC finti (pyftpdlib) più `dead` che accettano la connessione e non
+    rispondono: un thread vs pool. Controlla raggiungibilità, Included letti, secondo pull invariato;
+    SKIP senza pyftpdlib."""
+    if not _have_pyftpdlib("fleet"):
+        return SKIP
+    import socket
+    from fleet import load_inventory, fleet_pull
+    from recipe import load_grid_recipe
+    ok = True
+    procs, sinks = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        entries, expected = [], {}
+        for i in range(hosts):
+            remote = os.path.join(tmp, f"plc{i}", "home", "cds-apps", "Backup")
+            os.makedirs(remote)
+            grid, io = synth_recipe.write_recipes(remote, N + i, seed=i)
+            os.replace(grid, os.path.join(remote, "GPS_Grid.txtrecipe")); os.replace(io, os.path.join(remote, "IO.txtrecipe"))
+            expected[f"plc{i}"] = int((load_grid_recipe(os.path.join(remote, "GPS_Grid.txtrecipe"))[0].included == 1).sum())
+            proc, port = _start_standin(os.path.join(tmp, f"plc{i}"))
+            procs.append(proc)
+            entries.append({"name": f"plc{i}", "host": "127.0.0.1", "port": port, "timeout": timeout})
+        for i in range(dead):
+            sink = socket.socket(); sink.bind(("127.0.0.1", 0)); sink.listen(4); sinks.append(sink)
+            entries.append({"name": f"muto{i}", "host": "127.0.0.1", "port": sink.getsockname()[1], "timeout": timeout})
+        # porta chiusa: connessione rifiutata subito
+        entries.append({"name": "muto-spento", "host": "127.0.0.1", "port": _free_port(), "timeout": timeout})
+        try:
+            print(f"{'modo':<14} {'thread':>6} {'totale s':>9} {'raggiung.':>9} {'cambiate':>8}")
+            for label, workers in (("sequenziale", 1), ("pool", len(entries)), ("pool, 2° pull", len(entries))):
+                inv = os.path.join(tmp, f"fleet_{workers}.json")
+                for e in entries:
+                    e["local_dir"] = f"locale_{workers}/{e['name']}"
+                with open(inv, "w", encoding="utf-8") as f:
+                    json.dump(entries, f)
+                t0 = time.perf_counter()
+                res = fleet_pull(load_inventory(inv), workers=workers, verbose=False)
+                wall = time.perf_counter() - t0
+                reach, changed = sum(r.reachable for r in res), sum(r.changed for r in res)
+                print(f"{label:<14} {workers:>6} {wall:>9.2f} {reach:>9} {changed:>8}")
+                if reach != hosts or any(r.reachable for r in res if r.machine.name.startswith("muto")):
+                    print(f"[fleet] {label}: raggiungibili {reach}, attese {hosts}"); ok = False
+                for r in res:
+                    live = not r.machine.name.startswith("muto")
+                    if r.grid.connected != live or r.io.connected != live:
+                        print(f"[fleet] {label} {r.machine.name}: connected GRID={r.grid.connected} "
+                              f"IO={r.io.connected}, atteso {live}"); ok = False
+                for r in res:
+                    if r.machine.name in expected and (r.errors or r.included != expected[r.machine.name]):
+                        print(f"[fleet] {label} {r.machine.name}: Included {r.included} (atteso "
+                              f"{expected[r.machine.name]}), errori {r.errors}"); ok = False
+                if changed != (0 if label.endswith("2° pull") else hosts):
+                    print(f"[fleet] {label}: {changed} macchine cambiate"); ok = False
+                if label == "sequenziale":
+                    seq = wall
+                elif label == "pool" and dead and wall >= seq:
+                    print(f"[fleet] pool {wall:.2f} s non più veloce del sequenziale {seq:.2f} s"); ok = False
+        finally:
+            for p in procs:
+                p.terminate(); p.join()
+            for s in sinks:
+                s.close()
+    print("fleet-pull OK" if ok else "FLEET-PULL: CONTROLLI FALLITI")
+    return ok
+
+
+# ---------------------------------- suite ----------------------------------
+# metrica -> (etichetta, soglia di rumore: differenze più piccole non si segnalano); tempi, più basso è meglio
+_SUITE_METRICS = {
+    "parse_s": ("parse s", 0.05),
+    "parse_cache_s": ("cache s", 0.05),
+    "collect_s": ("collect s", 0.05),
+    "from_data_s": ("arrays s", 0.05),
+    "import_s": ("import s", 0.05),
+    "export_s": ("export s", 0.05),
+    "view_build_s": ("view s", 0.05),
+    "first_draw_s": ("draw s", 0.05),
+    "hover_ms": ("hover ms", 2.0),
+    "hover_p95_ms": ("p95 ms", 2.0),
+}
+
+
+def _suite_size(tmp: str, N: int, edits: int, events: int) -> dict:
+    """Tutte le misure della suite su una coppia di ricette sintetiche N×N (stessa pipeline di app.py)."""
+    r = {}
+    grid_path, io_path = synth_recipe.write_recipes(tmp, N)
+    r["lines"] = N * N * len(synth_recipe._PROPS)
+    r["grid_mb"] = os.path.getsize(grid_path) / 2**20
+    # una sola copia del risultato in memoria alla volta (N=1000: 9 milioni di chiavi)
+    recipe_parser.parse_recipe_indexed(str(grid_path), use_cache=True)  # scrive la cache
+    gc.collect()
+    r["parse_cache_s"] = _timed(lambda: recipe_parser.parse_recipe_indexed(str(grid_path), use_cache=True))
+    gc.collect()
+    t0 = time.perf_counter()
+    data, lines, k2l = recipe_parser.parse_recipe_indexed(str(grid_path), use_cache=False)
+    r["parse_s"] = time.perf_counter() - t0
+    gc.collect()
+    r["collect_s"] = _timed(lambda: collect_grid_data(data))
+    gc.collect()
+    t0 = time.perf_counter()
+    grid = GridArrays.from_data(data)
+    r["from_data_s"] = time.perf_counter() - t0
+
+    db, out = os.path.join(tmp, f"ws_{N}.sqlite"), os.path.join(tmp, f"out_{N}.txtrecipe")
+    dbio.init_db(db)
+    r["import_s"] = _timed(lambda: dbio.import_recipe_to_db(db, data, lines, k2l, grid))
+    del data; gc.collect()
+    rng = np.random.default_rng(4)
+    dbio.set_target_value(db, [tuple(c) for c in rng.integers(0, N, size=(edits, 2)).tolist()], 123)
+    r["export_s"] = _timed(lambda: dbio.export_recipe_from_db(db, out))
+    os.remove(out)
+
+    io = load_io_recipe(str(io_path))
+    t0 = time.perf_counter()
+    viewer = plot_view.view_from_file(io, lines, k2l, str(grid_path), grid=grid, io_path=str(io_path))
+    r["view_build_s"] = time.perf_counter() - t0
+    fig, ax = viewer.fig, viewer.ax
+    r["first_draw_s"] = _timed(fig.canvas.draw)
+    lat = []
+    for ev in _fake_events(ax, N, viewer.step, events):  # celle diverse a ogni evento: tooltip + blit
+        t0 = time.perf_counter(); viewer.on_move(ev); lat.append(time.perf_counter() - t0)
+    r["hover_ms"] = float(np.mean(lat)) * 1e3
+    r["hover_p95_ms"] = float(np.percentile(lat, 95)) * 1e3
+    plt.close(fig)
+    del viewer, grid, lines, k2l; gc.collect()
+    return r
+
+
+def _suite_meta() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "numpy": np.__version__, "matplotlib": matplotlib.__version__, "sqlite": sqlite3.sqlite_version,
+            "machine": platform.platform()}
+
+
+def _latest_result(save_dir: str):
+    try:
+        files = sorted(f for f in os.listdir(save_dir) if f.startswith("suite-") and f.endswith(".json"))
+    except OSError:
+        return None
+    return os.path.join(save_dir, files[-1]) if files else None
+
+
+def bench_suite(sizes, edits: int = 50, events: int = 300, save_dir: str = "bench_results",
+                compare: str | None = None, slower: float = 1.25) -> bool:
+    """parse_recipe_indexed (senza e con cache), collect_grid_data, GridArrays.from_data, import ed export DB,
+    costruzione headless del viewer, primo draw e latenza hover, per ogni N su ricette sintetiche.
+
+    I risultati vanno in save_dir/suite-<data>.json e sono confrontati con `compare` (default: l'ultimo
+    file già presente in save_dir); rapporti nuovo/vecchio oltre `slower` (e oltre la soglia di rumore
+della misura) sono segnalati con "!".
+    """
+    prev_path = compare or _latest_result(save_dir)
+    prev = {}
+    if prev_path:
+        try:
+            with open(prev_path, "r", encoding="utf-8") as f:
+                prev = json.load(f).get("results", {})
+        except (OSError, ValueError) as e:
+            print(f"[suite] confronto non disponibile ({prev_path}): {e}"); prev_path = None
+    cols = list(_SUITE_METRICS)
+    print(f"{'N':>6} {'righe':>10} {'MB':>7} " + " ".join(f"{_SUITE_METRICS[c][0]:>10}" for c in cols))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        _suite_size(tmp, 5, 1, 5)  # riscaldamento: font, cache di matplotlib, primi import
+        for N in sizes:
+            r = results[str(N)] = _suite_size(tmp, N, edits, events)
+            print(f"{N:>6} {r['lines']:>10} {r['grid_mb']:>7.1f} " + " ".join(f"{r[c]:>10.2f}" for c in cols))
+            for name in os.listdir(tmp):  # un N alla volta su disco
+                p = os.path.join(tmp, name)
+                if os.path.isfile(p): os.remove(p)
+    worse = []
+    if prev_path:
+        print(f"\nrapporto nuovo/vecchio rispetto a {prev_path}:")
+        print(f"{'N':>6} " + " ".join(f"{_SUITE_METRICS[c][0]:>10}" for c in cols))
+        for N, r in results.items():
+            old = prev.get(N)
+            if not old:
+                continue
+            cells = []
+            for c in cols:
+                if not old.get(c):
+                    cells.append(f"{'-':>10}"); continue
+                ratio = r[c] / old[c]
+                bad = ratio > slower and r[c] - old[c] > _SUITE_METRICS[c][1]
+                if bad: worse.append((N, c, ratio))
+                cells.append(f"{ratio:>9.2f}" + ("!" if bad else " "))
+            print(f"{N:>6} " + " ".join(cells))
+    os.makedirs(save_dir, exist_ok=True)
+    out = os.path.join(save_dir, time.strftime("suite-%Y%m%d-%H%M%S.json"))
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"meta": {**_suite_meta(), "sizes": list(sizes), "edits": edits, "events": events},
+                   "results": results}, f, indent=1)
+    print(f"risultati salvati in {out}" + (f"; {len(worse)} misure più lente di x{slower}" if worse else ""))
+    return True
+
+
+# controlli veloci di `check`: nome -> funzione che ritorna True / False / SKIP
+_CHECKS = {
+    "reload": lambda: bench_reload(N=25, reloads=30),  # dopo i 10 di riscaldamento: 20 reload misurati
+    "ftp": lambda: bench_ftp(files=3, N=10),
+    "fleet": lambda: bench_fleet(hosts=2, N=20, dead=1, timeout=0.5),
+}
+
+
+def _exit_status(res):
+    if res is SKIP:
+        raise SystemExit(77)
+    if not res:
+        raise SystemExit(1)
+
+
+def run_checks():
+    """Esegue _CHECKS; un controllo saltato non conta come passato (uscita 77)."""
+    status = {}
+    for name, fn in _CHECKS.items():
+        print(f"== {name}")
+        status[name] = fn()
+    print("== esito: " + ", ".join(f"{k} {'SALTATO' if v is SKIP else 'ok' if v else 'FALLITO'}"
+                                   for k, v in status.items()))
+    if any(v is False for v in status.values()):
+        raise SystemExit(1)
+    if any(v is SKIP for v in status.values()):
+        raise SystemExit(77)
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter(); fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(prog="bench")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_hit = sub.add_parser("hit", help="Hit-testing mouse → cella")
+    p_hit.add_argument("--sizes", nargs="+", type=int, default=[25, 100, 400])
+    p_hit.add_argument("--events", type=int, default=200)
+    p_inc = sub.add_parser("included", help="Rendering celle Included: patch vs collection")
+    p_inc.add_argument("--sizes", nargs="+", type=int, default=[25, 100, 400])
+    p_grid = sub.add_parser("grid", help="Linee di griglia: axvline/axhline vs LineCollection")
+    p_grid.add_argument("--sizes", nargs="+", type=int, default=[25, 100, 400])
+    p_rel = sub.add_parser("reload", help="Reload ripetuti in-place: artisti e RSS devono restare piatti")
+    p_rel.add_argument("--n", type=int, default=100)
+    p_rel.add_argument("--reloads", type=int, default=300)
+    p_parse = sub.add_parser("parse", help="Parser ricette: righe/s regex vs tokenizer veloce + equivalenza")
+    p_parse.add_argument("--sizes", nargs="+", type=int, default=[100, 400])
+    p_ios = sub.add_parser("iostream", help="IO.txtrecipe grande: parse completo vs streaming con prefissi")
+    p_ios.add_argument("--lines", nargs="+", type=int, default=[200_000, 1_000_000])
+    p_lines = sub.add_parser("lines", help="Righe in memoria: lista di str vs RecipeLines mappata")
+    p_lines.add_argument("--sizes", nargs="+", type=int, default=[100, 400])
+    p_save = sub.add_parser("save", help="Salvataggio edit: riscrittura completa vs patch dei valori")
+    p_save.add_argument("--sizes", nargs="+", type=int, default=[100, 400])
+    p_save.add_argument("--edits", type=int, default=50)
+    p_db = sub.add_parser("db", help="SQLite: connessione per funzione vs Workspace (WAL, una transazione)")
+    p_db.add_argument("--sizes", nargs="+", type=int, default=[100, 400])
+    p_db.add_argument("--ops", type=int, default=50)
+    p_st = sub.add_parser("startup", help="Avvio dei subcomandi CLI (-X importtime): niente matplotlib fuori da view")
+    p_st.add_argument("--n", type=int, default=25)
+    p_ftp = sub.add_parser("ftp", help="Motore di pull FTP su un PLC finto (pyftpdlib): login, RETR, errori per file")
+    p_ftp.add_argument("--files", type=int, default=5)
+    p_ftp.add_argument("--n", type=int, default=25)
+    sub.add_parser("check", help="Controlli veloci con esito (reload, ftp, fleet): 0 passati, 1 falliti, 77 saltati")
+    p_fl = sub.add_parser("fleet", help="fleet-pull su PLC FTP finti (pyftpdlib): un thread vs pool, host muti")
+    p_fl.add_argument("--hosts", type=int, default=4)
+    p_fl.add_argument("--n", type=int, default=100)
+    p_fl.add_argument("--dead", type=int, default=1, help="Host che accettano la connessione e non rispondono")
+    p_fl.add_argument("--timeout", type=float, default=1.0)
+    p_suite = sub.add_parser("suite", help="Suite completa su ricette sintetiche: parse, DB, viewer, hover; salva e confronta")
+    p_suite.add_argument("--sizes", nargs="+", type=int, default=[25, 100, 400, 1000])
+    p_suite.add_argument("--edits", type=int, default=50, help="Celle modificate prima dell'export")
+    p_suite.add_argument("--events", type=int, default=300, help="Eventi hover misurati")
+    p_suite.add_argument("--save-dir", default="bench_results")
+    p_suite.add_argument("--compare", help="JSON di una suite precedente (default: l'ultimo in --save-dir)")
+    p_suite.add_argument("--slower", type=float, default=1.25, help="Soglia del rapporto nuovo/vecchio segnalato")
+    args = ap.parse_args()
+
+    if args.cmd == "hit":
+        bench_hit(args.sizes, args.events)
+    elif args.cmd == "included":
+        bench_included(args.sizes)
+    elif args.cmd == "grid":
+        bench_grid(args.sizes)
+    elif args.cmd == "reload":
+        if not bench_reload(args.n, args.reloads):
+            raise SystemExit(1)
+    elif args.cmd == "parse":
+        if not bench_parse(args.sizes):
+            raise SystemExit(1)
+    elif args.cmd == "save":
+        if not bench_save(args.sizes, args.edits):
+            raise SystemExit(1)
+    elif args.cmd == "lines":
+        if not bench_lines(args.sizes):
+            raise SystemExit(1)
+    elif args.cmd == "db":
+        if not bench_db(args.sizes, args.ops):
+            raise SystemExit(1)
+    elif args.cmd == "suite":
+        bench_suite(args.sizes, args.edits, args.events, args.save_dir, args.compare, args.slower)
+    elif args.cmd == "startup":
+        if not bench_startup(args.n):
+            raise SystemExit(1)
+    elif args.cmd == "ftp":
+        _exit_status(bench_ftp(args.files, args.n))
+    elif args.cmd == "check":
+        run_checks()
+    elif args.cmd == "fleet":
+        _exit_status(bench_fleet(args.hosts, args.n, args.dead, args.timeout))
+    elif args.cmd == "iostream":
+        if not bench_io_stream(args.lines):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,9 @@ INCLUDED_ALPHA = 0.35
 INCLUDED_EDGE = None
 INCLUDED_EDGEWIDTH = 0.0
 Z_INCLUDED = 10
+# "collection": tutte le celle in un solo artista (PolyCollection, veloce)
+# "patches": una Rectangle per cella (vecchio percorso, lento con griglie grandi)
+INCLUDED_RENDER = "collection"
 
 # --- Perimetro e punti ---
 PERIMETER_COLOR = "tab:brown"
@@ -50,6 +53,36 @@ SHOW_PATH_INDEX = True
 SHOW_LAST_DEPTH = False
 SHOW_TARGET_DEPTH = False
 PATH_TEXT_FONTSIZE = 10  # grandezza numeri dentro le celle
+# livello di dettaglio: testi solo per celle nella vista e abbastanza grandi a schermo
+OVERLAY_MIN_CELL_PX = 14    # lato minimo cella (pixel) per mostrare i numeri
+OVERLAY_MAX_TEXTS = 2500    # oltre questo numero di celle visibili i testi restano nascosti
+
+# --- Navigazione (la toolbar è nascosta) ---
+ZOOM_STEP = 1.25            # fattore per scatto della rotella
+PAN_BUTTONS = (2, 3)        # trascina con tasto centrale/destro; 'h' ripristina la vista
+
+# --- Edit Target_Depth_cm: journal + salvataggio differito ---
+EDIT_JOURNAL = True                 # ogni edit annotato (fsync) in <ricetta>_edits.jsonl; ctrl+z / ctrl+y
+EDIT_JOURNAL_SUFFIX = "_edits.jsonl"
+EDIT_SAVE_DEBOUNCE_MS = 1500        # la ricetta _edited si scrive dopo questa pausa (o alla chiusura)
+
+# --- Selezione multipla (trascina = rettangolo, shift = aggiungi; Invio = modifica, Esc = annulla) ---
+SELECT_FACE = "gold"
+SELECT_ALPHA = 0.35
+SELECT_EDGE = "darkorange"
+Z_SELECT = 90
+DRAG_MIN_PX = 5             # sotto questo spostamento il trascinamento è un click
+
+# --- Render headless (comando render: PNG/SVG senza Tk, popup né FTP) ---
+RENDER_FORMAT = "png"       # "png" o "svg"
+RENDER_DPI = 100
+RENDER_WORKERS = 0          # processi del pool; 0 = uno per CPU
+RENDER_PAIR_MAX_S = 300     # backup GPS_Grid_<ts> / IO_<ts>: distanza massima tra i timestamp da accoppiare
+
+# --- DB di lavoro (SQLite, comandi import/reset-included/set-target/export) ---
+DB_JOURNAL_MODE = "WAL"     # lettori e scrittore non si bloccano; file -wal/-shm accanto al DB
+DB_SYNCHRONOUS = "NORMAL"   # con WAL: nessuna corruzione su crash, al più si perde l'ultima transazione
+DB_CACHE_MB = 64            # cache pagine SQLite per connessione (import grandi: meno I/O sugli indici)
 
 # --- FTP (SOLO PULL) ---
 FTP_ENABLED = True
@@ -58,6 +91,13 @@ FTP_USER = "root"
 FTP_PASS = "pdm3"
 FTP_TIMEOUT = 8
 FTP_PASSIVE = True
+FTP_PORT = 21
+# sessioni FTP contemporanee per un pull di più file (1 = un solo login per tutti i file)
+FTP_PARALLEL = 1
+# pull condizionale: salta il download se SIZE/MDTM remoti coincidono con la cache locale;
+# un file scaricato ma identico (sha256) non genera backup né re-parse
+FTP_CONDITIONAL = True
+FTP_META_FILENAME = ".ftp_meta.json"
 
 # percorso remoto del file da scaricare (percorso UNIX lato FTP)
 FTP_REMOTE_PATH = "/home/cds-apps/Backup/GPS_Grid.txtrecipe"
@@ -71,6 +111,20 @@ PREFIX = "GVL.GPS_Grid_data"
 # prova a scaricare automaticamente prima di leggere il file
 FTP_PULL_ON_START = True
 
+# --- Flotta (comando fleet-pull: GRID+IO da più PLC in parallelo) ---
+# inventario JSON [{"name", "host", ...}] (vedi fleet.py); se il file non esiste si usa FLEET_MACHINES
+FLEET_INVENTORY = "fleet.json"
+FLEET_MACHINES = []          # stesse voci del JSON; campi assenti = valori FTP_* qui sopra
+FLEET_DIR = "fleet"          # cartella locale di default: FLEET_DIR/<name>
+FLEET_WORKERS = 8            # macchine in parallelo (thread)
+
+# --- Cache di parse delle ricette ---
+PARSE_CACHE_ENABLED = True
+PARSE_CACHE_DIR = ".recipe_cache"      # cartella accanto alla ricetta
+PARSE_CACHE_MAX_ENTRIES = 8            # voci più vecchie eliminate oltre questo numero
+PARSE_CACHE_MTIME_SLACK_S = 2.0        # mtime più recente di così rispetto al salvataggio: si verifica l'hash
+RECIPE_MMAP = True                     # righe lette dal file mappato (solo offset in memoria)
+
 # timestamp per i backup locali
 BACKUP_STAMP_FMT = "%Y%m%d-%H%M%S"
 
@@ -1,138 +1,457 @@
 # -*- coding: utf-8 -*-
-"""Supporto SQLite: init, import, reset included, set target, export fedele al file."""
-import re, sqlite3
-from typing import Any, Dict, List, Tuple
+"""Supporto SQLite: init, import, reset included, set target, export fedele al file.
+
+Workspace tiene UNA connessione per tutta la sessione (WAL, synchronous=NORMAL) e raggruppa
+ogni operazione in una transazione esplicita; le funzioni a livello modulo restano come
+scorciatoie che aprono un Workspace, fanno una cosa e lo chiudono.
+
+grid_cells porta l'indice riga delle proprietà modificabili (included_line, target_line) e un
+flag dirty messo dalle modifiche: l'export patcha solo le celle dirty, senza lookup in keys_map.
+
+sync_recipe() re-importa una ricetta appena scaricata confrontando le righe con quelle nel DB:
+aggiorna solo righe e celle cambiate e tiene le modifiche locali, segnalando i conflitti.
+"""
+from __future__ import annotations
+import os, re, sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import groupby, islice
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
 
 from recipe_parser import parse_value
+from recipe_lines import line_value, patch_value
+from grid_model import GridArrays, format_value, selection_mask
+import config as CFG
+import perf
 
 
-def init_db(db_path: str):
-    db = sqlite3.connect(db_path)
-    cur = db.cursor()
-    cur.executescript(
+# colonna indice riga -> proprietà della ricetta
+_LINE_COLS = (("included_line", "Included"), ("target_line", "Target_Depth_cm"))
+_SQL_DIRTY_INDEX = "CREATE INDEX IF NOT EXISTS grid_cells_dirty ON grid_cells(x, y) WHERE dirty=1"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS grid_cells(
+  x INT, y INT,
+  included INTEGER, first_depth_cm REAL, last_depth_cm REAL,
+  target_depth_cm REAL, center_east_dm REAL, center_north_dm REAL,
+  edges_crossed INT, error INTEGER,
+  included_line INT, target_line INT, dirty INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY(x,y)
+);
+CREATE TABLE IF NOT EXISTS cfg(
+  key TEXT PRIMARY KEY, value TEXT
+);
+CREATE TABLE IF NOT EXISTS lines(
+  idx INTEGER PRIMARY KEY, content TEXT
+);
+CREATE TABLE IF NOT EXISTS keys_map(
+  key TEXT PRIMARY KEY, line_idx INT
+) WITHOUT ROWID;
+{_SQL_DIRTY_INDEX};
+"""
+
+# SQL costanti: sqlite3 riusa lo statement preparato (cache per connessione) a ogni chiamata
+_SQL_CFG = "INSERT OR REPLACE INTO cfg(key,value) VALUES(?,?)"
+_SQL_LINE = "INSERT OR REPLACE INTO lines(idx,content) VALUES(?,?)"
+_SQL_KEY = "INSERT OR REPLACE INTO keys_map(key,line_idx) VALUES(?,?)"
+_SQL_CELL = """INSERT OR REPLACE INTO grid_cells
+    (x,y,included,first_depth_cm,last_depth_cm,target_depth_cm,center_east_dm,center_north_dm,edges_crossed,error,
+     included_line,target_line,dirty)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+# solo le celle che cambiano davvero diventano dirty (e contano nel risultato)
+_SQL_RESET_CELL = "UPDATE grid_cells SET included=0, dirty=1 WHERE x=? AND y=? AND included=1"
+_SQL_RESET_RECT = """UPDATE grid_cells SET included=0, dirty=1
+    WHERE x BETWEEN ? AND ? AND y BETWEEN ? AND ? AND included=1"""
+_SQL_TARGET = """UPDATE grid_cells SET target_depth_cm=?1, dirty=1
+    WHERE x=?2 AND y=?3 AND target_depth_cm IS NOT NULL AND target_depth_cm != ?1"""
+_SQL_INCLUDED = """UPDATE grid_cells SET included=?1, dirty=1
+    WHERE x=?2 AND y=?3 AND included IS NOT NULL AND included != ?1"""
+_CFG_PREFIXES = ("IO.GPS.Cfg.", "IO.GPS.Vis.", "IO.GPS.Sts.")
+_GRID_KEY_RE = re.compile(r"\s*GVL\.GPS_Grid_data\[(\d+)\]\[(\d+)\]\.")
+# posizione in una riga di _grid_rows: (colonna valore, colonna indice riga) delle proprietà modificabili
+_EDITABLE = ((2, 10, "Included"), (5, 11, "Target_Depth_cm"))
+
+
+@dataclass
+class SyncReport:
+    """Esito di Workspace.sync_recipe."""
+    mode: str = "incrementale"     # "incrementale" o "completo" (DB vuoto o struttura cambiata)
+    lines: int = 0                 # righe cambiate
+    cells: int = 0                 # celle riscritte
+    cfg: int = 0                   # voci cfg cambiate
+    kept: int = 0                  # celle con modifiche locali mantenute
+    lost: int = 0                  # celle con modifiche locali perse (import completo)
+    conflicts: List[Tuple[str, Any, Any, Any]] = field(default_factory=list)  # (chiave, base, PLC, locale)
+
+
+@dataclass
+class ApplyReport:
+    """Esito di Workspace.apply_ops."""
+    read: int = 0                  # operazioni lette
+    valid: int = 0                 # operazioni applicate (validate)
+    changed: int = 0               # celle il cui valore è cambiato davvero
+    rejected: int = 0
+    rolled_back: bool = False      # strict: nulla applicato perché qualcosa è stato scartato
+    errors: List[Tuple[int, str]] = field(default_factory=list)  # (riga, motivo), al più _MAX_ERRORS
+
+    def reject(self, lineno: int, msg: str):
+        self.rejected += 1
+        if len(self.errors) < _MAX_ERRORS:
+            self.errors.append((lineno, msg))
+
+
+_MAX_ERRORS = 100
+
+
+def _sql_col(values: np.ndarray, missing: np.ndarray) -> np.ndarray:
+    """Colonna per SQLite: valori Python (float/int) e None dove manca (NaN o -1)."""
+    out = values.astype(object)
+    out[missing] = None
+    return out
+
+
+def _grid_rows(grid: GridArrays, key_to_line: Dict[str, int] | None = None,
+               mask: np.ndarray | None = None) -> List[Tuple]:
+    """Righe grid_cells dalle colonne di GridArrays (celle presenti nel file, ristrette a `mask`), colonna per
+    colonna; dirty=0. I numeri interi restano float: l'affinità delle colonne (REAL/INT) li salva come prima.
+    Gli indici riga di Included/Target_Depth_cm arrivano da key_to_line (None se la chiave manca)."""
+    xs, ys = np.nonzero(grid.present if mask is None else grid.present & mask)
+    inc, err = grid.included[xs, ys], grid.error[xs, ys]
+    cols = [xs, ys, _sql_col(inc, inc < 0)]
+    for a in (grid.first_depth, grid.last_depth, grid.target_depth,
+              grid.center_east, grid.center_north, grid.edges_crossed):
+        v = a[xs, ys]; cols.append(_sql_col(v, np.isnan(v)))
+    cols.append(_sql_col(err, err < 0))
+    k2l = key_to_line or {}
+    for _, prop in _LINE_COLS:
+        cols.append([k2l.get(f"GVL.GPS_Grid_data[{x}][{y}].{prop}") for x, y in zip(xs.tolist(), ys.tolist())])
+    cols.append([0] * len(xs))
+    return list(zip(*(c if isinstance(c, list) else c.tolist() for c in cols)))
+
+
+def _text_to_sql(line: str) -> Any:
+    """Valore di una riga ricetta come sta in grid_cells (bool -> 0/1, numeri, None se manca)."""
+    v = line_value(line)
+    if v is None:
+        return None
+    v = parse_value(v)
+    return int(v) if isinstance(v, bool) else v
+
+
+class Workspace:
+    """Connessione SQLite persistente al DB di lavoro.
+
+    Pragma: journal_mode (DB_JOURNAL_MODE, default WAL), synchronous (DB_SYNCHRONOUS, default
+    NORMAL: in WAL un crash non corrompe il DB, al più perde l'ultima transazione), cache pagine
+    di DB_CACHE_MB, tabelle temporanee in memoria. Ogni metodo che scrive gira in una transazione;
+    transaction() permette di raggruppare più chiamate in una sola.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        with perf.phase("db.open"):
+            self._open()
+
+    def _open(self):
+        # isolation_level=None: BEGIN/COMMIT espliciti, nessuna transazione implicita del modulo sqlite3
+        self.db = sqlite3.connect(self.db_path, isolation_level=None)
+        self.db.execute(f"PRAGMA journal_mode={getattr(CFG, 'DB_JOURNAL_MODE', 'WAL')}")
+        self.db.execute(f"PRAGMA synchronous={getattr(CFG, 'DB_SYNCHRONOUS', 'NORMAL')}")
+        self.db.execute("PRAGMA temp_store=MEMORY")
+        self.db.execute(f"PRAGMA cache_size={-1024 * int(getattr(CFG, 'DB_CACHE_MB', 64))}")
+        self._depth = 0
+        self._upgrade()
+
+    def __enter__(self) -> "Workspace":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close(); self.db = None
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT (ROLLBACK su eccezione); annidabile, conta la più esterna."""
+        if self._depth == 0:
+            self.db.execute("BEGIN IMMEDIATE")
+        self._depth += 1
+        try:
+            yield self.db
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0: self.db.execute("ROLLBACK")
+            raise
+        self._depth -= 1
+        if self._depth == 0: self.db.execute("COMMIT")
+
+    def _upgrade(self):
+        """DB creati prima di included_line/target_line/dirty: aggiunge le colonne (ALTER TABLE), le riempie
+        da keys_map e segna tutte le celle dirty (le modifiche precedenti non sono tracciate)."""
+        cols = {r[1] for r in self.db.execute("PRAGMA table_info(grid_cells)")}
+        if not cols or "dirty" in cols:
+            return
+        with self.transaction() as db:
+            for col, prop in _LINE_COLS:
+                db.execute(f"ALTER TABLE grid_cells ADD COLUMN {col} INT")
+                db.execute(f"""UPDATE grid_cells SET {col} = (SELECT line_idx FROM keys_map
+                               WHERE key = 'GVL.GPS_Grid_data[' || x || '][' || y || '].{prop}')""")
+            db.execute("ALTER TABLE grid_cells ADD COLUMN dirty INTEGER NOT NULL DEFAULT 0")
+            db.execute("UPDATE grid_cells SET dirty=1")
+            db.execute(_SQL_DIRTY_INDEX)
+        print(f"[db] {self.db_path}: aggiunte colonne indice riga e dirty (export completo alla prossima esportazione)")
+
+    # ------------------------------------------------------------------ import
+    def init_schema(self):
+        with self.transaction() as db:
+            for stmt in _SCHEMA.split(";"):
+                if stmt.strip(): db.execute(stmt)
+
+    def import_recipe(self, data: Dict[str, Any], lines: Iterable[str], key_to_line: Dict[str, int],
+                      grid: GridArrays | None = None):
+        """Importa cfg, righe, mappa chiavi e celle in UNA transazione (executemany in streaming).
+        Righe, chiavi e celle della ricetta precedente vengono sostituite (modifiche locali comprese);
+        cfg si unisce. Se `grid` manca viene ricavata da `data`."""
+        if grid is None:
+            grid = GridArrays.from_data(data)
+        with perf.phase("db.import"), self.transaction() as db:
+            db.executemany(_SQL_CFG, ((k, str(v)) for k, v in data.items() if k.startswith(_CFG_PREFIXES)))
+            for table in ("lines", "keys_map", "grid_cells"):
+                db.execute(f"DELETE FROM {table}")
+            db.executemany(_SQL_LINE, enumerate(lines))
+            db.executemany(_SQL_KEY, key_to_line.items())
+            db.executemany(_SQL_CELL, _grid_rows(grid, key_to_line))
+
+    def sync_recipe(self, data: Dict[str, Any], lines: Sequence[str], key_to_line: Dict[str, int],
+                    grid: GridArrays | None = None) -> SyncReport:
+        """Re-import incrementale di una ricetta con la stessa struttura (stesse righe e chiavi).
+
+        Le righe nuove si confrontano con quelle nel DB (una lettura sequenziale); si aggiornano solo
+        le righe cambiate e le celle che le contengono. Per Included/Target_Depth_cm di una cella dirty
+        il valore locale resta se differisce dalla base (valore della riga prima del sync); se anche il
+        PLC ha cambiato quel valore, in modo diverso, è un conflitto: vince il locale e finisce nel report.
+        DB vuoto o struttura diversa (numero righe, chiavi) -> import completo, modifiche locali perse.
         """
-        CREATE TABLE IF NOT EXISTS grid_cells(
-          x INT, y INT,
-          included INTEGER, first_depth_cm REAL, last_depth_cm REAL,
-          target_depth_cm REAL, center_east_dm REAL, center_north_dm REAL,
-          edges_crossed INT, error INTEGER,
-          PRIMARY KEY(x,y)
-        );
-        CREATE TABLE IF NOT EXISTS cfg(
-          key TEXT PRIMARY KEY, value TEXT
-        );
-        CREATE TABLE IF NOT EXISTS lines(
-          idx INTEGER PRIMARY KEY, content TEXT
-        );
-        CREATE TABLE IF NOT EXISTS keys_map(
-          key TEXT PRIMARY KEY, line_idx INT
-        );
+        if grid is None:
+            grid = GridArrays.from_data(data)
+        report = SyncReport()
+        with perf.phase("db.sync"), self.transaction() as db:
+            n_old = db.execute("SELECT count(*) FROM lines").fetchone()[0]
+            changed: Dict[int, str] = {}  # indice riga -> testo PRIMA del sync
+            same = n_old == len(lines) and n_old > 0
+            if same:
+                for idx, ((old,), new) in enumerate(zip(db.execute("SELECT content FROM lines ORDER BY idx"), lines)):
+                    if old == new:
+                        continue
+                    k_old, sep_old, _ = old.partition(":="); k_new, sep_new, _ = new.partition(":=")
+                    if k_old != k_new or sep_old != sep_new:
+                        same = False; break
+                    changed[idx] = old
+            if not same:
+                report.mode = "completo"
+                report.lost = db.execute("SELECT count(*) FROM grid_cells WHERE dirty=1").fetchone()[0]
+                self.import_recipe(data, lines, key_to_line, grid)
+                report.lines, report.cells = len(lines), int(grid.present.sum())
+                return report
+
+            old_cfg = dict(db.execute("SELECT key, value FROM cfg"))
+            cfg = [(k, str(v)) for k, v in data.items() if k.startswith(_CFG_PREFIXES) and old_cfg.get(k) != str(v)]
+            db.executemany(_SQL_CFG, cfg)
+            db.executemany("UPDATE lines SET content=? WHERE idx=?", ((lines[i], i) for i in changed))
+
+            touched = {(int(m[1]), int(m[2])) for m in (_GRID_KEY_RE.match(changed[i]) for i in changed) if m}
+            rows = []
+            for row in _grid_rows(grid, key_to_line, selection_mask(grid.n, coords=sorted(touched))):
+                row = list(row)
+                cur = db.execute("SELECT included, target_depth_cm, dirty FROM grid_cells WHERE x=? AND y=?",
+                                 row[:2]).fetchone()
+                if cur is not None and cur[2]:
+                    for (vcol, lcol, prop), local in zip(_EDITABLE, cur[:2]):
+                        plc = row[vcol]
+                        base = _text_to_sql(changed[row[lcol]]) if row[lcol] in changed else plc
+                        if local == base:
+                            continue  # nessuna modifica locale: vale il PLC
+                        if plc != base and plc != local:
+                            report.conflicts.append((f"GVL.GPS_Grid_data[{row[0]}][{row[1]}].{prop}", base, plc, local))
+                        row[vcol] = local
+                        row[-1] = row[-1] or int(local != plc)
+                    report.kept += row[-1]
+                rows.append(row)
+            db.executemany(_SQL_CELL, rows)
+            report.lines, report.cells, report.cfg = len(changed), len(rows), len(cfg)
+        return report
+
+    # ---------------------------------------------------------------- modifiche
+    def _cell_masks(self) -> np.ndarray:
+        """Maschere (3, n, n): celle con Included, con Target_Depth_cm, con entrambi i centri."""
+        rows = np.array(self.db.execute(
+            """SELECT x, y, included IS NOT NULL, target_depth_cm IS NOT NULL,
+                      center_east_dm IS NOT NULL AND center_north_dm IS NOT NULL FROM grid_cells""").fetchall(),
+            dtype=np.int64).reshape(-1, 5)
+        n = int(rows[:, :2].max()) + 1 if len(rows) else 1
+        masks = np.zeros((3, n, n), dtype=bool)
+        for k in range(3):
+            masks[k, rows[:, 0], rows[:, 1]] = rows[:, 2 + k] == 1
+        return masks
+
+    def apply_ops(self, ops: Iterable[Tuple[int, str | None, int, int, Any]], batch: int = 5000,
+                  strict: bool = False) -> ApplyReport:
+        """Applica operazioni (riga, "included"|"target", x, y, valore) lette in streaming (batch_ops.iter_ops).
+
+        A blocchi di `batch`: coordinate validate tutte insieme sulle maschere di grid_cells (celle con la
+        chiave; niente Included=TRUE senza centri, come nel viewer), poi un executemany per ogni sequenza di
+        operazioni dello stesso tipo (l'ordine del file resta), una transazione per blocco.
+        strict=True: una sola transazione, annullata se anche una sola operazione è scartata.
         """
-    )
-    db.commit(); db.close()
-
-
-def import_recipe_to_db(db_path: str, data: Dict[str, Any], lines: List[str], key_to_line: Dict[str, int]):
-    db = sqlite3.connect(db_path)
-    cur = db.cursor()
-    # cfg
-    for k, v in data.items():
-        if k.startswith("IO.GPS.Cfg.") or k.startswith("IO.GPS.Vis.") or k.startswith("IO.GPS.Sts."):
-            cur.execute("INSERT OR REPLACE INTO cfg(key,value) VALUES(?,?)", (k, str(v)))
-
-    # lines, keys_map
-    cur.executemany("INSERT OR REPLACE INTO lines(idx,content) VALUES(?,?)", [(i, s) for i, s in enumerate(lines)])
-    cur.executemany("INSERT OR REPLACE INTO keys_map(key,line_idx) VALUES(?,?)", key_to_line.items())
-    # grid
-    grid: Dict[Tuple[int, int], Dict[str, Any]] = {}
-    import re
-    grid_re = re.compile(r"^GVL\.GPS_Grid_data\[(\d+)\]\[(\d+)\]\.([A-Za-z_]\w*)$")
-    for k, v in data.items():
-        m = grid_re.match(k)
-        if not m:
-            continue
-        x, y, prop = int(m.group(1)), int(m.group(2)), m.group(3)
-        d = grid.setdefault((x, y), {})
-        d[prop] = v
-    rows = []
-    for (x, y), d in grid.items():
-        rows.append((
-            x, y,
-            1 if d.get("Included") is True else (0 if d.get("Included") is False else None),
-            d.get("First_Depth_Read_cm"),
-            d.get("Last_Depth_Read_cm"),
-            d.get("Target_Depth_cm"),
-            d.get("Center_Relative_East_dm"),
-            d.get("Center_Relative_North_dm"),
-            d.get("Edges_Crossed"),
-            1 if d.get("Error") is True else (0 if d.get("Error") is False else None),
-        ))
-    cur.executemany(
-        """INSERT OR REPLACE INTO grid_cells
-            (x,y,included,first_depth_cm,last_depth_cm,target_depth_cm,center_east_dm,center_north_dm,edges_crossed,error)
-            VALUES (?,?,?,?,?,?,?,?,?,?)""",
-        rows,
-    )
-    db.commit(); db.close()
-
-
-def reset_included(db_path: str, coords=None, rect=None):
-    db = sqlite3.connect(db_path); cur = db.cursor()
-    if coords:
-        cur.executemany("UPDATE grid_cells SET included=0 WHERE x=? AND y=? AND included IS NOT NULL", coords)
-    elif rect:
-        x0, x1, y0, y1 = rect
-        cur.execute(
-            """UPDATE grid_cells SET included=0
-                   WHERE x BETWEEN ? AND ? AND y BETWEEN ? AND ? AND included IS NOT NULL""",
-            (x0, x1, y0, y1),
-        )
-    db.commit(); db.close()
-
-
-def set_target_value(db_path: str, coords, value: float):
-    db = sqlite3.connect(db_path); cur = db.cursor()
-    cur.executemany("UPDATE grid_cells SET target_depth_cm=? WHERE x=? AND y=?", [(value, x, y) for x, y in coords])
-    db.commit(); db.close()
+        report = ApplyReport()
+        with perf.phase("db.apply"):
+            return self._apply(ops, batch, strict, report)
+
+    def _apply(self, ops, batch: int, strict: bool, report: ApplyReport) -> ApplyReport:
+        if not strict:
+            self._apply_batches(iter(ops), batch, report)
+            return report
+        try:
+            with self.transaction():
+                self._apply_batches(iter(ops), batch, report)
+                if report.rejected:
+                    raise _Rollback
+        except _Rollback:
+            report.rolled_back = True
+        return report
+
+    def _apply_batches(self, it, batch: int, report: ApplyReport):
+        masks = self._cell_masks()
+        n = masks.shape[1]
+        while True:
+            chunk = list(islice(it, batch))
+            if not chunk:
+                break
+            report.read += len(chunk)
+            for lineno, kind, _, _, msg in chunk:
+                if kind is None: report.reject(lineno, msg)
+            good = [o for o in chunk if o[1] is not None]
+            if not good:
+                continue
+            xs = np.fromiter((o[2] for o in good), np.int64, len(good))
+            ys = np.fromiter((o[3] for o in good), np.int64, len(good))
+            is_tgt = np.fromiter((o[1] == "target" for o in good), bool, len(good))
+            turn_on = np.fromiter((o[1] == "included" and o[4] == 1 for o in good), bool, len(good))
+            inside = (xs >= 0) & (xs < n) & (ys >= 0) & (ys < n)
+            xi, yi = np.where(inside, xs, 0), np.where(inside, ys, 0)
+            has = inside & np.where(is_tgt, masks[1, xi, yi], masks[0, xi, yi])
+            ok = has & ~(turn_on & ~masks[2, xi, yi])
+            for i in np.flatnonzero(~ok).tolist():
+                lineno, kind, x, y, _ = good[i]
+                prop = "Target_Depth_cm" if kind == "target" else "Included"
+                report.reject(lineno, f"[{x}][{y}] fuori griglia" if not inside[i] else
+                              f"[{x}][{y}] senza {prop} nel file" if not has[i] else
+                              f"[{x}][{y}] Included=TRUE senza centri (Center_*)")
+            valid = [good[i] for i in np.flatnonzero(ok).tolist()]
+            with perf.phase("write"), self.transaction() as db:
+                for kind, group in groupby(valid, key=lambda o: o[1]):
+                    sql = _SQL_TARGET if kind == "target" else _SQL_INCLUDED
+                    report.changed += db.executemany(sql, ((v, x, y) for _, _, x, y, v in group)).rowcount
+            report.valid += len(valid)
+
+    def reset_included(self, coords: Sequence[Tuple[int, int]] | None = None, rect=None) -> int:
+        """Included=FALSE sulle celle indicate che hanno la chiave (stessa regola di grid_model.reset_included).
+        Ritorna le celle cambiate."""
+        with perf.phase("db.write"), self.transaction() as db:
+            if coords:
+                return db.executemany(_SQL_RESET_CELL, coords).rowcount
+            if rect:
+                x0, x1, y0, y1 = rect
+                (x0, x1), (y0, y1) = sorted((x0, x1)), sorted((y0, y1))
+                return db.execute(_SQL_RESET_RECT, (x0, x1, y0, y1)).rowcount
+        return 0
+
+    def set_target_value(self, coords: Sequence[Tuple[int, int]], value: float) -> int:
+        """Target_Depth_cm sulle celle indicate che hanno la chiave (stessa regola di grid_model.set_target).
+        Ritorna le celle cambiate."""
+        with perf.phase("db.write"), self.transaction() as db:
+            return db.executemany(_SQL_TARGET, ((value, x, y) for x, y in coords)).rowcount
+
+    # ------------------------------------------------------------------ export
+    def value_edits(self, dirty_only: bool = True) -> Dict[int, str]:
+        return _db_value_edits(self.db, dirty_only)
+
+    def export_recipe(self, out_path: str) -> int:
+        """Righe originali dal DB con i valori Included/Target delle sole celle dirty sostituiti; le righe
+        invariate passano in blocco dal cursore al file (nessun lavoro Python per riga). Temporaneo poi
+        rinominato; una sola transazione di lettura. Ritorna le righe patchate."""
+        tmp = str(out_path) + ".tmp"
+        with perf.phase("db.export"), self.transaction() as db, open(tmp, "w", encoding="utf-8") as f:
+            edits = self.value_edits()
+            rows = db.execute("SELECT content FROM lines ORDER BY idx")  # idx contigui da 0 (import)
+            pos = 0
+            for idx in sorted(edits):
+                f.writelines(r[0] for r in islice(rows, idx - pos))
+                row = next(rows, None)
+                if row is None:
+                    break
+                f.write(_patch_line(row[0], edits[idx])); pos = idx + 1
+            f.writelines(r[0] for r in rows)
+        os.replace(tmp, out_path)
+        return len(edits)
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _db_value_edits(db, dirty_only: bool = True) -> Dict[int, str]:
+    """indice riga -> nuovo valore (Included, Target_Depth_cm) dalle colonne riga di grid_cells;
+    dirty_only: solo le celle modificate dopo l'import (indice parziale su dirty)."""
+    edits: Dict[int, str] = {}
+    for inc_line, incl, tgt_line, tgt in db.execute(
+            "SELECT included_line, included, target_line, target_depth_cm FROM grid_cells"
+            + (" WHERE dirty=1" if dirty_only else "")):
+        if inc_line is not None and incl is not None:
+            edits[inc_line] = "TRUE" if incl == 1 else "FALSE"
+        if tgt_line is not None and tgt is not None:
+            edits[tgt_line] = format_value(tgt)
+    return edits
 
 
 def _patch_line(old_line: str, new_value: str) -> str:
-    # sostituisce solo la parte dopo ':=' mantenendo eventuali commenti di fine riga
-    parts = re.split(r"(:=\s*)", old_line, maxsplit=1)
-    if len(parts) >= 3:
-        head = parts[0] + parts[1]
-        tail = old_line[old_line.find(parts[2]):]
-        cpos = tail.find("//")
-        if cpos >= 0:
-            comment = tail[cpos:]
-            return head + f"{new_value} " + comment + ("\n" if not tail.endswith("\n") else "")
-        return head + f"{new_value}\n"
-    return old_line
-
-
-def export_recipe_from_db(db_path: str, out_path: str):
-    db = sqlite3.connect(db_path); cur = db.cursor()
-    lines = [row[0] for row in cur.execute("SELECT content FROM lines ORDER BY idx").fetchall()]
-
-    # Included
-    for x, y, incl in cur.execute("SELECT x,y,included FROM grid_cells WHERE included IS NOT NULL"):
-        key = f"GVL.GPS_Grid_data[{x}][{y}].Included"
-        row = cur.execute("SELECT line_idx FROM keys_map WHERE key=?", (key,)).fetchone()
-        if not row:
-            continue
-        idx = row[0]; new_val = "TRUE" if incl == 1 else "FALSE"
-        lines[idx] = _patch_line(lines[idx], new_val)
-
-    # Target_Depth_cm
-    for x, y, val in cur.execute("SELECT x,y,target_depth_cm FROM grid_cells WHERE target_depth_cm IS NOT NULL"):
-        key = f"GVL.GPS_Grid_data[{x}][{y}].Target_Depth_cm"
-        row = cur.execute("SELECT line_idx FROM keys_map WHERE key=?", (key,)).fetchone()
-        if not row:
-            continue
-        idx = row[0]
-        new_val = str(int(val)) if float(val).is_integer() else str(val)
-        lines[idx] = _patch_line(lines[idx], new_val)
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.writelines(lines)
-    db.close()
\ No newline at end of file
+    # sostituisce solo il valore dopo ':=' mantenendo spazi, commenti di fine riga e terminatore
+    return patch_value(old_line, new_value)
+
+
+# ------------------------------- scorciatoie (una operazione, una connessione)
+def init_db(db_path: str):
+    with Workspace(db_path) as ws:
+        ws.init_schema()
+
+
+def import_recipe_to_db(db_path: str, data: Dict[str, Any], lines: List[str], key_to_line: Dict[str, int],
+                        grid: GridArrays | None = None, incremental: bool = False) -> SyncReport | None:
+    """Importa cfg, righe, mappa chiavi e celle. Se `grid` manca viene ricavata da `data`.
+    incremental=True: solo le differenze, tenendo le modifiche locali (vedi Workspace.sync_recipe)."""
+    with Workspace(db_path) as ws:
+        if incremental:
+            return ws.sync_recipe(data, lines, key_to_line, grid)
+        ws.import_recipe(data, lines, key_to_line, grid)
+
+
+def reset_included(db_path: str, coords=None, rect=None) -> int:
+    """Included=FALSE sulle celle indicate che hanno la chiave (stessa regola di grid_model.reset_included)."""
+    with Workspace(db_path) as ws:
+        return ws.reset_included(coords=coords, rect=rect)
+
+
+def set_target_value(db_path: str, coords, value: float) -> int:
+    """Target_Depth_cm sulle celle indicate che hanno la chiave (stessa regola di grid_model.set_target)."""
+    with Workspace(db_path) as ws:
+        return ws.set_target_value(coords, value)
+
+
+def export_recipe_from_db(db_path: str, out_path: str) -> int:
+    """Esporta la ricetta dal DB (vedi Workspace.export_recipe); ritorna le righe patchate."""
+    with Workspace(db_path) as ws:
+        return ws.export_recipe(out_path)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Journal append-only delle modifiche fatte nel viewer, uno per ricetta sorgente.
+
+Una riga JSON per evento, scritta con flush + fsync: un crash perde al massimo la riga
+in corso (una riga troncata in coda viene ignorata alla lettura). Una modifica in blocco
+è un solo evento, annullato e ripetuto come unità:
+    {"op": "set", "t": 1700000000.0, "edits": [{"key": ..., "old": "0", "new": "150", ...}, ...]}
+    {"op": "undo", "t": ...}      {"op": "redo", "t": ...}
+Rileggendo il file si ricostruiscono gli stack fatto/annullato; effective() dà il
+risultato netto per chiave, da riapplicare su una ricetta appena scaricata.
+"""
+from __future__ import annotations
+import json, os, time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class EditJournal:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.done: List[Dict[str, Any]] = []
+        self.undone: List[Dict[str, Any]] = []
+        self._f = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try: rec = json.loads(line)
+                    except ValueError: continue  # riga troncata da un crash
+                    self._apply(rec)
+        except OSError:
+            pass
+
+    def _apply(self, rec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        op = rec.get("op")
+        if op == "set":
+            self.done.append(rec); self.undone.clear(); return rec
+        if op == "undo" and self.done:
+            e = self.done.pop(); self.undone.append(e); return e
+        if op == "redo" and self.undone:
+            e = self.undone.pop(); self.done.append(e); return e
+        return None
+
+    def _append(self, rec: Dict[str, Any]):
+        if self._f is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._f.flush(); os.fsync(self._f.fileno())
+
+    # ------------------------------------------------------------------ API
+    @staticmethod
+    def edits_of(rec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Modifiche (key, old, new, ...) di un evento "set"."""
+        return rec["edits"] if "edits" in rec else [rec]
+
+    def record(self, key: str, old: str, new: str, **extra) -> Dict[str, Any]:
+        """Registra key: old -> new (testo dei valori); svuota lo stack di redo."""
+        return self.record_batch([{"key": key, "old": old, "new": new, **extra}])
+
+    def record_batch(self, edits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Registra più modifiche come un solo evento (una riga, un fsync)."""
+        rec = {"op": "set", "t": time.time(), "edits": edits}
+        self._append(rec)
+        return self._apply(rec)
+
+    def undo(self) -> Optional[Dict[str, Any]]:
+        """Annulla l'ultimo evento; ritorna l'evento (le sue modifiche tornano a "old") o None."""
+        if not self.done: return None
+        self._append({"op": "undo", "t": time.time()})
+        return self._apply({"op": "undo"})
+
+    def redo(self) -> Optional[Dict[str, Any]]:
+        """Ripete l'ultimo evento annullato; ritorna l'evento (le sue modifiche vanno a "new") o None."""
+        if not self.undone: return None
+        self._append({"op": "redo", "t": time.time()})
+        return self._apply({"op": "redo"})
+
+    def effective(self) -> Dict[str, Tuple[Dict[str, Any], str, str]]:
+        """chiave -> (ultima modifica, valore prima della prima modifica, valore finale); senza cambi netti."""
+        out: Dict[str, Tuple[Dict[str, Any], str, str]] = {}
+        for rec in self.done:
+            for e in self.edits_of(rec):
+                first_old = out[e["key"]][1] if e["key"] in out else e["old"]
+                out[e["key"]] = (e, first_old, e["new"])
+        return {k: v for k, v in out.items() if v[1] != v[2]}
+
+    def reset(self):
+        """Svuota il journal (es. modifiche già presenti nella ricetta sorgente)."""
+        self.close()
+        self.done.clear(); self.undone.clear()
+        try: self.path.unlink()
+        except OSError: pass
+
+    def close(self):
+        if self._f is not None:
+            try: self._f.close()
+            except OSError: pass
+            self._f = None
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Flotta di PLC: inventario delle macchine e pull GRID+IO da tutte in parallelo (comando fleet-pull).
+
+Inventario: file JSON (FLEET_INVENTORY, o --inventory) oppure FLEET_MACHINES in config, una voce
+per macchina:
+
+    [{"name": "trattore-1", "host": "192.168.10.30", "user": "root", "password": "pdm3",
+      "port": 21, "timeout": 8, "passive": true,
+      "remote_grid": "/home/cds-apps/Backup/GPS_Grid.txtrecipe",
+      "remote_io": "/home/cds-apps/Backup/IO.txtrecipe", "local_dir": "fleet/trattore-1"}]
+
+Solo "name" e "host" sono obbligatori: il resto arriva da FTP_* / LOCAL_*_FILENAME di config e
+local_dir vale FLEET_DIR/<name>. Ogni macchina usa una sessione sola (ftp_pull.pull_files, con
+pull condizionale, backup e cache metadati nella sua cartella); le macchine girano su un
+ThreadPoolExecutor limitato (FLEET_WORKERS) e il timeout dei socket è quello della macchina, così
+un PLC spento costa al più il suo timeout e non blocca gli altri. Dopo il pull ogni ricetta locale
+viene letta (cache di parse: un file invariato costa poco) per il riepilogo.
+"""
+from __future__ import annotations
+import json, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import config as CFG
+import perf
+from ftp_pull import PullResult, pull_files
+
+_FIELDS = ("name", "host", "port", "user", "password", "timeout", "passive", "remote_grid", "remote_io", "local_dir")
+
+
+@dataclass
+class Machine:
+    name: str
+    host: str
+    port: int = 21
+    user: str = ""
+    password: str = ""
+    timeout: float = 8
+    passive: bool = True
+    remote_grid: str = ""
+    remote_io: str = ""
+    local_dir: Path = Path(".")
+
+    def conn(self) -> Dict[str, Any]:
+        """Parametri di connessione per ftp_pull.pull_files."""
+        return {"host": self.host, "port": self.port, "user": self.user, "password": self.password,
+                "timeout": self.timeout, "passive": self.passive}
+
+
+@dataclass
+class MachineResult:
+    machine: Machine
+    grid: Optional[PullResult] = None
+    io: Optional[PullResult] = None
+    reachable: bool = False
+    changed: bool = False          # almeno un file locale ha contenuto nuovo
+    n: int = 0                     # lato della griglia (Num_Grid_Rows_Cols dell'IO)
+    cells: int = 0                 # celle presenti nel file
+    included: int = 0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+
+def _machine(entry: Dict[str, Any], base: Path) -> Machine:
+    if not isinstance(entry, dict):
+        raise SystemExit(f"ERRORE inventario: voce non valida {entry!r} (serve un oggetto).")
+    unknown = set(entry) - set(_FIELDS)
+    if unknown:
+        raise SystemExit(f"ERRORE inventario: campi sconosciuti {sorted(unknown)} in {entry.get('name', entry)!r}.")
+    name, host = str(entry.get("name") or "").strip(), str(entry.get("host") or "").strip()
+    if not name or not host:
+        raise SystemExit(f"ERRORE inventario: 'name' e 'host' obbligatori ({entry!r}).")
+    if not entry.get("remote_grid", getattr(CFG, "FTP_REMOTE_PATH", "")) \
+            or not entry.get("remote_io", getattr(CFG, "FTP_REMOTE_PATH_IO", "")):
+        raise SystemExit(f"ERRORE inventario: percorsi remoti GRID/IO mancanti per {name!r}.")
+    local_dir = Path(entry.get("local_dir") or Path(getattr(CFG, "FLEET_DIR", "fleet")) / name)
+    try:
+        return Machine(
+            name=name, host=host,
+            port=int(entry.get("port", getattr(CFG, "FTP_PORT", 21))),
+            user=str(entry.get("user", getattr(CFG, "FTP_USER", ""))),
+            password=str(entry.get("password", getattr(CFG, "FTP_PASS", ""))),
+            timeout=float(entry.get("timeout", getattr(CFG, "FTP_TIMEOUT", 8))),
+            passive=bool(entry.get("passive", getattr(CFG, "FTP_PASSIVE", True))),
+            remote_grid=str(entry.get("remote_grid", getattr(CFG, "FTP_REMOTE_PATH", ""))),
+            remote_io=str(entry.get("remote_io", getattr(CFG, "FTP_REMOTE_PATH_IO", ""))),
+            local_dir=local_dir if local_dir.is_absolute() else base / local_dir,
+        )
+    except (TypeError, ValueError) as e:
+        raise SystemExit(f"ERRORE inventario: valore non valido per {name!r}: {e}")
+
+
+def load_inventory(path: str | Path | None = None) -> List[Machine]:
+    """Macchine dal file JSON (path, o FLEET_INVENTORY se esiste) o da FLEET_MACHINES.
+
+    Le cartelle locali relative partono dalla cartella del file JSON (dalla corrente per config).
+    SystemExit se l'inventario manca o non è valido (nomi doppi, campi mancanti o sconosciuti).
+    """
+    if path is None and Path(getattr(CFG, "FLEET_INVENTORY", "fleet.json")).is_file():
+        path = getattr(CFG, "FLEET_INVENTORY", "fleet.json")
+    if path is not None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except OSError as e:
+            raise SystemExit(f"ERRORE: inventario non leggibile: {e}")
+        except ValueError as e:
+            raise SystemExit(f"ERRORE: inventario {path} non è JSON valido: {e}")
+        base = Path(path).resolve().parent
+    else:
+        entries, base = getattr(CFG, "FLEET_MACHINES", []), Path.cwd()
+    if isinstance(entries, dict):
+        entries = entries.get("machines", [])
+    machines = [_machine(e, base) for e in entries]
+    if not machines:
+        raise SystemExit("ERRORE: inventario vuoto (FLEET_INVENTORY / FLEET_MACHINES / --inventory).")
+    seen = set()
+    for m in machines:
+        if m.name in seen:
+            raise SystemExit(f"ERRORE inventario: nome macchina ripetuto {m.name!r}.")
+        seen.add(m.name)
+    return machines
+
+
+def _pull_machine(m: Machine, conditional: Optional[bool]) -> MachineResult:
+    """Pull GRID+IO della macchina su una sessione, poi lettura delle ricette locali."""
+    from recipe import load_grid_recipe, load_io_recipe
+    from grid_model import require_int, validate_included_centers
+    res = MachineResult(m)
+    t0 = time.perf_counter()
+    grid_local = m.local_dir / getattr(CFG, "LOCAL_RECIPE_FILENAME", "GPS_Grid.txtrecipe")
+    io_local = m.local_dir / getattr(CFG, "LOCAL_IO_RECIPE_FILENAME", "IO.txtrecipe")
+    with perf.phase("fleet.pull"):
+        res.grid, res.io = pull_files([(m.remote_grid, grid_local), (m.remote_io, io_local)], parallel=1,
+                                      verbose=False, conditional=conditional, **m.conn())
+    pulled = (res.grid, res.io)
+    res.reachable = any(r.connected for r in pulled)
+    res.changed = any(r.changed for r in pulled)
+    res.errors += [f"{'GRID' if r is res.grid else 'IO'}: {r.error}" for r in pulled if r.error]
+    if grid_local.is_file() and io_local.is_file():
+        try:
+            with perf.phase("fleet.parse"):
+                grid = load_grid_recipe(str(grid_local))[0]
+                io = load_io_recipe(str(io_local))
+                res.cells, res.included = int(grid.present.sum()), int((grid.included == 1).sum())
+                res.n = require_int(io, "IO.GPS.Cfg.Num_Grid_Rows_Cols", "numero righe/colonne griglia")
+                if res.cells == 0:
+                    res.errors.append("nessuna chiave GVL.GPS_Grid_data[..] nella ricetta GRID")
+                else:
+                    validate_included_centers(grid.resized(res.n))
+        except SystemExit as e:  # require_* / validate_*
+            res.errors.append(str(e))
+        except Exception as e:
+            res.errors.append(f"parse: {type(e).__name__}: {e}")
+    else:
+        res.errors.append("ricette locali mancanti")
+    res.seconds = time.perf_counter() - t0
+    return res
+
+
+def fleet_pull(machines: Sequence[Machine], workers: int | None = None, conditional: bool | None = None,
+               verbose: bool = True) -> List[MachineResult]:
+    """Pull di tutte le macchine, al più `workers` insieme (default FLEET_WORKERS); risultati nell'ordine dell'inventario."""
+    workers = max(1, min(int(workers or getattr(CFG, "FLEET_WORKERS", 8)), len(machines) or 1))
+    t0 = time.perf_counter()
+    results: Dict[str, MachineResult] = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fleet") as ex:
+        futs = {ex.submit(_pull_machine, m, conditional): m for m in machines}
+        for f in as_completed(futs):
+            m = futs[f]
+            try:
+                res = f.result()
+            except Exception as e:  # difesa: _pull_machine non dovrebbe lanciare
+                res = MachineResult(m, errors=[f"{type(e).__name__}: {e}"])
+            results[m.name] = res
+            if verbose:
+                print(f"[fleet] {m.name}: {'raggiungibile' if res.reachable else 'NON raggiungibile'}"
+                      f"{', cambiato' if res.changed else ''} in {res.seconds:.2f} s")
+    ordered = [results[m.name] for m in machines]
+    if verbose:
+        print_summary(ordered, time.perf_counter() - t0, workers)
+    return ordered
+
+
+def print_summary(results: Sequence[MachineResult], wall: float, workers: int):
+    print(f"[fleet] {'macchina':<16} {'host':<22} {'raggiung.':>9} {'cambiato':>8} {'N':>5} "
+          f"{'Included':>9} {'s':>6}  errori")
+    for r in results:
+        m = r.machine
+        print(f"[fleet] {m.name:<16} {f'{m.host}:{m.port}':<22} {'sì' if r.reachable else 'NO':>9} "
+              f"{'sì' if r.changed else '-':>8} {r.n or '-':>5} {r.included if r.cells else '-':>9} "
+              f"{r.seconds:>6.2f}  {'; '.join(r.errors) or '-'}")
+    print(f"[fleet] {sum(r.reachable for r in results)}/{len(results)} raggiungibili, "
+          f"{sum(r.changed for r in results)} cambiate, {sum(bool(r.errors) for r in results)} con errori; "
+          f"thread={workers}, totale {wall:.2f} s")
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""Motore di pull FTP: più file remoti -> locali su una sola sessione autenticata
+(o un piccolo pool di sessioni in parallelo), con backup locale e tempi per file.
+
+Pull condizionale (FTP_CONDITIONAL): SIZE/MDTM remoti confrontati con una piccola cache
+(FTP_META_FILENAME, accanto ai file locali) per saltare il download; se si scarica,
+un contenuto identico (sha256) non crea backup e risulta changed=False.
+"""
+from __future__ import annotations
+import hashlib, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+import config as CFG
+import perf
+
+if TYPE_CHECKING:  # ftplib si importa al primo collegamento: chi importa solo PullResult non lo carica
+    from ftplib import FTP
+
+
+@dataclass
+class PullResult:
+    remote: str
+    local: Path
+    ok: bool = False
+    seconds: float = 0.0          # connessione esclusa
+    size: int = 0                 # byte scaricati
+    backup: Optional[Path] = None
+    error: Optional[str] = None
+    changed: bool = False         # il file locale ora ha contenuto diverso da prima
+    skipped: bool = False         # download evitato: SIZE/MDTM uguali alla cache
+    connected: bool = False       # connessione e login riusciti (il server risponde)
+
+
+def _ts() -> str:
+    fmt = getattr(CFG, "BACKUP_STAMP_FMT", "%Y%m%d-%H%M%S")
+    return time.strftime(fmt)
+
+
+def ftp_connect(host: str | None = None, user: str | None = None, password: str | None = None,
+                port: int | None = None, timeout: float | None = None, passive: bool | None = None) -> FTP:
+    """Apre e autentica una sessione FTP; i parametri mancanti arrivano da config."""
+    from ftplib import FTP
+    ftp = FTP()
+    ftp.connect(host if host is not None else getattr(CFG, "FTP_HOST", "127.0.0.1"),
+                port if port is not None else getattr(CFG, "FTP_PORT", 21),
+                timeout=timeout if timeout is not None else getattr(CFG, "FTP_TIMEOUT", 8))
+    ftp.login(user if user is not None else getattr(CFG, "FTP_USER", ""),
+              password if password is not None else getattr(CFG, "FTP_PASS", ""))
+    try: ftp.set_pasv(passive if passive is not None else getattr(CFG, "FTP_PASSIVE", True))
+    except Exception: pass
+    return ftp
+
+
+# ------------------------------ cache metadati -------------------------------
+_META_LOCK = threading.Lock()
+
+
+def _meta_path(local: Path) -> Path:
+    return local.parent / getattr(CFG, "FTP_META_FILENAME", ".ftp_meta.json")
+
+
+def _load_meta(local: Path) -> dict:
+    try:
+        with open(_meta_path(local), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _store_meta(local: Path, entry: dict):
+    with _META_LOCK:
+        meta = _load_meta(local)
+        meta[local.name] = entry
+        path = _meta_path(local)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+
+def _file_sha256(path: Path) -> Optional[str]:
+    try:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+    except OSError:
+        return None
+
+
+def _local_stat(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+def _remote_stat(ftp: FTP, rname: str) -> Tuple[Optional[int], Optional[str]]:
+    """(SIZE, MDTM) remoti; None per ciò che il server non supporta."""
+    from ftplib import all_errors
+    size = mdtm = None
+    try:
+        ftp.voidcmd("TYPE I")
+        size = ftp.size(rname)
+    except all_errors:
+        pass
+    try:
+        resp = ftp.sendcmd("MDTM " + rname)
+        if resp.startswith("213"):
+            mdtm = resp[3:].strip()
+    except all_errors:
+        pass
+    return size, mdtm
+
+
+def _swap_in(tmp: Path, dst: Path) -> Optional[Path]:
+    """Sposta il file scaricato al posto di dst; il precedente diventa backup con timestamp."""
+    bak = None
+    if dst.exists():
+        bak = dst.with_name(f"{dst.stem}_{_ts()}{dst.suffix}")
+        dst.rename(bak)
+    tmp.rename(dst)
+    return bak
+
+
+def _pull_one(ftp: FTP, res: PullResult, cwd: List[str], conditional: bool):
+    dst = res.local
+    tmp = dst.with_suffix(dst.suffix + ".tmp")
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    try:
+        rdir, rname = os.path.split(res.remote)
+        if rdir and cwd[0] != rdir:
+            ftp.cwd(rdir); cwd[0] = rdir
+
+        old = _load_meta(dst).get(dst.name, {}) if conditional else {}
+        local_stat = _local_stat(dst)
+        # la cache vale solo se il file locale è ancora quello registrato
+        if old.get("remote") != res.remote or local_stat is None or list(local_stat) != old.get("local_stat"):
+            old = {}
+        r_size = r_mdtm = None
+        if conditional:
+            r_size, r_mdtm = _remote_stat(ftp, rname)
+            if old and r_size is not None and r_mdtm is not None \
+                    and r_size == old.get("size") and r_mdtm == old.get("mdtm"):
+                res.ok = res.skipped = True
+                res.seconds = time.perf_counter() - t0
+                return
+
+        h = hashlib.sha256()
+        with open(tmp, "wb") as f:
+            def _write(chunk: bytes):
+                f.write(chunk); h.update(chunk)
+            ftp.retrbinary("RETR " + rname, _write)
+        res.size = tmp.stat().st_size
+        digest = h.hexdigest()
+        old_digest = old.get("sha256") or (_file_sha256(dst) if local_stat is not None else None)
+        if old_digest == digest:
+            tmp.unlink()  # contenuto identico: niente backup, niente re-parse
+        else:
+            res.backup = _swap_in(tmp, dst)
+            res.changed = True
+        res.ok = True
+        if conditional:
+            _store_meta(dst, {"remote": res.remote, "size": r_size, "mdtm": r_mdtm, "sha256": digest,
+                              "local_stat": list(_local_stat(dst) or ())})
+    except Exception as e:
+        res.error = str(e)
+        try:
+            if tmp.exists(): tmp.unlink()
+        except Exception:
+            pass
+    res.seconds = time.perf_counter() - t0
+
+
+def _pull_on_session(results: List[PullResult], conn: dict, conditional: bool) -> float:
+    """Scarica `results` in sequenza su UNA sessione; ritorna il tempo di connessione+login."""
+    t0 = time.perf_counter()
+    try:
+        with perf.phase("ftp.login"):
+            ftp = ftp_connect(**conn)
+    except Exception as e:
+        for r in results:
+            r.error = f"connessione: {e}"
+        return time.perf_counter() - t0
+    t_conn = time.perf_counter() - t0
+    for r in results:
+        r.connected = True
+    cwd = [""]
+    try:
+        for r in results:
+            with perf.phase("ftp.file"):
+                _pull_one(ftp, r, cwd, conditional)
+            perf.count("ftp.bytes", r.size)
+    finally:
+        try: ftp.quit()
+        except Exception:
+            try: ftp.close()
+            except Exception: pass
+    return t_conn
+
+
+def pull_files(pairs: Sequence[Tuple[str, Path | str]], parallel: int | None = None,
+               verbose: bool = True, tag: str = "FTP pull", conditional: bool | None = None,
+               **conn) -> List[PullResult]:
+    """Scarica ogni (percorso_remoto, percorso_locale) e ritorna un PullResult per coppia, nello stesso ordine.
+
+    - parallel=1 (default da FTP_PARALLEL): una sola sessione, login unico per tutti i file
+    - parallel>1: fino a `parallel` sessioni concorrenti, i file ripartiti tra loro
+    `conn` (host, user, password, port, timeout, passive) sovrascrive i valori di config.
+    Ogni file scaricato e diverso sostituisce il locale; il precedente resta come backup con timestamp.
+    conditional (default FTP_CONDITIONAL) abilita il salto via SIZE/MDTM e il confronto hash.
+    """
+    if conditional is None:
+        conditional = getattr(CFG, "FTP_CONDITIONAL", True)
+    results = [PullResult(remote=r, local=Path(l)) for r, l in pairs]
+    if not results:
+        return results
+    n = max(1, min(int(parallel or getattr(CFG, "FTP_PARALLEL", 1)), len(results)))
+    t0 = time.perf_counter()
+    with perf.phase("ftp.pull"):
+        if n == 1:
+            t_conn = [_pull_on_session(results, conn, conditional)]
+        else:
+            chunks = [results[i::n] for i in range(n)]
+            with ThreadPoolExecutor(max_workers=n) as ex:
+                t_conn = list(ex.map(lambda ch: _pull_on_session(ch, conn, conditional), chunks))
+    if verbose:
+        for r in results:
+            if r.skipped:
+                print(f"[{tag}] {r.remote} invariato (SIZE/MDTM), nessun download: {r.local}")
+            elif r.ok and not r.changed:
+                print(f"[{tag}] {r.remote} scaricato ma identico al locale ({r.size} B in {r.seconds:.2f} s)")
+            elif r.ok:
+                print(f"[{tag}] {r.remote} → {r.local}  {r.size} B in {r.seconds:.2f} s")
+                if r.backup is not None:
+                    print(f"[{tag}] Backup locale: {r.backup.name}")
+            else:
+                print(f"[{tag}] Errore su {r.remote}: {r.error}. Uso il file locale (se presente): {r.local}")
+        print(f"[{tag}] {sum(r.ok for r in results)}/{len(results)} file, "
+              f"sessioni={n}, login {max(t_conn):.2f} s, totale {time.perf_counter() - t0:.2f} s")
+    return results
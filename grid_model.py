@@ -1,9 +1,26 @@
 # -*- coding: utf-8 -*-
 import re, sys
-from typing import Any, Dict, List, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+import perf
 
 _GRID_RE = re.compile(r"^GVL\.GPS_Grid_data\[(\d+)\]\[(\d+)\]\.([A-Za-z_]\w*)$")
 
+# proprietà colonnari: nome nel file -> attributo di GridArrays
+GRID_BOOL_PROPS = {"Included": "included", "Error": "error"}
+GRID_NUM_PROPS = {
+    "Path_Index": "path_index",
+    "First_Depth_Read_cm": "first_depth",
+    "Last_Depth_Read_cm": "last_depth",
+    "Target_Depth_cm": "target_depth",
+    "Center_Relative_East_dm": "center_east",
+    "Center_Relative_North_dm": "center_north",
+    "Edges_Crossed": "edges_crossed",
+}
+
 
 def require_numeric(data: Dict[str, Any], key_variants: List[str], name_for_error: str) -> float:
     for k in key_variants:
@@ -38,25 +55,208 @@ def require_points(data: Dict[str, Any]) -> Tuple[List[float], List[float]]:
     return easts, norths
 
 
+@dataclass
+class GridArrays:
+    """Griglia in forma colonnare: un array n×n per proprietà, indicizzato [ix, iy].
+
+    - present: cella con almeno una chiave nel file
+    - bool (Included, Error): int8 con 1=TRUE, 0=FALSE, -1=assente
+    - numeriche: float64 con NaN=assente
+    Valori di tipo inatteso e proprietà non previste finiscono in `extra` (per cella).
+    """
+    n: int
+    present: np.ndarray
+    included: np.ndarray
+    error: np.ndarray
+    path_index: np.ndarray
+    first_depth: np.ndarray
+    last_depth: np.ndarray
+    target_depth: np.ndarray
+    center_east: np.ndarray
+    center_north: np.ndarray
+    edges_crossed: np.ndarray
+    extra: Dict[Tuple[int, int], Dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def empty(cls, n: int) -> "GridArrays":
+        arrs = {name: np.full((n, n), -1, dtype=np.int8) for name in GRID_BOOL_PROPS.values()}
+        arrs.update({name: np.full((n, n), np.nan) for name in GRID_NUM_PROPS.values()})
+        return cls(n=n, present=np.zeros((n, n), dtype=bool), **arrs)
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[int, int, str, Any]]) -> "GridArrays":
+        """Costruisce la griglia da tuple (ix, iy, proprietà, valore) già estratte dalle chiavi."""
+        items = list(items)
+        n = 1 + max((max(ix, iy) for ix, iy, _p, _v in items), default=-1)
+        g = cls.empty(n)
+        for ix, iy, prop, val in items:
+            g.set_prop(ix, iy, prop, val)
+        return g
+
+    @classmethod
+    def from_data(cls, data: Dict[str, Any]) -> "GridArrays":
+        """Come from_items, partendo da un dict chiave->valore (una sola regex per chiave)."""
+        def _items():
+            for key, val in data.items():
+                m = _GRID_RE.match(key)
+                if m:
+                    yield int(m.group(1)), int(m.group(2)), m.group(3), val
+        with perf.phase("grid.from_data"):
+            return cls.from_items(_items())
+
+    def resized(self, n: int) -> "GridArrays":
+        """La stessa griglia su n×n (N dell'IO): righe/colonne mancanti in fondo al file restano assenti.
+        SystemExit se il file ha celle con indice >= n."""
+        if n == self.n:
+            return self
+        if n < self.n and (self.present[n:].any() or self.present[:, n:].any()):
+            sys.exit(f"ERRORE: la ricetta GRID ha celle fino all'indice {self.n - 1}, "
+                     f"ma IO Num_Grid_Rows_Cols={n}.")
+        g = type(self).empty(n)
+        k = min(n, self.n)
+        for name in ("present",) + tuple(GRID_BOOL_PROPS.values()) + tuple(GRID_NUM_PROPS.values()):
+            getattr(g, name)[:k, :k] = getattr(self, name)[:k, :k]
+        g.extra = {cell: dict(d) for cell, d in self.extra.items()}
+        return g
+
+    def set_prop(self, ix: int, iy: int, prop: str, val: Any):
+        self.present[ix, iy] = True
+        name = GRID_BOOL_PROPS.get(prop)
+        if name is not None and type(val) is bool:
+            getattr(self, name)[ix, iy] = 1 if val else 0
+            self._drop_extra(ix, iy, prop)
+            return
+        name = GRID_NUM_PROPS.get(prop)
+        if name is not None and type(val) in (int, float):
+            getattr(self, name)[ix, iy] = val
+            self._drop_extra(ix, iy, prop)
+            return
+        self.extra.setdefault((ix, iy), {})[prop] = val
+
+    def _drop_extra(self, ix: int, iy: int, prop: str):
+        d = self.extra.get((ix, iy))
+        if d is not None:
+            d.pop(prop, None)
+
+    def has_prop(self, ix: int, iy: int, prop: str) -> bool:
+        if prop in self.extra.get((ix, iy), ()):
+            return True
+        name = GRID_BOOL_PROPS.get(prop)
+        if name is not None:
+            return bool(getattr(self, name)[ix, iy] >= 0)
+        name = GRID_NUM_PROPS.get(prop)
+        if name is not None:
+            return not np.isnan(getattr(self, name)[ix, iy])
+        return False
+
+    def diff_mask(self, other: "GridArrays") -> np.ndarray:
+        """Maschera n×n (forma di `other`) delle celle che differiscono tra self e other.
+        Con dimensioni diverse tutte le celle risultano cambiate."""
+        if other.n != self.n:
+            return np.ones((other.n, other.n), dtype=bool)
+        m = self.present != other.present
+        for name in GRID_BOOL_PROPS.values():
+            m |= getattr(self, name) != getattr(other, name)
+        for name in GRID_NUM_PROPS.values():
+            a, b = getattr(self, name), getattr(other, name)
+            m |= ~((a == b) | (np.isnan(a) & np.isnan(b)))
+        for cell in set(self.extra) | set(other.extra):
+            if (self.extra.get(cell) or {}) != (other.extra.get(cell) or {}):
+                m[cell] = True
+        return m
+
+    def cell_props(self, ix: int, iy: int) -> Dict[str, Any]:
+        """Proprietà della cella come dict (come nel file); {} se fuori griglia o assente."""
+        if not (0 <= ix < self.n and 0 <= iy < self.n) or not self.present[ix, iy]:
+            return {}
+        out: Dict[str, Any] = {}
+        for prop, name in GRID_BOOL_PROPS.items():
+            v = getattr(self, name)[ix, iy]
+            if v >= 0:
+                out[prop] = bool(v)
+        for prop, name in GRID_NUM_PROPS.items():
+            v = float(getattr(self, name)[ix, iy])
+            if not np.isnan(v):
+                out[prop] = int(v) if v.is_integer() else v
+        out.update(self.extra.get((ix, iy), {}))
+        return out
+
+
 def collect_grid_data(data: Dict[str, Any]) -> Dict[Tuple[int, int], Dict[str, Any]]:
     cells: Dict[Tuple[int, int], Dict[str, Any]] = {}
-    for key, val in data.items():
-        m = _GRID_RE.match(key)
-        if not m:
-            continue
-        ix, iy, prop = int(m.group(1)), int(m.group(2)), m.group(3)
-        cells.setdefault((ix, iy), {})[prop] = val
+    with perf.phase("collect_grid_data"):
+        for key, val in data.items():
+            m = _GRID_RE.match(key)
+            if not m:
+                continue
+            ix, iy, prop = int(m.group(1)), int(m.group(2)), m.group(3)
+            cells.setdefault((ix, iy), {})[prop] = val
     return cells
 
 
-def validate_included_centers(cells: Dict[Tuple[int, int], Dict[str, Any]]):
-    problems = []
-    for (ix, iy), props in cells.items():
-        if props.get("Included") is True:
-            cx, cy = props.get("Center_Relative_East_dm"), props.get("Center_Relative_North_dm")
-            if not isinstance(cx, (int, float)) or not isinstance(cy, (int, float)):
-                problems.append((ix, iy))
+def validate_included_centers(grid: GridArrays):
+    with perf.phase("validate"):
+        bad = (grid.included == 1) & (np.isnan(grid.center_east) | np.isnan(grid.center_north))
+        problems = [(int(x), int(y)) for x, y in np.argwhere(bad)]
     if problems:
         sample = "\n  - " + "\n  - ".join([f"Grid_data[{x}][{y}]" for x, y in problems[:20]])
         more = "" if len(problems) <= 20 else f"\n  (+ altri {len(problems)-20} casi)"
         sys.exit("ERRORE: celle Included=TRUE senza centri valorizzati (Center_*) :" + sample + more)
+
+
+# ============== modifiche in blocco (stessa semantica per viewer e dbio) ==============
+def format_value(v: float) -> str:
+    """Testo del valore come scritto nella ricetta: intero se integrale, altrimenti float."""
+    v = float(v)
+    return str(int(v)) if v.is_integer() else str(v)
+
+
+def selection_mask(n: int, coords=None, rect=None) -> np.ndarray:
+    """Maschera n×n da lista di (x, y) oppure (se la lista manca) da rettangolo di indici inclusivo
+    (x0, x1, y0, y1), come in dbio.reset_included; fuori griglia ignorati."""
+    mask = np.zeros((n, n), dtype=bool)
+    if coords:
+        xy = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+        ok = ((xy >= 0) & (xy < n)).all(axis=1)
+        mask[xy[ok, 0], xy[ok, 1]] = True
+    elif rect:
+        x0, x1, y0, y1 = rect
+        mask[max(min(x0, x1), 0):max(x0, x1) + 1, max(min(y0, y1), 0):max(y0, y1) + 1] = True
+    return mask
+
+
+def _fit_mask(grid: GridArrays, mask: np.ndarray) -> np.ndarray:
+    """Maschera sulla forma della griglia: celle fuori griglia ignorate, quelle mancanti non selezionate."""
+    if mask.shape == grid.present.shape:
+        return mask
+    out = np.zeros_like(grid.present)
+    k0, k1 = min(mask.shape[0], grid.n), min(mask.shape[1], grid.n)
+    out[:k0, :k1] = mask[:k0, :k1]
+    return out
+
+
+def reset_included(grid: GridArrays, mask: np.ndarray) -> np.ndarray:
+    """Included=FALSE sulle celle selezionate che hanno la chiave Included; ritorna le celle cambiate."""
+    has = _fit_mask(grid, mask) & (grid.included >= 0)
+    changed = has & (grid.included == 1)
+    grid.included[has] = 0
+    return changed
+
+
+def toggle_included(grid: GridArrays, mask: np.ndarray) -> np.ndarray:
+    """Inverte Included sulle celle selezionate con la chiave; non accende celle senza centri (Center_*)."""
+    has = _fit_mask(grid, mask) & (grid.included >= 0)
+    centered = ~(np.isnan(grid.center_east) | np.isnan(grid.center_north))
+    changed = has & ((grid.included == 1) | centered)
+    grid.included[changed] = 1 - grid.included[changed]
+    return changed
+
+
+def set_target(grid: GridArrays, mask: np.ndarray, value: float | None = None, delta: float | None = None) -> np.ndarray:
+    """Target_Depth_cm = value (oppure += delta) sulle celle selezionate che hanno la chiave; ritorna le celle cambiate."""
+    has = _fit_mask(grid, mask) & ~np.isnan(grid.target_depth)
+    new = grid.target_depth[has] + delta if value is None else np.full(int(has.sum()), float(value))
+    changed = np.zeros_like(has)
+    changed[has] = grid.target_depth[has] != new
+    grid.target_depth[has] = new
+    return changed
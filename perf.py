@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Tempi per fase della pipeline (FTP, parse, griglia, validazione, viewer, DB) e contatori.
+
+    with perf.phase("parse"):
+        ...
+    perf.count("db.cells", n)
+
+Disattivato (default) phase() ritorna sempre lo stesso contesto vuoto e count()/add() escono
+subito: nessuna lettura dell'orologio, nessuna allocazione. app.py --profile lo attiva.
+Le fasi annidate si registrano col percorso ("grid/parse"); ogni thread ha il suo stack
+(i pull FTP in parallelo compaiono come fasi di primo livello).
+"""
+from __future__ import annotations
+import json, sys, threading, time
+from contextlib import nullcontext
+from typing import Any, Dict, List
+
+_ENABLED = False
+_NULL = nullcontext()
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_phases: Dict[str, List[float]] = {}   # percorso -> [chiamate, secondi]; ordine del primo ingresso
+_counters: Dict[str, float] = {}
+_t0 = 0.0
+
+
+def enable(on: bool = True):
+    """Attiva (e azzera) o disattiva la raccolta."""
+    global _ENABLED
+    _ENABLED = bool(on)
+    if on:
+        reset()
+
+
+def active() -> bool:
+    return _ENABLED
+
+
+def reset():
+    global _t0
+    with _LOCK:
+        _phases.clear(); _counters.clear()
+    _t0 = time.perf_counter()
+
+
+class _Phase:
+    __slots__ = ("name", "path", "t")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_LOCAL, "stack", None)
+        if stack is None:
+            stack = _LOCAL.stack = []
+        stack.append(self.name)
+        self.path = "/".join(stack)
+        if self.path not in _phases:
+            with _LOCK: _phases.setdefault(self.path, [0, 0.0])  # ordine di ingresso: padre prima dei figli
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t
+        _LOCAL.stack.pop()
+        _record(self.path, dt)
+        return False
+
+
+def _record(path: str, seconds: float):
+    with _LOCK:
+        e = _phases.setdefault(path, [0, 0.0])
+        e[0] += 1; e[1] += seconds
+
+
+def phase(name: str):
+    """Context manager che somma il tempo del blocco alla fase `name` (annidata nella fase corrente)."""
+    return _Phase(name) if _ENABLED else _NULL
+
+
+def add(name: str, seconds: float):
+    """Registra una durata misurata altrove (es. primo draw) come fase di primo livello."""
+    if _ENABLED:
+        _record(name, seconds)
+
+
+def count(name: str, n: float = 1):
+    if _ENABLED:
+        with _LOCK:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def report() -> Dict[str, Any]:
+    """{"wall_s", "phases": [{"name", "depth", "calls", "total_s"}], "counters"} dall'attivazione."""
+    with _LOCK:
+        phases = [{"name": k, "depth": k.count("/"), "calls": int(c), "total_s": s} for k, (c, s) in _phases.items()]
+        counters = dict(_counters)
+    return {"wall_s": time.perf_counter() - _t0, "phases": phases, "counters": counters}
+
+
+def print_report(file=None):
+    rep = report()
+    out = file or sys.stdout
+    wall = rep["wall_s"]
+    print(f"[profile] {'fase':<34} {'chiamate':>8} {'totale s':>9} {'media ms':>9} {'%':>6}", file=out)
+    for p in rep["phases"]:
+        name = "  " * p["depth"] + p["name"].rsplit("/", 1)[-1]
+        pct = 100.0 * p["total_s"] / wall if wall > 0 else 0.0
+        print(f"[profile] {name:<34} {p['calls']:>8} {p['total_s']:>9.3f} "
+              f"{1e3 * p['total_s'] / p['calls']:>9.2f} {pct:>6.1f}", file=out)
+    for k, v in rep["counters"].items():
+        print(f"[profile] {k:<34} {v:>8g}", file=out)
+    print(f"[profile] totale {wall:.3f} s", file=out)
+
+
+def write_json(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report(), f, indent=1)
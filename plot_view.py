@@ -1,14 +1,21 @@
 # -*- coding: utf-8 -*-
 """Viewer interattivo strict: tooltip a quadranti, overlay centrati,
-edit Target_Depth_cm, FTP pull (GRID+IO) + UI Tk esterna.
+edit Target_Depth_cm (cella singola o selezione multipla), FTP pull (GRID+IO) + UI Tk esterna.
 """
-from typing import Any, Dict, List, Tuple
-import os, time
+import time
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence, Tuple
 from pathlib import Path
 
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle
-from ftplib import FTP
+from matplotlib.collections import PolyCollection, LineCollection
+from ftp_pull import ftp_connect, pull_files, PullResult
+from recipe_lines import RecipeLines, RecipePatcher, line_value
+from recipe_parser import parse_value
+from edit_journal import EditJournal
+import perf
 
 import config as CFG
 from config import (
@@ -21,16 +28,32 @@ from config import (
 )
 from grid_model import (
     require_numeric, require_int, require_points,
-    collect_grid_data, validate_included_centers,
+    validate_included_centers, GridArrays,
+    format_value, selection_mask, reset_included, toggle_included, set_target,
 )
 from tk_layer_ui import open_layer_window  # UI separata
 
+if TYPE_CHECKING:
+    from ftplib import FTP
+
 
 # -------------------------- Flag overlay (fallback) ---------------------------
 SHOW_PATH_INDEX    = getattr(CFG, "SHOW_PATH_INDEX", True)
 SHOW_LAST_DEPTH    = getattr(CFG, "SHOW_LAST_DEPTH", False)
 SHOW_TARGET_DEPTH  = getattr(CFG, "SHOW_TARGET_DEPTH", False)
 PATH_TEXT_FONTSIZE = getattr(CFG, "PATH_TEXT_FONTSIZE", max(TOOLTIP_FONTSIZE, 10))
+INCLUDED_RENDER    = getattr(CFG, "INCLUDED_RENDER", "collection")
+OVERLAY_MIN_CELL_PX = getattr(CFG, "OVERLAY_MIN_CELL_PX", 14)
+OVERLAY_MAX_TEXTS   = getattr(CFG, "OVERLAY_MAX_TEXTS", 2500)
+ZOOM_STEP           = getattr(CFG, "ZOOM_STEP", 1.25)
+PAN_BUTTONS         = tuple(getattr(CFG, "PAN_BUTTONS", (2, 3)))
+EDIT_JOURNAL        = getattr(CFG, "EDIT_JOURNAL", True)
+EDIT_SAVE_DEBOUNCE_MS = getattr(CFG, "EDIT_SAVE_DEBOUNCE_MS", 1500)
+SELECT_FACE         = getattr(CFG, "SELECT_FACE", "gold")
+SELECT_ALPHA        = getattr(CFG, "SELECT_ALPHA", 0.35)
+SELECT_EDGE         = getattr(CFG, "SELECT_EDGE", "darkorange")
+Z_SELECT            = getattr(CFG, "Z_SELECT", 90)
+DRAG_MIN_PX         = getattr(CFG, "DRAG_MIN_PX", 5)
 
 # ------------------------------ Toolbar MPL ----------------------------------
 if HIDE_MPL_TOOLBAR:
@@ -57,6 +80,22 @@ def _build_tooltip_text(ix: int, iy: int, props: Dict[str, Any]) -> str:
     return "\n".join(lines)
 
 
+def _cell_at(x: float, y: float, N: int, step: float) -> Tuple[int, int] | None:
+    """Indice (ix, iy) della cella sotto (x, y) in dm, oppure None se fuori griglia.
+
+    Calcolo diretto (x // step) al posto degli N×N hitbox: costo costante per evento.
+    Il bordo esterno (x == N*step) appartiene all'ultima cella, come con i Rectangle.
+    """
+    if x < 0 or y < 0:
+        return None
+    ix = int(x // step); iy = int(y // step)
+    if ix == N and x <= N * step: ix = N - 1
+    if iy == N and y <= N * step: iy = N - 1
+    if ix >= N or iy >= N:
+        return None
+    return ix, iy
+
+
 def _quad_offsets(x: float, y: float, extent_dm: float) -> Tuple[float, float, str, str]:
     cx_mid = extent_dm * 0.5
     cy_mid = extent_dm * 0.5
@@ -70,6 +109,76 @@ def _quad_offsets(x: float, y: float, extent_dm: float) -> Tuple[float, float, s
     return (-o, +o, "right", "bottom") # basso-dx -> tooltip alto-sx
 
 
+class _TooltipBlitter:
+    """Tooltip come artista animato: il movimento del mouse ridisegna solo il tooltip
+    sopra lo sfondo salvato (blit), mai l'intera figura.
+
+    - lo sfondo si salva a ogni draw completo (draw_event)
+    - se la cella sotto il puntatore non cambia non si ridisegna nulla
+    - il testo del tooltip è in cache per cella (invalidate() dopo un edit)
+    Senza supporto blit dal backend si ricade su draw_idle().
+    """
+
+    def __init__(self, fig, tooltip, text_for_cell):
+        self.fig = fig
+        self.tooltip = tooltip
+        self.text_for_cell = text_for_cell
+        self.cell: Tuple[int, int] | None = None
+        self.bg = None
+        self._texts: Dict[Tuple[int, int], str] = {}
+        tooltip.set_animated(True)
+        fig.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, _event):
+        canvas = self.fig.canvas
+        if getattr(canvas, "supports_blit", False):
+            self.bg = canvas.copy_from_bbox(self.fig.bbox)
+        if self.tooltip.get_visible():
+            self.fig.draw_artist(self.tooltip)
+
+    def _blit(self):
+        canvas = self.fig.canvas
+        if self.bg is None:
+            canvas.draw_idle(); return
+        canvas.restore_region(self.bg)
+        if self.tooltip.get_visible():
+            self.fig.draw_artist(self.tooltip)
+        canvas.blit(self.fig.bbox)
+
+    def invalidate(self, cell: Tuple[int, int] | None = None):
+        """Scarta il testo in cache (di una cella o tutto); aggiorna il tooltip se visibile."""
+        if cell is None:
+            self._texts.clear()
+        else:
+            self._texts.pop(cell, None)
+        if self.cell is not None and (cell is None or cell == self.cell):
+            self.tooltip.set_text(self._text(self.cell))
+
+    def _text(self, cell: Tuple[int, int]) -> str:
+        txt = self._texts.get(cell)
+        if txt is None:
+            txt = self._texts[cell] = self.text_for_cell(*cell)
+        return txt
+
+    def show(self, cell: Tuple[int, int], xy: Tuple[float, float], quad: Tuple[float, float, str, str]):
+        if cell == self.cell:
+            return
+        self.cell = cell
+        dx, dy, ha, va = quad
+        self.tooltip.xy = xy
+        self.tooltip.set_text(self._text(cell))
+        self.tooltip.set_position((dx, dy))
+        self.tooltip.set_ha(ha); self.tooltip.set_va(va)
+        self.tooltip.set_visible(True)
+        self._blit()
+
+    def hide(self):
+        self.cell = None
+        if self.tooltip.get_visible():
+            self.tooltip.set_visible(False)
+            self._blit()
+
+
 def _ask_number_near_figure(fig, title: str, message: str, default: str | None = None) -> str | None:
     """Dialog di input numero (Tk-only)."""
     try:
@@ -94,11 +203,276 @@ def _ask_number_near_figure(fig, title: str, message: str, default: str | None =
     return None
 
 
-# ================================== FTP CORE =================================
-def _ts() -> str:
-    fmt = getattr(CFG, "BACKUP_STAMP_FMT", "%Y%m%d-%H%M%S")
-    return time.strftime(fmt)
+# ============================== Celle Included ================================
+def _included_verts(grid: GridArrays, step: float) -> np.ndarray:
+    """Vertici (k, 4, 2) dei quadrati Included, centrati su Center_Relative_*_dm."""
+    inc = grid.included == 1
+    cx = grid.center_east[inc]; cy = grid.center_north[inc]
+    h = step / 2.0
+    xs = np.stack([cx - h, cx + h, cx + h, cx - h], axis=1)
+    ys = np.stack([cy - h, cy - h, cy + h, cy + h], axis=1)
+    return np.stack([xs, ys], axis=2)
+
+
+def _add_included_cells(ax, grid: GridArrays, step: float, mode: str = "collection"):
+    """Disegna le celle Included: un'unica PolyCollection o (mode="patches") una Rectangle per cella."""
+    verts = _included_verts(grid, step)
+    if mode == "patches":
+        out = []
+        for (llx, lly) in verts[:, 0, :]:
+            rect = Rectangle(
+                (llx, lly), step, step,
+                facecolor=INCLUDED_FACE, alpha=INCLUDED_ALPHA,
+                edgecolor=INCLUDED_EDGE, linewidth=INCLUDED_EDGEWIDTH,
+                zorder=Z_INCLUDED, joinstyle="miter",
+            )
+            out.append(ax.add_patch(rect))
+        return out
+    coll = PolyCollection(
+        verts, closed=True,
+        facecolors=INCLUDED_FACE, alpha=INCLUDED_ALPHA,
+        edgecolors=INCLUDED_EDGE if INCLUDED_EDGE else "none", linewidths=INCLUDED_EDGEWIDTH,
+        zorder=Z_INCLUDED, joinstyle="miter",
+    )
+    ax.add_collection(coll, autolim=False)
+    return coll
+
+
+# ============================ Selezione multipla ==============================
+def _square_verts(mask: np.ndarray, step: float) -> np.ndarray:
+    """Vertici (k, 4, 2) dei quadrati di griglia delle celle True in `mask`."""
+    ix, iy = np.nonzero(mask)
+    x0 = ix * step; y0 = iy * step; x1 = x0 + step; y1 = y0 + step
+    xs = np.stack([x0, x1, x1, x0], axis=1); ys = np.stack([y0, y0, y1, y1], axis=1)
+    return np.stack([xs, ys], axis=2).astype(float)
+
+
+def _parse_bulk_command(s: str) -> Tuple[str, float | None] | None:
+    """Testo del dialog di modifica in blocco -> (azione, numero); None se non valido.
+    "150" o "=150": imposta Target_Depth_cm; "+5" / "-5": somma; "i": inverte Included; "r": azzera Included."""
+    s = s.strip().lower()
+    if s in ("i", "r"):
+        return s, None
+    if not s:
+        return None
+    action, num = ("set", s[1:]) if s[0] == "=" else (("delta", s) if s[0] in "+-" else ("set", s))
+    try: v = float(num)
+    except ValueError: return None
+    return (action, v) if np.isfinite(v) else None
+
+
+# ============================ Overlay testi (LOD) =============================
+_OVERLAY_PROPS = ("Path_Index", "Last_Depth_Read_cm", "Target_Depth_cm")
+
+
+def _fmt_num(v: Any) -> str:
+    if isinstance(v, (int, float)):
+        try:
+            return f"{int(v)}" if float(v).is_integer() else f"{v}"
+        except Exception:
+            return f"{v}"
+    return ""
+
+
+def _cell_text(props: Dict[str, Any], show_path: bool, show_last: bool, show_target: bool) -> str:
+    out: List[str] = []
+    if show_path:
+        idx = props.get("Path_Index")
+        if isinstance(idx, (int, float)) and idx > 0:
+            out.append(f"{int(idx)}")
+    if show_last:
+        s = _fmt_num(props.get("Last_Depth_Read_cm"))
+        if s:
+            out.append(s)
+    if show_target:
+        s = _fmt_num(props.get("Target_Depth_cm"))
+        if s:
+            out.append(s)
+    return "\n".join(out)
+
+
+class _OverlayLayer:
+    """Numeri dentro le celle con livello di dettaglio.
+
+    Invece di un Text per cella si usa un pool di Text riassegnati alle sole celle
+    dentro la vista corrente, e solo se la cella a schermo è almeno OVERLAY_MIN_CELL_PX:
+    il costo di layout dipende da quante celle si vedono, non da N².
+    Si aggiorna da solo su cambio limiti assi e resize.
+    """
+
+    def __init__(self, ax, grid: GridArrays, N: int, step: float, flags: Tuple[bool, bool, bool]):
+        self.ax = ax
+        self.N = N
+        self.step = step
+        self.flags = tuple(flags)
+        self.pool: List[Any] = []
+        self._texts: Dict[Tuple[int, int], str] = {}
+        self.set_grid(grid)
+        ax.callbacks.connect("xlim_changed", self._on_view_change)
+        ax.callbacks.connect("ylim_changed", self._on_view_change)
+        ax.figure.canvas.mpl_connect("resize_event", self._on_view_change)
+
+    def set_grid(self, grid: GridArrays, changed: np.ndarray | None = None):
+        """Nuovi dati; con `changed` (maschera celle) si scarta solo la cache di quelle celle."""
+        self.grid = grid
+        has = ~np.isnan(grid.path_index) | ~np.isnan(grid.last_depth) | ~np.isnan(grid.target_depth)
+        for (ix, iy), d in grid.extra.items():
+            if any(k in d for k in _OVERLAY_PROPS):
+                has[ix, iy] = True
+        self.has_text = has
+        if changed is None:
+            self._texts.clear()
+        else:
+            for ix, iy in np.argwhere(changed).tolist():
+                self._texts.pop((ix, iy), None)
+
+    def set_flags(self, show_path: bool, show_last: bool, show_target: bool):
+        self.flags = (show_path, show_last, show_target)
+        self._texts.clear()
+        self.update()
+
+    def invalidate(self, cell: Tuple[int, int] | None = None):
+        if cell is None:
+            self._texts.clear()
+        else:
+            self._texts.pop(cell, None)
+        self.update()
+
+    def _on_view_change(self, *_):
+        self.update()
+
+    def _text(self, ix: int, iy: int) -> str:
+        txt = self._texts.get((ix, iy))
+        if txt is None:
+            txt = self._texts[(ix, iy)] = _cell_text(self.grid.cell_props(ix, iy), *self.flags)
+        return txt
+
+    def _visible_cells(self) -> np.ndarray:
+        """Celle (ix, iy) con testo dentro la vista; vuoto se troppo piccole o troppe."""
+        if not any(self.flags):
+            return np.empty((0, 2), dtype=int)
+        (x0, x1), (y0, y1) = sorted(self.ax.get_xlim()), sorted(self.ax.get_ylim())
+        bbox = self.ax.bbox
+        if x1 <= x0 or y1 <= y0 or bbox.width <= 0:
+            return np.empty((0, 2), dtype=int)
+        cell_px = min(self.step * bbox.width / (x1 - x0), self.step * bbox.height / (y1 - y0))
+        if cell_px < OVERLAY_MIN_CELL_PX:
+            return np.empty((0, 2), dtype=int)
+        n = self.has_text.shape[0]
+        ix0 = max(0, int(x0 // self.step)); ix1 = min(n, int(x1 // self.step) + 1)
+        iy0 = max(0, int(y0 // self.step)); iy1 = min(n, int(y1 // self.step) + 1)
+        if ix1 <= ix0 or iy1 <= iy0:
+            return np.empty((0, 2), dtype=int)
+        cells = np.argwhere(self.has_text[ix0:ix1, iy0:iy1]) + (ix0, iy0)
+        if len(cells) > OVERLAY_MAX_TEXTS:
+            return np.empty((0, 2), dtype=int)
+        return cells
+
+    def update(self):
+        used = 0
+        for ix, iy in self._visible_cells().tolist():
+            txt = self._text(ix, iy)
+            if not txt:
+                continue
+            if used == len(self.pool):
+                t = self.ax.text(
+                    0, 0, "", ha="center", va="center", fontsize=PATH_TEXT_FONTSIZE, color=LABEL_COLOR,
+                    zorder=Z_GRID + 2, clip_on=True,
+                )
+                try: t.set_linespacing(1.0)
+                except Exception: pass
+                self.pool.append(t)
+            t = self.pool[used]; used += 1
+            t.set_position((ix * self.step + self.step / 2.0, iy * self.step + self.step / 2.0))
+            t.set_text(txt); t.set_visible(True)
+        for t in self.pool[used:]:
+            if t.get_visible():
+                t.set_visible(False)
+
+
+# ============================ Zoom / pan (no toolbar) =========================
+class _ZoomPan:
+    """Zoom con rotella (centrato sul puntatore) e pan trascinando con PAN_BUTTONS.
 
+    Serve perché la toolbar Matplotlib è nascosta (HIDE_MPL_TOOLBAR). Lo zoom indietro
+    si ferma alla vista iniziale; home() la ripristina.
+    """
+
+    def __init__(self, ax, home: Tuple[Tuple[float, float], Tuple[float, float]]):
+        self.ax = ax
+        self.home_lims = home
+        self.panning = False
+        self._start: Tuple[float, float, Tuple[float, float], Tuple[float, float]] | None = None
+        canvas = ax.figure.canvas
+        canvas.mpl_connect("scroll_event", self._on_scroll)
+        canvas.mpl_connect("button_press_event", self._on_press)
+        canvas.mpl_connect("motion_notify_event", self._on_motion)
+        canvas.mpl_connect("button_release_event", self._on_release)
+
+    def home(self):
+        self.ax.set_xlim(*self.home_lims[0]); self.ax.set_ylim(*self.home_lims[1])
+        self.ax.figure.canvas.draw_idle()
+
+    def _on_scroll(self, event):
+        if event.inaxes is not self.ax or event.xdata is None:
+            return
+        scale = ZOOM_STEP ** (-getattr(event, "step", 1 if event.button == "up" else -1))
+        (x0, x1), (y0, y1) = self.ax.get_xlim(), self.ax.get_ylim()
+        (hx0, hx1), (hy0, hy1) = self.home_lims
+        # non oltre la vista iniziale
+        scale = min(scale, (hx1 - hx0) / (x1 - x0), (hy1 - hy0) / (y1 - y0))
+        x, y = event.xdata, event.ydata
+        self.ax.set_xlim(x - (x - x0) * scale, x + (x1 - x) * scale)
+        self.ax.set_ylim(y - (y - y0) * scale, y + (y1 - y) * scale)
+        self.ax.figure.canvas.draw_idle()
+
+    def _on_press(self, event):
+        if event.inaxes is not self.ax or event.button not in PAN_BUTTONS:
+            return
+        self.panning = True
+        self._start = (event.x, event.y, self.ax.get_xlim(), self.ax.get_ylim())
+
+    def _on_motion(self, event):
+        if not self.panning or self._start is None:
+            return
+        px, py, (x0, x1), (y0, y1) = self._start
+        bbox = self.ax.bbox
+        dx = (event.x - px) * (x1 - x0) / bbox.width
+        dy = (event.y - py) * (y1 - y0) / bbox.height
+        self.ax.set_xlim(x0 - dx, x1 - dx); self.ax.set_ylim(y0 - dy, y1 - dy)
+        self.ax.figure.canvas.draw_idle()
+
+    def _on_release(self, event):
+        if self.panning and event.button in PAN_BUTTONS:
+            self.panning = False; self._start = None
+
+
+# ================================== Griglia ====================================
+def _grid_segments(N: int, step: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Segmenti (verticali, orizzontali) per le N+1 linee: (k·step, 0..1) e (0..1, k·step)."""
+    k = np.arange(N + 1) * step
+    zeros = np.zeros_like(k); ones = np.ones_like(k)
+    vert = np.stack([np.stack([k, zeros], 1), np.stack([k, ones], 1)], 1)
+    horiz = np.stack([np.stack([zeros, k], 1), np.stack([ones, k], 1)], 1)
+    return vert, horiz
+
+
+def _add_grid_lines(ax, N: int, step: float) -> Tuple[LineCollection, LineCollection]:
+    """Linee di griglia come due LineCollection (verticali e orizzontali) al posto di 2·(N+1) axvline/axhline.
+
+    Stesse trasformazioni miste di axvline/axhline: coordinata dati sull'asse della linea,
+    coordinate assi (0..1) sull'altro, quindi le linee attraversano sempre tutta la vista.
+    """
+    vsegs, hsegs = _grid_segments(N, step)
+    style = dict(linewidths=GRID_LINEWIDTH, alpha=GRID_ALPHA, colors=GRID_COLOR, zorder=Z_GRID,
+                 capstyle="projecting")
+    vert = LineCollection(vsegs, transform=ax.get_xaxis_transform(), **style)
+    horiz = LineCollection(hsegs, transform=ax.get_yaxis_transform(), **style)
+    ax.add_collection(vert, autolim=False); ax.add_collection(horiz, autolim=False)
+    return vert, horiz
+
+
+# ================================== FTP CORE =================================
 def _script_dir() -> Path:
     return Path(__file__).resolve().parent
 
@@ -110,13 +484,8 @@ def _local_io_recipe_path() -> Path:
     name = getattr(CFG, "LOCAL_IO_RECIPE_FILENAME", "IO.txtrecipe")
     return _script_dir() / name
 
-def _ftp_connect() -> FTP:
-    ftp = FTP()
-    ftp.connect(getattr(CFG, "FTP_HOST", "127.0.0.1"), 21, timeout=getattr(CFG, "FTP_TIMEOUT", 8))
-    ftp.login(getattr(CFG, "FTP_USER", ""), getattr(CFG, "FTP_PASS", ""))
-    try: ftp.set_pasv(getattr(CFG, "FTP_PASSIVE", True))
-    except Exception: pass
-    return ftp
+def _ftp_connect() -> "FTP":
+    return ftp_connect()
 
 def _popup(title: str, message: str, kind: str = "info", parent=None):
     """Messagebox Tk; fallback: print."""
@@ -139,408 +508,631 @@ def _popup(title: str, message: str, kind: str = "info", parent=None):
         print(f"[{title}] {message}")
 
 
-# =============================== FTP: GRID ===================================
+# ============================ FTP: GRID + IO ==================================
+def _ftp_targets() -> Dict[str, Tuple[str, Path]]:
+    """Ricette gestite via FTP: nome -> (percorso remoto, percorso locale)."""
+    return {
+        "GRID": (getattr(CFG, "FTP_REMOTE_PATH", ""), _local_grid_recipe_path()),
+        "IO": (getattr(CFG, "FTP_REMOTE_PATH_IO", ""), _local_io_recipe_path()),
+    }
+
+
+def ftp_pull_recipes(which: Sequence[str] = ("GRID", "IO"), verbose: bool = True) -> Dict[str, PullResult]:
+    """Scarica le ricette richieste nel folder dello script con UNA sessione FTP (login unico).
+    Ritorna nome -> PullResult (ok=False se disabilitato, non impostato o fallito)."""
+    targets = _ftp_targets()
+    out = {w: PullResult(remote=targets[w][0], local=targets[w][1]) for w in which}
+    if not getattr(CFG, "FTP_ENABLED", True):
+        if verbose: print(f"[FTP {'+'.join(which)}] Disabilitato da config.")
+        return out
+    names, pairs = [], []
+    for w in which:
+        remote_path, dst = targets[w]
+        if not remote_path:
+            if verbose: print(f"[FTP {w} pull] Percorso remoto non impostato in config.")
+            continue
+        names.append(w); pairs.append((remote_path, dst))
+    out.update(zip(names, pull_files(pairs, verbose=verbose, tag=f"FTP {'+'.join(names)} pull")))
+    return out
+
+
+def ftp_pull_recipes_to_script_dir(which: Sequence[str] = ("GRID", "IO"), verbose: bool = True) -> Dict[str, Path | None]:
+    """Come ftp_pull_recipes; ritorna nome -> path locale (None se il pull non è riuscito)."""
+    return {w: (r.local if r.ok else None) for w, r in ftp_pull_recipes(which, verbose).items()}
+
+
 def ftp_pull_recipe_to_script_dir(verbose: bool = True) -> Path | None:
     """Scarica il file GRID (GPS_Grid.txtrecipe) via FTP nel folder dello script."""
-    if not getattr(CFG, "FTP_ENABLED", True):
-        if verbose: print("[FTP GRID] Disabilitato da config.")
-        return None
-    remote_path = getattr(CFG, "FTP_REMOTE_PATH", "")
-    if not remote_path:
-        if verbose: print("[FTP GRID pull] FTP_REMOTE_PATH non impostato.")
-        return None
+    return ftp_pull_recipes_to_script_dir(("GRID",), verbose=verbose)["GRID"]
 
-    dst = _local_grid_recipe_path()
-    tmp = dst.with_suffix(dst.suffix + ".tmp")
-    dst.parent.mkdir(parents=True, exist_ok=True)
 
-    try:
-        ftp = _ftp_connect()
-        rdir, rname = os.path.split(remote_path)
-        if rdir: ftp.cwd(rdir)
-        with open(tmp, "wb") as f:
-            ftp.retrbinary("RETR " + rname, f.write)
-        try: ftp.quit()
-        except Exception: pass
+def ftp_pull_io_recipe_to_script_dir(verbose: bool = True) -> Path | None:
+    return ftp_pull_recipes_to_script_dir(("IO",), verbose=verbose)["IO"]
 
-        if dst.exists():
-            bak = dst.with_name(f"{dst.stem}_{_ts()}{dst.suffix}")
-            dst.rename(bak)
-            if verbose: print(f"[FTP GRID pull] Backup locale: {bak.name}")
-        tmp.rename(dst)
-        if verbose: print(f"[FTP GRID pull] Scaricato → {dst}")
-        return dst
-    except Exception as e:
-        try:
-            if tmp.exists(): tmp.unlink()
-        except Exception:
-            pass
-        if verbose: print(f"[FTP GRID pull] Errore: {e}. Uso il file locale (se presente): {dst}")
-        return None
 
-def ensure_local_recipe_pulled(silent: bool = False, popup: bool = True, parent_tk=None) -> Path:
-    """Assicura che il file GRID locale esista; se abilitato, fa anche il pull FTP."""
-    dst = _local_grid_recipe_path()
+def pull_recipes_with_popup(which: Sequence[str] = ("GRID", "IO"), silent: bool = False,
+                            popup: bool = True, parent_tk=None) -> Dict[str, PullResult]:
+    """Pull (se abilitato) dei file richiesti in un solo giro FTP; un unico popup riassume l'esito.
+    Ritorna nome -> PullResult; `local` è sempre il file locale da usare."""
+    targets = _ftp_targets()
+    dsts = {w: targets[w][1] for w in which}
     do_pull = getattr(CFG, "FTP_PULL_ON_START", True)
     do_popups = popup and getattr(CFG, "FTP_POPUPS", True)
     title = getattr(CFG, "FTP_POPUP_TITLE", "FTP")
 
-    had_old = dst.exists()
-    ok = False
+    results = {w: PullResult(remote=targets[w][0], local=dsts[w]) for w in which}
     err = None
     try:
         if do_pull:
-            ok = ftp_pull_recipe_to_script_dir(verbose=not silent) is not None
+            results = ftp_pull_recipes(which, verbose=not silent)
     except Exception as e:
         err = str(e)
 
     if do_popups:
-        if ok:
-            if getattr(CFG, "FTP_POPUPS_ON_SUCCESS", True):
-                msg = f"File GRID scaricato da FTP in:\n{dst}"
-                if had_old: msg += "\n\nIl precedente file locale è stato salvato come backup."
-                _popup(title, msg, "info", parent=parent_tk)
-        else:
-            if not err and not do_pull:
-                msg = "FTP GRID non eseguito (disattivato). Si userà il file locale:\n" + str(dst)
+        msgs = []
+        for w, dst in dsts.items():
+            res = results[w]
+            if res.ok and res.skipped:
+                msg = f"File {w} invariato sul PLC: nessun download.\n{dst}"
+            elif res.ok and not res.changed:
+                msg = f"File {w} scaricato, identico al file locale: nessun backup.\n{dst}"
+            elif res.ok:
+                msg = f"File {w} scaricato da FTP in:\n{dst}"
+                if res.backup is not None: msg += "\nIl precedente file locale è stato salvato come backup."
+            elif not err and not do_pull:
+                msg = f"FTP {w} non eseguito (disattivato). Si userà il file locale:\n{dst}"
             elif not err:
-                msg = "Connessione FTP GRID fallita o file remoto non disponibile.\n" \
-                      "Si userà il file locale (se presente):\n" + str(dst)
+                msg = f"Connessione FTP {w} fallita o file remoto non disponibile.\n" \
+                      f"Si userà il file locale (se presente):\n{dst}"
             else:
-                msg = f"Errore FTP GRID: {err}\nSi userà il file locale (se presente):\n{dst}"
-            _popup(title, msg, "warning", parent=parent_tk)
+                msg = f"Errore FTP {w}: {err}\nSi userà il file locale (se presente):\n{dst}"
+            msgs.append(msg)
+        all_ok = all(results[w].ok for w in which)
+        if not all_ok:
+            _popup(title, "\n\n".join(msgs), "warning", parent=parent_tk)
+        elif getattr(CFG, "FTP_POPUPS_ON_SUCCESS", True):
+            _popup(title, "\n\n".join(msgs), "info", parent=parent_tk)
 
-    return dst
+    return results
 
-# Alias esplicito per chiarezza esterna
-def ensure_local_grid_recipe_pulled(silent: bool = False, popup: bool = True, parent_tk=None) -> Path:
-    return ensure_local_recipe_pulled(silent=silent, popup=popup, parent_tk=parent_tk)
 
+def ensure_local_recipes_pulled(which: Sequence[str] = ("GRID", "IO"), silent: bool = False,
+                                popup: bool = True, parent_tk=None) -> Dict[str, Path]:
+    """Assicura che i file locali richiesti esistano; se abilitato li scarica in un solo pull FTP."""
+    results = pull_recipes_with_popup(which, silent=silent, popup=popup, parent_tk=parent_tk)
+    return {w: r.local for w, r in results.items()}
 
-# ================================ FTP: IO =====================================
-def ftp_pull_io_recipe_to_script_dir(verbose: bool = True) -> Path | None:
-    if not getattr(CFG, "FTP_ENABLED", True):
-        if verbose: print("[FTP IO] Disabilitato da config.")
-        return None
-    remote_path = getattr(CFG, "FTP_REMOTE_PATH_IO", "")
-    if not remote_path:
-        if verbose: print("[FTP IO pull] FTP_REMOTE_PATH_IO non impostato.")
-        return None
 
-    dst = _local_io_recipe_path()
-    tmp = dst.with_suffix(dst.suffix + ".tmp")
-    dst.parent.mkdir(parents=True, exist_ok=True)
+def ensure_local_recipe_pulled(silent: bool = False, popup: bool = True, parent_tk=None) -> Path:
+    """Assicura che il file GRID locale esista; se abilitato, fa anche il pull FTP."""
+    return ensure_local_recipes_pulled(("GRID",), silent=silent, popup=popup, parent_tk=parent_tk)["GRID"]
 
-    try:
-        ftp = _ftp_connect()
-        rdir, rname = os.path.split(remote_path)
-        if rdir: ftp.cwd(rdir)
-        with open(tmp, "wb") as f:
-            ftp.retrbinary("RETR " + rname, f.write)
-        try: ftp.quit()
-        except Exception: pass
+# Alias esplicito per chiarezza esterna
+def ensure_local_grid_recipe_pulled(silent: bool = False, popup: bool = True, parent_tk=None) -> Path:
+    return ensure_local_recipe_pulled(silent=silent, popup=popup, parent_tk=parent_tk)
 
-        if dst.exists():
-            bak = dst.with_name(f"{dst.stem}_{_ts()}{dst.suffix}")
-            dst.rename(bak)
-            if verbose: print(f"[FTP IO pull] Backup locale: {bak.name}")
-        tmp.rename(dst)
-        if verbose: print(f"[FTP IO pull] Scaricato → {dst}")
-        return dst
-    except Exception as e:
-        try:
-            if tmp.exists(): tmp.unlink()
-        except Exception:
-            pass
-        if verbose: print(f"[FTP IO pull] Errore: {e}. Uso il file locale (se presente): {dst}")
-        return None
 
 def ensure_local_io_recipe_pulled(silent: bool = False, popup: bool = True, parent_tk=None) -> Path:
-    dst = _local_io_recipe_path()
-    do_pull = getattr(CFG, "FTP_PULL_ON_START", True)
-    do_popups = popup and getattr(CFG, "FTP_POPUPS", True)
-    title = getattr(CFG, "FTP_POPUP_TITLE", "FTP")
-
-    had_old = dst.exists()
-    ok = False
-    err = None
-    try:
-        if do_pull:
-            ok = ftp_pull_io_recipe_to_script_dir(verbose=not silent) is not None
-    except Exception as e:
-        err = str(e)
-
-    if do_popups:
-        if ok:
-            if getattr(CFG, "FTP_POPUPS_ON_SUCCESS", True):
-                msg = f"File IO scaricato da FTP in:\n{dst}"
-                if had_old: msg += "\n\nIl precedente file locale è stato salvato come backup."
-                _popup(title, msg, "info", parent=parent_tk)
-        else:
-            if not err and not do_pull:
-                msg = "FTP IO non eseguito (disattivato). Si userà il file locale:\n" + str(dst)
-            elif not err:
-                msg = "Connessione FTP IO fallita o file remoto non disponibile.\n" \
-                      "Si userà il file locale (se presente):\n" + str(dst)
-            else:
-                msg = f"Errore FTP IO: {err}\nSi userà il file locale (se presente):\n{dst}"
-            _popup(title, msg, "warning", parent=parent_tk)
-
-    return dst
+    return ensure_local_recipes_pulled(("IO",), silent=silent, popup=popup, parent_tk=parent_tk)["IO"]
 
 
 # ================================== VIEWER ====================================
-def view_from_file(data: Dict[str, Any], lines: List[str], key_to_line: Dict[str, int], source_path: str):
-    # parametri base
+def _view_params(data: Dict[str, Any]) -> Tuple[float, int, float, List[float], List[float]]:
+    """(extent_dm, N, step, easts, norths) dai parametri IO; SystemExit se mancanti/non validi."""
     extent_dm = require_numeric(data, ["IO.GPS.Cfg.Square_Width_Scale_dm"], "dimensione quadrato (dm)")
     N = require_int(data, "IO.GPS.Cfg.Num_Grid_Rows_Cols", "numero righe/colonne griglia")
     step = require_numeric(data, ["IO.GPS.Sts.Grid_Cell_Size_dm", "IO.GPS. Cfg.Grid_Cell_Size_dm"], "passo griglia (dm)")
     if N <= 0 or step <= 0:
         raise SystemExit("ERRORE: Num_Grid_Rows_Cols e Grid_Cell_Size_dm devono essere > 0.")
     easts, norths = require_points(data)
+    return extent_dm, N, step, easts, norths
 
-    cells = collect_grid_data(data)
-    validate_included_centers(cells)
 
-    # figura/assi
-    fig = plt.figure(figsize=FIG_SIZE, facecolor=FIG_BG)
-    ax = plt.gca(); ax.set_facecolor(AX_BG)
+def _edited_path(source_path: str) -> str:
+    p = Path(source_path)
+    return str(p.with_name(p.stem + "_edited" + p.suffix))
 
-    if HIDE_MPL_TOOLBAR:
-        try:
-            manager = plt.get_current_fig_manager()
-            tb = getattr(manager, "toolbar", None)
-            if tb is not None:
-                try: tb.pack_forget()
-                except Exception:
-                    try: tb.hide()
-                    except Exception: pass
-        except Exception:
-            pass
-
-    # hitbox invisibili
-    rects_info: List[Dict[str, Any]] = []
-    for ix in range(N):
-        for iy in range(N):
-            llx = ix * step; lly = iy * step
-            r = Rectangle((llx, lly), step, step, facecolor="none", edgecolor="none", linewidth=0.0, zorder=9)
-            ax.add_patch(r)
-            rects_info.append({"rect": r, "ix": ix, "iy": iy, "props": cells.get((ix, iy), {})})
-
-    # celle Included
-    for (ix, iy), props in cells.items():
-        if props.get("Included") is True:
-            cx = float(props["Center_Relative_East_dm"])
-            cy = float(props["Center_Relative_North_dm"])
-            llx = cx - step / 2.0; lly = cy - step / 2.0
-            rect = Rectangle(
-                (llx, lly), step, step,
-                facecolor=INCLUDED_FACE, alpha=INCLUDED_ALPHA,
-                edgecolor=INCLUDED_EDGE, linewidth=INCLUDED_EDGEWIDTH,
-                zorder=Z_INCLUDED, joinstyle="miter",
-            )
-            ax.add_patch(rect)
 
-    # overlay centrati (un text per cella)
-    def _fmt_num(v: Any) -> str:
-        if isinstance(v, (int, float)):
+def _journal_path(source_path: str) -> Path:
+    p = Path(source_path)
+    return p.with_name(p.stem + getattr(CFG, "EDIT_JOURNAL_SUFFIX", "_edits.jsonl"))
+
+
+class GridViewer:
+    """Viewer interattivo su una figura sola.
+
+    Gli artisti e i callback si creano una volta; set_data() (usato dal reload)
+    aggiorna solo ciò che è cambiato: celle Included, testi overlay delle celle
+    modificate, cache tooltip, perimetro/punti e griglia se cambia la geometria.
+
+    Click sinistro: modifica Target_Depth_cm della cella. Trascinando col tasto sinistro si
+    seleziona un rettangolo di celle (shift aggiunge), shift+click aggiunge/toglie una cella;
+    Invio apre un solo dialog per tutta la selezione, Esc la annulla.
+    """
+
+    def __init__(self, data: Dict[str, Any], lines: List[str], key_to_line: Dict[str, int], source_path: str,
+                 grid: GridArrays, io_path: str | None = None):
+        self.extent_dm, self.N, self.step, easts, norths = _view_params(data)
+        grid = grid.resized(self.N)  # selezione, overlay e hit-test usano l'N dell'IO
+        validate_included_centers(grid)
+        self.grid = grid
+        self.lines = lines
+        self.key_to_line = key_to_line
+        self.source_path = source_path
+        self.patcher = RecipePatcher(lines, _edited_path(source_path))
+        self.journal = EditJournal(_journal_path(source_path)) if EDIT_JOURNAL else None
+        self._pending: Dict[int, str] = {}  # indice riga -> valore, non ancora nel file _edited
+        self.io_path = io_path
+        self.win = None
+
+        # figura/assi
+        with perf.phase("figure"):
+            self.fig = fig = plt.figure(figsize=FIG_SIZE, facecolor=FIG_BG)
+            self.ax = ax = plt.gca(); ax.set_facecolor(AX_BG)
+
+        if HIDE_MPL_TOOLBAR:
             try:
-                return f"{int(v)}" if float(v).is_integer() else f"{v}"
+                manager = plt.get_current_fig_manager()
+                tb = getattr(manager, "toolbar", None)
+                if tb is not None:
+                    try: tb.pack_forget()
+                    except Exception:
+                        try: tb.hide()
+                        except Exception: pass
             except Exception:
-                return f"{v}"
-        return ""
-
-    def _cell_text(props: Dict[str, Any], show_path: bool, show_last: bool, show_target: bool) -> str:
-        out: List[str] = []
-        if show_path:
-            idx = props.get("Path_Index")
-            if isinstance(idx, (int, float)) and idx > 0:
-                out.append(f"{int(idx)}")
-        if show_last:
-            s = _fmt_num(props.get("Last_Depth_Read_cm"))
-            if s:
-                out.append(s)
-        if show_target:
-            s = _fmt_num(props.get("Target_Depth_cm"))
-            if s:
-                out.append(s)
-        return "\n".join(out)
-
-    overlay_entries: List[Dict[str, Any]] = []
-    for (ix, iy), props in cells.items():
-        if not any(k in props for k in ("Path_Index", "Last_Depth_Read_cm", "Target_Depth_cm")):
-            continue
-        cx = ix * step + step / 2.0; cy = iy * step + step / 2.0
-        content = _cell_text(props, SHOW_PATH_INDEX, SHOW_LAST_DEPTH, SHOW_TARGET_DEPTH)
-        t = ax.text(
-            cx, cy, content if content else "",
-            ha="center", va="center", fontsize=PATH_TEXT_FONTSIZE, color=LABEL_COLOR,
-            zorder=Z_GRID + 2, clip_on=True, visible=bool(content),
-        )
-        try: t.set_linespacing(1.0)
-        except Exception: pass
-        overlay_entries.append({"text": t, "props": props})
-
-    # perimetro e punti
-    xs_line = easts[:] + [easts[0]]; ys_line = norths[:] + [norths[0]]
-    plt.plot(xs_line, ys_line, linewidth=PERIMETER_WIDTH, color=PERIMETER_COLOR, zorder=Z_PERIMETER)
-    plt.scatter(easts, norths, s=POINT_SIZE, color=POINT_COLOR, zorder=Z_POINTS)
-    for i, (x0, y0) in enumerate(zip(easts, norths), start=1):
-        plt.annotate(str(i), (x0, y0), xytext=(4, 4), textcoords="offset points",
-                     color=POINTS_LABEL_COLOR, zorder=Z_POINTS+1)
-
-    # griglia
-    for k in range(N + 1):
-        x = k * step; y = k * step
-        plt.axvline(x=x, linewidth=GRID_LINEWIDTH, alpha=GRID_ALPHA, color=GRID_COLOR, zorder=Z_GRID)
-        plt.axhline(y=y, linewidth=GRID_LINEWIDTH, alpha=GRID_ALPHA, color=GRID_COLOR, zorder=Z_GRID)
-
-    # limiti/label
-    plt.xlim(0, extent_dm); plt.ylim(0, extent_dm)
-    ax.set_aspect("equal", adjustable="box")
-    plt.xlabel("East (dm)"); plt.ylabel("North (dm)")
-    plt.title("Grid, Included Cells and Perimeter (dm)")
-    plt.tight_layout()
-
-    # tooltip
-    tooltip = ax.annotate(
-        "", xy=(0, 0), xytext=(12, 12), textcoords="offset points",
-        bbox=dict(boxstyle="round", fc=TOOLTIP_BOX_FC, ec=TOOLTIP_BOX_EC, alpha=0.95),
-        arrowprops=dict(arrowstyle="->", lw=0.6), fontsize=TOOLTIP_FONTSIZE, zorder=1000,
-    ); tooltip.set_visible(False)
-
-    def on_move(event):
-        if not event.inaxes or event.xdata is None or event.ydata is None:
-            if tooltip.get_visible():
-                tooltip.set_visible(False); fig.canvas.draw_idle()
+                pass
+
+        # celle Included
+        with perf.phase("included"):
+            self.included = _add_included_cells(ax, grid, self.step, mode=INCLUDED_RENDER)
+
+        # overlay centrati: testi solo per le celle visibili e leggibili (LOD)
+        with perf.phase("overlay"):
+            self.overlay = _OverlayLayer(ax, grid, self.N, self.step, (SHOW_PATH_INDEX, SHOW_LAST_DEPTH, SHOW_TARGET_DEPTH))
+
+        # perimetro e punti
+        with perf.phase("perimeter"):
+            xs_line = easts[:] + [easts[0]]; ys_line = norths[:] + [norths[0]]
+            self.perimeter, = plt.plot(xs_line, ys_line, linewidth=PERIMETER_WIDTH, color=PERIMETER_COLOR, zorder=Z_PERIMETER)
+            self.points = plt.scatter(easts, norths, s=POINT_SIZE, color=POINT_COLOR, zorder=Z_POINTS)
+            self.point_labels = []
+            for i, (x0, y0) in enumerate(zip(easts, norths), start=1):
+                self.point_labels.append(plt.annotate(str(i), (x0, y0), xytext=(4, 4), textcoords="offset points",
+                                                      color=POINTS_LABEL_COLOR, zorder=Z_POINTS+1))
+
+        # griglia
+        with perf.phase("grid_lines"):
+            self.grid_lines = _add_grid_lines(ax, self.N, self.step)
+
+        # selezione multipla: un solo artista per le celle evidenziate + rettangolo elastico
+        self.selection = np.zeros((self.N, self.N), dtype=bool)
+        self.sel_coll = PolyCollection(np.empty((0, 4, 2)), closed=True, facecolors=SELECT_FACE, alpha=SELECT_ALPHA,
+                                       edgecolors=SELECT_EDGE, linewidths=1.0, zorder=Z_SELECT)
+        ax.add_collection(self.sel_coll, autolim=False)
+        self.band = Rectangle((0, 0), 0, 0, fill=False, edgecolor=SELECT_EDGE, linestyle="--",
+                              linewidth=1.0, zorder=Z_SELECT + 1, visible=False)
+        ax.add_patch(self.band)
+        self._drag: Tuple[float, float, float, float] | None = None  # press sinistro: (px, py, x, y)
+
+        # limiti/label
+        with perf.phase("layout"):
+            plt.xlim(0, self.extent_dm); plt.ylim(0, self.extent_dm)
+            ax.set_aspect("equal", adjustable="box")
+            plt.xlabel("East (dm)"); plt.ylabel("North (dm)")
+            plt.title("Grid, Included Cells and Perimeter (dm)")
+            plt.tight_layout()
+            self.overlay.update()
+        self.nav = _ZoomPan(ax, ((0, self.extent_dm), (0, self.extent_dm)))
+
+        # tooltip
+        tooltip = ax.annotate(
+            "", xy=(0, 0), xytext=(12, 12), textcoords="offset points",
+            bbox=dict(boxstyle="round", fc=TOOLTIP_BOX_FC, ec=TOOLTIP_BOX_EC, alpha=0.95),
+            arrowprops=dict(arrowstyle="->", lw=0.6), fontsize=TOOLTIP_FONTSIZE, zorder=1000,
+        ); tooltip.set_visible(False)
+        self.tip = _TooltipBlitter(fig, tooltip, lambda ix, iy: _build_tooltip_text(ix, iy, self.grid.cell_props(ix, iy)))
+
+        fig.canvas.mpl_connect("motion_notify_event", self.on_move)
+        fig.canvas.mpl_connect("button_press_event", self.on_press)
+        fig.canvas.mpl_connect("button_release_event", self.on_release)
+        fig.canvas.mpl_connect("key_press_event", self.on_key)
+        fig.canvas.mpl_connect("close_event", self._on_close_edits)
+
+        # salvataggio differito: ogni edit riavvia il timer (backend senza event loop: solo alla chiusura)
+        self._save_timer = fig.canvas.new_timer(interval=EDIT_SAVE_DEBOUNCE_MS)
+        self._save_timer.single_shot = True
+        self._save_timer.add_callback(self.flush_edits)
+
+        # -------------------------- UI esterna (Tk) + hotkeys ------------------
+        self.current_state = {"p": SHOW_PATH_INDEX, "l": SHOW_LAST_DEPTH, "t": SHOW_TARGET_DEPTH}
+        # prova ad aprire la finestra Tk (se backend Tk disponibile)
+        with perf.phase("ui"):
+            try:
+                parent = fig.canvas.get_tk_widget().winfo_toplevel()  # type: ignore[attr-defined]
+                self.win = open_layer_window(
+                    parent_tk=parent,
+                    initial_state={"Path_Index": self.current_state["p"], "Last_Depth": self.current_state["l"],
+                                   "Target_Depth": self.current_state["t"]},
+                    on_change=self.refresh_overlays,
+                    on_reload=self.reload,
+                )
+                fig.canvas.mpl_connect("close_event", self._on_close_fig)
+            except Exception:
+                # fallback: applica stato iniziale e usa solo scorciatoie tastiera
+                self.refresh_overlays(self.current_state["p"], self.current_state["l"], self.current_state["t"])
+
+        with perf.phase("journal"):
+            self._replay_journal()
+
+    # ------------------------------------------------------------------ eventi
+    def on_move(self, event):
+        if self._drag is not None:
+            self._update_band(event); return
+        if self.nav.panning or not event.inaxes or event.xdata is None or event.ydata is None:
+            self.tip.hide()
+            return
+        hit = _cell_at(event.xdata, event.ydata, self.N, self.step)
+        if hit is None:
+            self.tip.hide()
+            return
+        # ancorato al centro cella: stabile finché il puntatore resta nella stessa cella
+        ix, iy = hit
+        x = ix * self.step + self.step / 2.0; y = iy * self.step + self.step / 2.0
+        self.tip.show(hit, (x, y), _quad_offsets(x, y, self.extent_dm))
+
+    def _data_xy(self, event) -> Tuple[float, float]:
+        """Coordinate dati dell'evento anche fuori dagli assi (xdata è None fuori)."""
+        return tuple(self.ax.transData.inverted().transform((event.x, event.y)))
+
+    def on_press(self, event):
+        if event.button != 1 or event.inaxes is not self.ax or event.xdata is None or event.ydata is None:
+            return
+        self._drag = (event.x, event.y, event.xdata, event.ydata)
+
+    def _update_band(self, event):
+        _, _, x0, y0 = self._drag
+        x1, y1 = self._data_xy(event)
+        self.band.set_bounds(min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0))
+        self.band.set_visible(True)
+        self.fig.canvas.draw_idle()
+
+    def on_release(self, event):
+        if event.button != 1 or self._drag is None:
             return
-        for info in rects_info:
-            ok, _ = info["rect"].contains(event)
-            if ok:
-                x, y = event.xdata, event.ydata
-                dx, dy, ha, va = _quad_offsets(x, y, extent_dm)
-                tooltip.xy = (x, y)
-                tooltip.set_text(_build_tooltip_text(info["ix"], info["iy"], info["props"]))
-                tooltip.set_position((dx, dy))
-                tooltip.set_ha(ha); tooltip.set_va(va)
-                tooltip.set_visible(True); fig.canvas.draw_idle()
-                return
-        if tooltip.get_visible():
-            tooltip.set_visible(False); fig.canvas.draw_idle()
-    fig.canvas.mpl_connect("motion_notify_event", on_move)
+        px, py, x0, y0 = self._drag
+        self._drag = None
+        self.band.set_visible(False)
+        add = "shift" in (getattr(event, "key", None) or "")
+        if max(abs(event.x - px), abs(event.y - py)) >= DRAG_MIN_PX:
+            x1, y1 = self._data_xy(event)
+            rect = (int(np.floor(min(x0, x1) / self.step)), int(np.floor(max(x0, x1) / self.step)),
+                    int(np.floor(min(y0, y1) / self.step)), int(np.floor(max(y0, y1) / self.step)))
+            self.select(rect=rect, add=add)
+            return
+        hit = _cell_at(x0, y0, self.N, self.step)
+        if hit is None:
+            return
+        if add:
+            self.selection[hit] = not self.selection[hit]; self._draw_selection()
+        else:
+            self.edit_cell(*hit)
+
+    # ------------------------------------------------------ selezione multipla
+    def select(self, coords=None, rect=None, add: bool = False) -> int:
+        """Seleziona celle da lista (x, y) o rettangolo di indici (x0, x1, y0, y1); ritorna quante sono selezionate."""
+        m = selection_mask(self.N, coords=coords, rect=rect)
+        self.selection = (self.selection | m) if add else m
+        self._draw_selection()
+        return int(self.selection.sum())
+
+    def clear_selection(self):
+        self.selection = np.zeros((self.N, self.N), dtype=bool)
+        self._draw_selection()
+
+    def _draw_selection(self):
+        self.sel_coll.set_verts(_square_verts(self.selection, self.step))
+        self.fig.canvas.draw_idle()
+
+    def edit_selection(self):
+        """Un solo dialog per tutte le celle selezionate."""
+        n = int(self.selection.sum())
+        if not n:
+            print("[selezione] Nessuna cella selezionata (trascina col tasto sinistro, shift+click per aggiungere)."); return
+        msg = (f"{n} celle selezionate.\n"
+               "numero o =numero: imposta Target_Depth_cm\n"
+               "+numero / -numero: somma a Target_Depth_cm\n"
+               "i: inverte Included    r: azzera Included")
+        s = _ask_number_near_figure(self.fig, "Modifica in blocco", msg)
+        if s is None: return
+        cmd = _parse_bulk_command(s)
+        if cmd is None:
+            print("Comando non valido, modifica annullata."); return
+        self.apply_bulk(*cmd)
+
+    def apply_bulk(self, action: str, value: float | None = None) -> int:
+        """Applica alla selezione "set"/"delta" (Target_Depth_cm) o "i"/"r" (inverte/azzera Included)
+        con un'unica modifica vettoriale della griglia, un solo evento nel journal e un solo salvataggio.
+        Le celle senza la chiave nel file restano escluse, come in dbio. Ritorna le celle cambiate."""
+        if action == "r":
+            prop, changed = "Included", reset_included(self.grid, self.selection)
+        elif action == "i":
+            prop, changed = "Included", toggle_included(self.grid, self.selection)
+        elif action in ("set", "delta"):
+            prop = "Target_Depth_cm"
+            changed = set_target(self.grid, self.selection, **{"value" if action == "set" else "delta": value})
+        else:
+            raise ValueError(f"azione sconosciuta: {action}")
+        edits = []
+        with self.lines.mapped() if isinstance(self.lines, RecipeLines) else nullcontext():  # una mappa per tutte le righe
+            for ix, iy in np.argwhere(changed).tolist():
+                key = f"GVL.GPS_Grid_data[{ix}][{iy}].{prop}"
+                line_idx = self.key_to_line.get(key)
+                if line_idx is None:
+                    continue
+                new = ("TRUE" if self.grid.included[ix, iy] == 1 else "FALSE") if prop == "Included" \
+                    else format_value(self.grid.target_depth[ix, iy])
+                edits.append({"key": key, "old": self._value_text(line_idx), "new": new, "cell": [ix, iy], "prop": prop})
+        self._store_edits(edits, changed)
+        print(f"[selezione] {prop}: {len(edits)} celle modificate su {int(self.selection.sum())} selezionate"
+              + ("" if self.journal is None else f" (journal: {self.journal.path.name})"))
+        self.fig.canvas.draw_idle()
+        return len(edits)
 
     # click: edit Target_Depth_cm (solo file GRIGLIA)
-    def on_click(event):
-        if not event.inaxes or event.xdata is None or event.ydata is None:
+    def edit_cell(self, ix: int, iy: int):
+        props = self.grid.cell_props(ix, iy)
+        key = f"GVL.GPS_Grid_data[{ix}][{iy}].Target_Depth_cm"
+        line_idx = self.key_to_line.get(key)
+        if line_idx is None:
+            print(f"Cella [{ix}][{iy}] senza '{key}' nel file: non modificabile.")
             return
-        for info in rects_info:
-            ok, _ = info["rect"].contains(event)
-            if not ok: continue
-            ix, iy = info["ix"], info["iy"]
-            key = f"GVL.GPS_Grid_data[{ix}][{iy}].Target_Depth_cm"
-            line_idx = key_to_line.get(key)
-            if line_idx is None:
-                print(f"Cella [{ix}][{iy}] senza '{key}' nel file: non modificabile.")
-                return
-            current = info["props"].get("Target_Depth_cm")
-            msg = f"{key}\nValore attuale: {current}\nNuovo valore (numero):"
-            s = _ask_number_near_figure(fig, "Edit Target_Depth_cm", msg,
-                                        default=str(current) if current is not None else None)
-            if s is None: return
-            try: v = float(s)
-            except ValueError:
-                print("Valore non numerico, modifica annullata."); return
-            v_out = str(int(v)) if v.is_integer() else f"{v}"
-            lines[line_idx] = f"{key}:={v_out}\n"
-            info["props"]["Target_Depth_cm"] = int(v) if v.is_integer() else v
-            p = Path(source_path); out_path = str(p.with_name(p.stem + "_edited" + p.suffix))
-            with open(out_path, "w", encoding="utf-8") as f: f.writelines(lines)
-            print(f"Modificato {key} = {v_out}  ->  salvato in: {out_path}")
-            fig.canvas.draw_idle(); return
-    fig.canvas.mpl_connect("button_press_event", on_click)
-
-    # -------------------------- UI esterna (Tk) + hotkeys ----------------------
-    current_state = {"p": SHOW_PATH_INDEX, "l": SHOW_LAST_DEPTH, "t": SHOW_TARGET_DEPTH}
-
-    def _refresh_overlays(show_path: bool, show_last: bool, show_target: bool):
-        current_state["p"] = show_path; current_state["l"] = show_last; current_state["t"] = show_target
-        for entry in overlay_entries:
-            t = entry["text"]; props = entry["props"]
-            txt = _cell_text(props, show_path, show_last, show_target)
-            if txt:
-                t.set_text(txt); t.set_visible(True)
-            else:
-                t.set_visible(False)
-        fig.canvas.draw_idle()
+        current = props.get("Target_Depth_cm")
+        msg = f"{key}\nValore attuale: {current}\nNuovo valore (numero):"
+        s = _ask_number_near_figure(self.fig, "Edit Target_Depth_cm", msg,
+                                    default=str(current) if current is not None else None)
+        if s is None: return
+        try: v = float(s)
+        except ValueError:
+            print("Valore non numerico, modifica annullata."); return
+        v_out = format_value(v)
+        self._set_values([{"key": key, "old": self._value_text(line_idx), "new": v_out,
+                           "cell": [ix, iy], "prop": "Target_Depth_cm"}])
+        print(f"Modificato {key} = {v_out}  ->  {self.patcher.out_path}"
+              + ("" if self.journal is None else f" (journal: {self.journal.path.name})"))
+        self.fig.canvas.draw_idle()
+
+    # ------------------------------------------------- edit, journal e salvataggio
+    def _value_text(self, line_idx: int) -> str | None:
+        return self._pending[line_idx] if line_idx in self._pending else line_value(self.lines[line_idx])
+
+    def _set_values(self, edits: List[Dict[str, Any]], record: bool = True) -> int:
+        """Applica le modifiche {key, new, cell, prop} (prop predefinita Target_Depth_cm) cella per cella;
+        con record=True finiscono nel journal come un solo evento. Ritorna quante ne ha applicate."""
+        changed = np.zeros((self.grid.n, self.grid.n), dtype=bool)
+        done = []
+        for e in edits:
+            if e.get("new") is None or not e.get("cell") or e["key"] not in self.key_to_line:
+                continue
+            ix, iy = e["cell"]
+            self.grid.set_prop(ix, iy, e.get("prop", "Target_Depth_cm"), parse_value(e["new"]))
+            changed[ix, iy] = True; done.append(e)
+        self._store_edits(done, changed, record)
+        return len(done)
+
+    def _store_edits(self, edits: List[Dict[str, Any]], changed: np.ndarray, record: bool = True):
+        """Modifiche già applicate alla griglia: journal, overlay, tooltip, celle Included e salvataggio differito."""
+        if not edits:
+            return
+        if record and self.journal is not None:
+            self.journal.record_batch(edits)
+        for e in edits:
+            self._pending[self.key_to_line[e["key"]]] = e["new"]
+        self.overlay.set_grid(self.grid, changed); self.overlay.update()
+        for ix, iy in np.argwhere(changed).tolist():
+            self.tip.invalidate((ix, iy))
+        if any(e.get("prop") == "Included" for e in edits):
+            self._refresh_included()
+        if self.journal is None:
+            self.flush_edits()  # senza journal nessuna traccia: salva subito
+        else:
+            self._save_timer.stop(); self._save_timer.start()
+
+    def flush_edits(self):
+        """Scrive le modifiche in sospeso nella ricetta _edited (patch dei soli valori)."""
+        self._save_timer.stop()
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try: mode = self.patcher.set_values(pending)
+        except (OSError, RuntimeError) as e:
+            print(f"Salvataggio non riuscito: {e}" + ("" if self.journal is None else " (le modifiche restano nel journal)"))
+            return
+        print(f"[edit] {len(pending)} modifiche salvate in: {self.patcher.out_path} ({mode})")
+
+    def _undo_redo(self, redo: bool):
+        if self.journal is None: return
+        rec = self.journal.redo() if redo else self.journal.undo()
+        if rec is None:
+            print("[edit] Niente da " + ("ripetere." if redo else "annullare.")); return
+        edits = EditJournal.edits_of(rec)
+        n = self._set_values([dict(e, new=e["new"] if redo else e["old"]) for e in edits], record=False)
+        if len(edits) == 1:
+            e = edits[0]; print(f"[edit] {'Ripetuto' if redo else 'Annullato'}: {e['key']} = {e['new'] if redo else e['old']}")
+        else:
+            print(f"[edit] {'Ripetuta' if redo else 'Annullata'} modifica in blocco: {n} celle")
+        self.fig.canvas.draw_idle()
+
+    def _replay_journal(self):
+        """Riapplica il risultato netto del journal sulla ricetta caricata (es. appena scaricata)."""
+        if self.journal is None:
+            return
+        todo = []
+        for key, (e, old, new) in self.journal.effective().items():
+            line_idx = self.key_to_line.get(key)
+            if line_idx is None or not e.get("cell"):
+                print(f"[journal] {key} non presente nella ricetta: ignorato."); continue
+            current = line_value(self.lines[line_idx])
+            if current == new:
+                continue
+            if current != old:
+                print(f"[journal] {key}: nel file {current}, prima della modifica era {old}; applico {new}.")
+            todo.append(dict(e, new=new))
+        applied = self._set_values(todo, record=False)
+        if applied:
+            print(f"[journal] {applied} modifiche ripristinate da {self.journal.path.name}")
+            self.flush_edits()
+        elif self.journal.done:
+            print(f"[journal] Modifiche già presenti nella ricetta: {self.journal.path.name} azzerato.")
+            self.journal.reset()
+
+    def _on_close_edits(self, _evt):
+        self.flush_edits()
+        if self.journal is not None: self.journal.close()
+
+    # tastiera P/L/T + H (vista iniziale) + Invio/Esc (selezione)
+    def on_key(self, event):
+        if not getattr(event, "key", None): return
+        k = event.key.lower()
+        if k in ("ctrl+z", "ctrl+y"):
+            self._undo_redo(redo=k == "ctrl+y"); return
+        if k == "enter":
+            self.edit_selection(); return
+        if k == "escape":
+            self.clear_selection(); return
+        if k == "h":
+            self.nav.home(); return
+        if k not in ("p", "l", "t"): return
+        self.current_state[k] = not self.current_state[k]
+        self.refresh_overlays(self.current_state["p"], self.current_state["l"], self.current_state["t"])
 
-    # reload callback: FTP pull GRID+IO, merge e riapri viewer
-    def _do_reload():
+    def _on_close_fig(self, _evt):
+        try: self.win.destroy()
+        except Exception: pass
+
+    def refresh_overlays(self, show_path: bool, show_last: bool, show_target: bool):
+        self.current_state["p"] = show_path; self.current_state["l"] = show_last; self.current_state["t"] = show_target
+        self.overlay.set_flags(show_path, show_last, show_target)
+        self.fig.canvas.draw_idle()
+
+    # --------------------------------------------------------- dati / reload
+    def set_data(self, data: Dict[str, Any], lines: List[str], key_to_line: Dict[str, int], source_path: str,
+                 grid: GridArrays):
+        """Sostituisce i dati sulla stessa figura aggiornando solo gli artisti toccati.
+        Valida tutto prima di modificare qualcosa (SystemExit se i dati non sono validi)."""
+        extent_dm, N, step, easts, norths = _view_params(data)
+        grid = grid.resized(N)
+        validate_included_centers(grid)
+
+        geometry_changed = (N, step, extent_dm) != (self.N, self.step, self.extent_dm)
+        self.flush_edits()
+        changed = self.grid.diff_mask(grid)
+        old = self.grid
+        if source_path != self.source_path and self.journal is not None:
+            self.journal.close(); self.journal = EditJournal(_journal_path(source_path))
+        self.grid, self.lines, self.key_to_line, self.source_path = grid, lines, key_to_line, source_path
+        self.patcher = RecipePatcher(lines, _edited_path(source_path))
+
+        # Included: solo se cambia la maschera o un centro delle celle Included
+        inc_changed = geometry_changed or old.n != grid.n or not (
+            np.array_equal(old.included == 1, grid.included == 1)
+            and np.array_equal(old.center_east[old.included == 1], grid.center_east[grid.included == 1])
+            and np.array_equal(old.center_north[old.included == 1], grid.center_north[grid.included == 1])
+        )
+
+        # perimetro e punti
+        self.perimeter.set_data(easts + [easts[0]], norths + [norths[0]])
+        self.points.set_offsets(np.column_stack([easts, norths]))
+        for lbl, x0, y0 in zip(self.point_labels, easts, norths):
+            lbl.xy = (x0, y0)
+
+        if geometry_changed:
+            self.N, self.step, self.extent_dm = N, step, extent_dm
+            vsegs, hsegs = _grid_segments(N, step)
+            self.grid_lines[0].set_segments(vsegs); self.grid_lines[1].set_segments(hsegs)
+            self.nav.home_lims = ((0, extent_dm), (0, extent_dm))
+            self.overlay.N, self.overlay.step = N, step
+            self.overlay.set_grid(grid)
+            self.tip.invalidate()
+            self.clear_selection()
+            self.nav.home()
+        else:
+            self.overlay.set_grid(grid, changed)
+            for ix, iy in np.argwhere(changed).tolist():
+                self.tip.invalidate((ix, iy))
+        if inc_changed:
+            self._refresh_included()
+        self._replay_journal()  # le modifiche dell'utente restano sopra i dati nuovi
+        self.overlay.update()
+        self.fig.canvas.draw_idle()
+        return int(changed.sum())
+
+    def _refresh_included(self):
+        if isinstance(self.included, list):
+            for r in self.included:
+                r.remove()
+            self.included = _add_included_cells(self.ax, self.grid, self.step, mode="patches")
+        else:
+            self.included.set_verts(_included_verts(self.grid, self.step))
+
+    # reload callback: FTP pull GRID+IO e aggiornamento sulla stessa figura
+    def reload(self):
+        # le modifiche in sospeso vanno scritte prima che il pull sostituisca il file sorgente
+        self.flush_edits()
         # parent Tk della figura (se c'è)
         try:
-            parent_tk = fig.canvas.get_tk_widget().winfo_toplevel()  # type: ignore[attr-defined]
+            parent_tk = self.fig.canvas.get_tk_widget().winfo_toplevel()  # type: ignore[attr-defined]
         except Exception:
             parent_tk = None
 
-        # chiudi la finestra Layer e la figura correnti
-        try: win.destroy()
-        except Exception: pass
-        try: plt.close(fig)
-        except Exception: pass
-
-        # Pull di ENTRAMBI i file
+        # Pull di ENTRAMBI i file (una sola sessione FTP)
         try:
-            local_grid_path = ensure_local_grid_recipe_pulled(silent=False, popup=True, parent_tk=parent_tk)
-            local_io_path   = ensure_local_io_recipe_pulled(silent=False, popup=True, parent_tk=parent_tk)
+            res = pull_recipes_with_popup(("GRID", "IO"), silent=False, popup=True, parent_tk=parent_tk)
+            local_grid_path, local_io_path = res["GRID"].local, res["IO"].local
         except Exception as e:
             _popup("Reload – FTP", f"Errore durante il pull FTP:\n{e}", "error", parent=parent_tk)
             return
 
-        # Parse + merge: IO solo da IO.txtrecipe, Griglia solo da GPS_Grid.txtrecipe
+        # nulla di cambiato sul PLC e stesso file già mostrato: niente re-parse
+        if all(r.ok and not r.changed for r in res.values()) and str(local_grid_path) == self.source_path \
+                and self.io_path == str(local_io_path):
+            print("[reload] GRID e IO invariati: nessun aggiornamento.")
+            return
+
+        # Parse: IO solo da IO.txtrecipe, Griglia (colonnare) solo da GPS_Grid.txtrecipe
         try:
             from recipe import load_io_recipe, load_grid_recipe
             io_only = load_io_recipe(str(local_io_path))
-            grid_only, lines2, key_to_line2 = load_grid_recipe(str(local_grid_path))
-            merged = {}
-            merged.update(io_only)
-            merged.update(grid_only)
+            grid2, lines2, key_to_line2 = load_grid_recipe(str(local_grid_path))
+            with perf.phase("set_data"):
+                n_changed = self.set_data(io_only, lines2, key_to_line2, str(local_grid_path), grid=grid2)
+            self.io_path = str(local_io_path)
         except SystemExit as e:
             _popup("Reload – dati non validi", str(e), "error", parent=parent_tk)
             return
         except Exception as e:
             _popup("Reload – eccezione", f"{e}", "error", parent=parent_tk)
             return
+        print(f"[reload] Celle cambiate: {n_changed}")
 
-        # riapri il viewer (passiamo righe/mappa del SOLO file GRIGLIA)
-        view_from_file(merged, lines2, key_to_line2, str(local_grid_path))
 
-        try:
-            plt.show(block=False)
-            plt.pause(0.001)
-        except Exception:
-            pass
+def view_from_file(data: Dict[str, Any], lines: List[str], key_to_line: Dict[str, int], source_path: str,
+                   grid: GridArrays | None = None, io_path: str | None = None) -> GridViewer:
+    """Apre il viewer. `data` fornisce i parametri IO; le celle arrivano da `grid`
+    (se assente viene ricavata dalle chiavi GVL.GPS_Grid_data[..] di `data`).
+    `io_path` (file IO di provenienza) serve al reload per riconoscere i file invariati."""
+    if grid is None:
+        grid = GridArrays.from_data(data)
+    with perf.phase("viewer"):
+        viewer = GridViewer(data, lines, key_to_line, source_path, grid, io_path=io_path)
+    if perf.active():
+        _time_first_draw(viewer.fig)
+    return viewer
 
-    # tastiera P/L/T
-    def on_key(event):
-        if not getattr(event, "key", None): return
-        k = event.key.lower()
-        if k not in ("p", "l", "t"): return
-        current_state[k] = not current_state[k]
-        _refresh_overlays(current_state["p"], current_state["l"], current_state["t"])
-    fig.canvas.mpl_connect("key_press_event", on_key)
 
-    # prova ad aprire la finestra Tk (se backend Tk disponibile)
-    try:
-        parent = fig.canvas.get_tk_widget().winfo_toplevel()  # type: ignore[attr-defined]
-        win = open_layer_window(
-            parent_tk=parent,
-            initial_state={"Path_Index": current_state["p"], "Last_Depth": current_state["l"], "Target_Depth": current_state["t"]},
-            on_change=_refresh_overlays,
-            on_reload=_do_reload,
-        )
-        def _on_close_fig(_evt):
-            try: win.destroy()
-            except Exception: pass
-        fig.canvas.mpl_connect("close_event", _on_close_fig)
-    except Exception:
-        # fallback: applica stato iniziale e usa solo scorciatoie tastiera
-        _refresh_overlays(current_state["p"], current_state["l"], current_state["t"])
+def _time_first_draw(fig):
+    """perf: dalla fine della costruzione al primo draw completato (apertura finestra + render)."""
+    t0 = time.perf_counter()
+    def _on_draw(_evt):
+        fig.canvas.mpl_disconnect(cid)
+        perf.add("first_draw", time.perf_counter() - t0)
+    cid = fig.canvas.mpl_connect("draw_event", _on_draw)
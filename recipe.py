@@ -2,19 +2,32 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 from typing import Dict, Any, Tuple, List
-import re
-from recipe_parser import parse_recipe_indexed
+import perf
+from recipe_parser import iter_recipe, parse_recipe_indexed
+from grid_model import GridArrays, _GRID_RE
 
 _IO_PREFIX = ("IO.GPS.Cfg.", "IO.GPS.Vis.", "IO.GPS.Sts.")
-_GRID_RE = re.compile(r"^GVL\.GPS_Grid_data\[\d+\]\[\d+\]\.[A-Za-z_]\w*$")
+_GRID_PREFIX = ("GVL.GPS_Grid_data[",)
 
 def load_io_recipe(io_path: str) -> Dict[str, Any]:
-    """Ritorna solo IO.GPS.(Cfg|Vis|Sts).* da IO.txtrecipe."""
-    data, _lines, _k2l = parse_recipe_indexed(io_path)
-    return {k: v for k, v in data.items() if k.startswith(_IO_PREFIX)}
+    """Ritorna solo IO.GPS.(Cfg|Vis|Sts).* da IO.txtrecipe.
 
-def load_grid_recipe(grid_path: str) -> Tuple[Dict[str, Any], List[str], Dict[str, int]]:
-    """Ritorna (dati_griglia_filtrati, righe_file, mappa_chiave->linea) dal file GPS_Grid.txtrecipe."""
-    data, lines, k2l = parse_recipe_indexed(grid_path)
-    grid = {k: v for k, v in data.items() if _GRID_RE.match(k)}
-    return grid, lines, k2l
+    Lettura in streaming: le altre chiavi del dump PLC non vengono convertite né tenute in memoria.
+    """
+    with perf.phase("io"):
+        return {k: v for _idx, k, v in iter_recipe(io_path, prefixes=_IO_PREFIX)}
+
+def load_grid_recipe(grid_path: str) -> Tuple[GridArrays, List[str], Dict[str, int]]:
+    """Ritorna (griglia_colonnare, righe_file, mappa_chiave->linea) dal file GPS_Grid.txtrecipe.
+
+    Ogni chiave passa una sola volta da _GRID_RE: gli indici estratti riempiono direttamente GridArrays.
+    """
+    with perf.phase("grid"):
+        data, lines, k2l = parse_recipe_indexed(grid_path, prefixes=_GRID_PREFIX)
+        with perf.phase("build"):
+            items = []
+            for k, v in data.items():
+                m = _GRID_RE.match(k)
+                if m:
+                    items.append((int(m.group(1)), int(m.group(2)), m.group(3), v))
+            return GridArrays.from_items(items), lines, k2l
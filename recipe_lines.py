@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""Righe di una ricetta senza tenerle in memoria come stringhe.
+
+RecipeLines conserva solo l'indice degli offset di inizio riga (array('Q')) e legge i
+byte dal file mappato in memoria quando una riga serve davvero; le righe modificate
+stanno in un piccolo dict. Il file non resta aperto tra un accesso e l'altro (su Windows
+il pull FTP deve poterlo rinominare come backup): la mappa si apre a richiesta e
+l'impronta (dimensione, mtime) verifica che il file sia ancora quello indicizzato.
+
+RecipePatcher salva le modifiche sostituendo solo i byte dei valori cambiati: sul posto
+se la lunghezza non cambia, altrimenti copiando in streaming i tratti invariati in un
+file temporaneo poi rinominato (os.replace).
+"""
+from __future__ import annotations
+import mmap, os, shutil
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def file_fingerprint(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _decode(raw: bytes) -> str:
+    """Come la lettura in testo (utf-8, errors="ignore", newline universale) di una riga."""
+    s = raw.decode("utf-8", "ignore")
+    return s[:-2] + "\n" if s.endswith("\r\n") else s
+
+
+class RecipeLines:
+    """Sequenza di righe (str, come readlines()) servita dal file mappato in memoria.
+
+    offsets: inizio di ogni riga più la fine del file come sentinella (len = righe + 1).
+    """
+
+    def __init__(self, path: str, offsets: array, fingerprint: Tuple[int, int]):
+        self.path = str(path)
+        self.offsets = offsets
+        self.fingerprint = tuple(fingerprint)
+        self.overrides: Dict[int, str] = {}
+        self._mm: Optional[mmap.mmap] = None
+        self._depth = 0
+
+    # ------------------------------------------------------------ mappa file
+    @contextmanager
+    def mapped(self):
+        """Tiene aperta la mappa per una serie di accessi (annidabile)."""
+        if self._depth == 0:
+            self._mm = self._open()
+        self._depth += 1
+        try:
+            yield self._mm
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                if self._mm is not None: self._mm.close()
+                self._mm = None
+
+    def _open(self) -> Optional[mmap.mmap]:
+        if file_fingerprint(self.path) != self.fingerprint:
+            raise RuntimeError(f"{self.path} è cambiato su disco dopo la lettura: ricaricare la ricetta.")
+        if self.fingerprint[0] == 0:
+            return None  # file vuoto: mmap non ammesso
+        with open(self.path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def raw(self, i: int) -> bytes:
+        """Byte originali della riga i (terminatore incluso)."""
+        with self.mapped() as mm:
+            return mm[self.offsets[i]:self.offsets[i + 1]]
+
+    # ------------------------------------------------------- interfaccia lista
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _index(self, i: int) -> int:
+        n = len(self)
+        if i < 0: i += n
+        if not 0 <= i < n: raise IndexError("indice riga fuori intervallo")
+        return i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            with self.mapped():
+                return [self[k] for k in range(*i.indices(len(self)))]
+        i = self._index(i)
+        if i in self.overrides:
+            return self.overrides[i]
+        return _decode(self.raw(i))
+
+    def __setitem__(self, i: int, value: str):
+        self.overrides[self._index(i)] = value
+
+    def __iter__(self) -> Iterator[str]:
+        # senza passare da __getitem__/raw(): una sola mappa, nessun contesto per riga
+        with self.mapped() as mm:
+            offs, ov = self.offsets, self.overrides
+            for i in range(len(self)):
+                yield ov[i] if i in ov else _decode(mm[offs[i]:offs[i + 1]])
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (RecipeLines, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    # ---------------------------------------------------------------- scrittura
+    def _encoded_override(self, i: int, mm) -> bytes:
+        """Riga modificata in byte, con lo stesso terminatore (\\r\\n o \\n) della riga originale."""
+        s = self.overrides[i]
+        if s.endswith("\n") and not s.endswith("\r\n") and mm[self.offsets[i + 1] - 2:self.offsets[i + 1]] == b"\r\n":
+            s = s[:-1] + "\r\n"
+        return s.encode("utf-8")
+
+    def write_to(self, out_path: str):
+        """Scrive la ricetta con le modifiche: i tratti invariati sono copiati dalla mappa senza decodifica."""
+        with self.mapped() as mm, open(out_path, "wb") as f:
+            view = memoryview(mm) if mm is not None else memoryview(b"")
+            try:
+                pos = 0
+                for i in sorted(self.overrides):
+                    f.write(view[pos:self.offsets[i]])
+                    f.write(self._encoded_override(i, mm))
+                    pos = self.offsets[i + 1]
+                f.write(view[pos:self.offsets[-1]])
+            finally:
+                view.release()
+
+
+def write_lines(lines: Sequence[str] | RecipeLines, out_path: str):
+    """Scrive le righe di una ricetta (temporaneo + os.replace): copia diretta dalla mappa per RecipeLines."""
+    tmp = str(out_path) + ".tmp"
+    if isinstance(lines, RecipeLines):
+        lines.write_to(tmp)
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+    os.replace(tmp, out_path)
+
+
+# ------------------------------------------------------------ patch dei valori
+_WS = b" \t\x0b\x0c"
+
+
+def value_span(line: bytes) -> Optional[Tuple[int, int]]:
+    """(inizio, fine) del valore in b"chiave := valore // commento\\r\\n"; None se la riga non è un'assegnazione."""
+    p = line.find(b":=")
+    if p < 0:
+        return None
+    start, end = p + 2, len(line.rstrip(b"\r\n"))
+    while start < end and line[start] in _WS: start += 1
+    c = line.find(b"//", start, end)
+    if c >= 0: end = c
+    while end > start and line[end - 1] in _WS: end -= 1
+    return start, end
+
+
+def line_value(line: str) -> Optional[str]:
+    """Testo del valore di una riga (senza commento né spazi); None se non è un'assegnazione."""
+    raw = line.encode("utf-8")
+    span = value_span(raw)
+    return None if span is None else raw[span[0]:span[1]].decode("utf-8")
+
+
+def patch_value(line: str, value: str) -> str:
+    """Sostituisce solo il valore della riga, lasciando spazi, commento e terminatore com'erano."""
+    raw = line.encode("utf-8")
+    span = value_span(raw)
+    if span is None:
+        return line
+    return (raw[:span[0]] + value.encode("utf-8") + raw[span[1]:]).decode("utf-8")
+
+
+def _copy_range(fi, fo, start: int, end: Optional[int]):
+    fi.seek(start)
+    if end is None:
+        shutil.copyfileobj(fi, fo, 1 << 20); return
+    left = end - start
+    while left > 0:
+        chunk = fi.read(min(left, 1 << 20))
+        if not chunk: break
+        fo.write(chunk); left -= len(chunk)
+
+
+def patch_file(src: str, dst: str, patches: Sequence[Tuple[int, int, bytes]]) -> bool:
+    """dst = src con i tratti di byte [inizio, fine) sostituiti; ritorna True se scritto sul posto.
+
+    Sul posto solo se src è dst e nessuna patch cambia lunghezza (nessun byte si sposta);
+    altrimenti copia in streaming in un temporaneo accanto a dst e os.replace.
+    """
+    patches = sorted(patches)
+    if os.path.abspath(src) == os.path.abspath(dst) and all(e - s == len(new) for s, e, new in patches):
+        with open(dst, "r+b") as f:
+            for s, e, new in patches:
+                f.seek(s); f.write(new)
+            f.flush(); os.fsync(f.fileno())
+        return True
+    tmp = str(dst) + ".tmp"
+    with open(src, "rb") as fi, open(tmp, "wb") as fo:
+        pos = 0
+        for s, e, new in patches:
+            _copy_range(fi, fo, pos, s); fo.write(new); pos = e
+        _copy_range(fi, fo, pos, None)
+        fo.flush(); os.fsync(fo.fileno())
+    os.replace(tmp, dst)
+    return False
+
+
+class RecipePatcher:
+    """Tiene out_path (es. la ricetta _edited) allineato alle righe sorgente più le modifiche di valore.
+
+    La prima scrittura copia il sorgente con le patch; le successive patchano l'output usando i suoi
+    offset di riga (aggiornati a ogni cambio di lunghezza), quindi il costo dipende dalle modifiche,
+    non dalla dimensione del file, finché la lunghezza dei valori non cambia. Se l'output è stato
+    toccato da altri si riparte dal sorgente con tutte le modifiche. Con una lista di righe (lettore
+    di testo) si riscrive il file intero.
+    """
+
+    def __init__(self, lines: Sequence[str] | RecipeLines, out_path: str):
+        self.lines = lines
+        self.out_path = str(out_path)
+        self.values: Dict[int, str] = {}
+        self.offsets: Optional[np.ndarray] = None  # offset di riga (int64) dell'output già scritto
+        self.out_fp: Optional[Tuple[int, int]] = None
+
+    def set_values(self, edits: Dict[int, str]) -> str:
+        """Applica {indice_riga: nuovo_valore}; ritorna il modo usato ("sul posto", "copia", "completa")."""
+        for i, v in edits.items():
+            self.lines[i] = patch_value(self.lines[i], v)
+        self.values.update(edits)
+        if not isinstance(self.lines, RecipeLines):
+            write_lines(self.lines, self.out_path)
+            return "completa"
+        out_fp = None
+        try: out_fp = file_fingerprint(self.out_path)
+        except OSError: pass
+        if self.offsets is None or out_fp != self.out_fp:
+            if file_fingerprint(self.lines.path) != self.lines.fingerprint:
+                raise RuntimeError(f"{self.lines.path} è cambiato su disco dopo la lettura: ricaricare la ricetta.")
+            base, offs, todo = self.lines.path, np.array(self.lines.offsets, dtype=np.int64), dict(self.values)
+        else:
+            base, offs, todo = self.out_path, self.offsets, edits
+        idxs: List[int] = []; patches = []
+        with open(base, "rb") as f:
+            for i in sorted(todo):
+                start = int(offs[i])
+                f.seek(start); span = value_span(f.read(int(offs[i + 1]) - start))
+                if span is None: continue
+                idxs.append(i); patches.append((start + span[0], start + span[1], todo[i].encode("utf-8")))
+        in_place = patch_file(base, self.out_path, patches)
+        # le righe dopo una patch di lunghezza diversa si spostano della somma delle differenze precedenti
+        shift = np.zeros(len(offs), dtype=np.int64)
+        for i, (s, e, new) in zip(idxs, patches):
+            shift[i + 1] += len(new) - (e - s)
+        self.offsets, self.out_fp = offs + np.cumsum(shift), file_fingerprint(self.out_path)
+        return "sul posto" if in_place else "copia"
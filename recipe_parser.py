@@ -1,20 +1,43 @@
 # -*- coding: utf-8 -*-
-"""Parser strict: restituisce valori, righe originali e mappa chiave->indice riga."""
-import re
-from typing import Any, Dict, List, Tuple
+"""Parser strict: restituisce valori, righe originali e mappa chiave->indice riga.
 
-_KEY_RE = re.compile(r"^([A-Za-z0-9_.\[\]]+)\s*:=\s*(.+?)\s*$")
+Cache di parse (PARSE_CACHE_ENABLED): il risultato si salva in binario (marshal) in
+PARSE_CACHE_DIR accanto alla ricetta, con chiave percorso + dimensione + mtime + hash
+del contenuto. Se dimensione e mtime coincidono con la voce il file non si rilegge; l'hash
+si calcola solo se differiscono o se la mtime era troppo vicina al salvataggio della voce
+(PARSE_CACHE_MTIME_SLACK_S: file system con mtime a grana grossa). Una voce non più valida
+si riscrive, le più vecchie oltre PARSE_CACHE_MAX_ENTRIES vengono eliminate.
+
+iter_recipe(): lettura in streaming, riga per riga, con filtro sulle chiavi applicato
+prima di convertire i valori; non costruisce la lista delle righe (memoria costante).
+
+Con RECIPE_MMAP il file è mappato in memoria e analizzato come byte: le righe restano
+nel file (RecipeLines, solo offset) e si decodificano solo quelle che servono.
+"""
+import hashlib, marshal, mmap, os, re, time
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import config as CFG
+import perf
+from recipe_lines import RecipeLines, file_fingerprint
+
+_CACHE_VERSION = 3
 
 # rimuove eventuali commenti inline e normalizza spazi Unicode
 def _clean_value(raw: str) -> str:
     # taglia tutto ciò che segue // (commento stile PLC/HMI)
-    raw = re.split(r"\s*//", raw, maxsplit=1)[0]
-    # rimuovi spazi e caratteri invisibili tipici (NBSP, ecc.)
-    raw = raw.replace("\u00A0", " ").replace("\u2007", " ").replace("\u202F", " ")
+    cut = raw.find("//")
+    if cut >= 0:
+        raw = raw[:cut]
+    # rimuovi spazi e caratteri invisibili tipici (NBSP, ecc.): solo testo non ASCII può contenerli
+    if not raw.isascii():
+        raw = raw.replace("\u00A0", " ").replace("\u2007", " ").replace("\u202F", " ")
     return raw.strip()
 
-def parse_value(raw: str) -> Any:
-    s = _clean_value(raw)
+def _parse_value_regex(s: str) -> Any:
+    """Classificazione generica (regex, Unicode) di un valore già pulito."""
     # Hex tipo 16#FF
     if s.upper().startswith("16#"):
         try:
@@ -39,19 +62,265 @@ def parse_value(raw: str) -> Any:
     # fallback: stringa
     return s
 
-def parse_recipe_indexed(path: str) -> Tuple[Dict[str, Any], List[str], Dict[str, int]]:
+def _classify(s: str) -> Any:
+    """Come _parse_value_regex ma con controlli sui caratteri; regex solo per testo non ASCII."""
+    if not s.isascii():
+        return _parse_value_regex(s)
+    c = s[:1]
+    if c == "1" and s[:3] == "16#":
+        try:
+            return int(s[3:], 16)
+        except Exception:
+            pass
+    elif c in ("T", "t", "F", "f") and len(s) <= 5:
+        u = s.upper()
+        if u == "TRUE": return True
+        if u == "FALSE": return False
+    digits = s[1:] if c in ("+", "-") else s
+    if digits.isdigit():  # ASCII: solo 0-9
+        return int(s)
+    whole, dot, frac = digits.partition(".")
+    if dot and whole.isdigit() and frac.isdigit():
+        return float(s)
+    return s
+
+def parse_value(raw: str) -> Any:
+    return _classify(_clean_value(raw))
+
+# solo la chiave passa da regex (vecchia regex di riga: ^([A-Za-z0-9_.\[\]]+)\s*:=\s*(.+?)\s*$)
+_KEY_OK = re.compile(r"[A-Za-z0-9_.\[\]]+").fullmatch
+_KEY_OK_B = re.compile(rb"[A-Za-z0-9_.\[\]]+").fullmatch
+_LONE_CR = re.compile(rb"\r(?!\n)").search
+
+def iter_recipe(path: str, prefixes: Optional[Sequence[str]] = None,
+                key_filter: Optional[Callable[[str], bool]] = None) -> Iterator[Tuple[int, str, Any]]:
+    """Genera (indice_riga, chiave, valore) leggendo il file in modo pigro.
+
+    Le chiavi che non iniziano con uno dei `prefixes` o scartate da `key_filter`
+    vengono saltate prima di convertire il valore. Le chiavi ripetute escono più volte
+    (come in parse_recipe_indexed, l'ultima vince se si costruisce un dict).
+    """
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        yield from _scan(f, prefixes, key_filter)
+
+
+def parse_recipe_indexed(path: str, use_cache: bool | None = None,
+                         prefixes: Optional[Sequence[str]] = None) -> Tuple[Dict[str, Any], List[str] | RecipeLines, Dict[str, int]]:
+    """(valori, righe, chiave->indice riga). Con cache attiva (default da config) un file
+    invariato si ricarica dalla cache binaria senza ri-parsare.
+
+    Con `prefixes` valori e mappa contengono solo quelle chiavi; le righe restano tutte.
+    Le righe sono una RecipeLines (RECIPE_MMAP, default) o una lista di str: stessa
+    interfaccia per lettura, assegnazione e iterazione.
+    """
+    prefixes = tuple(prefixes) if prefixes else None
+    if use_cache is None:
+        use_cache = getattr(CFG, "PARSE_CACHE_ENABLED", True)
+    with perf.phase("parse"):
+        if not use_cache:
+            return _parse_recipe_file(path, prefixes)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return _parse_recipe_file(path, prefixes)
+        cache_file = _cache_file(path, prefixes)
+        with perf.phase("cache"):
+            entry = _cache_read(cache_file, path)
+        if entry is not None and _stat_trusted(entry, st):
+            perf.count("parse.cache_hit")
+            return _cache_result(cache_file, path, entry, st)
+        try:
+            with perf.phase("hash"):
+                digest = _file_digest(path)
+                st = os.stat(path)
+        except OSError:
+            return _parse_recipe_file(path, prefixes)
+        if entry is not None and entry[5] == digest:
+            # stesso contenuto, stat diversa (touch, copia): la voce si aggiorna, il prossimo avvio non rilegge
+            perf.count("parse.cache_hit")
+            result = _cache_result(cache_file, path, entry, st)
+            with perf.phase("cache"):
+                _cache_store(cache_file, path, st, digest, result)
+            return result
+        result = _parse_recipe_file(path, prefixes)
+        with perf.phase("cache"):
+            _cache_store(cache_file, path, st, digest, result)
+        return result
+
+
+# ------------------------------- cache di parse -------------------------------
+def _cache_file(path: str, prefixes: Optional[Tuple[str, ...]] = None) -> Path:
+    p = Path(path).resolve()
+    ident = str(p) + ("\0" + "\0".join(prefixes) if prefixes else "")
+    name = hashlib.blake2b(ident.encode("utf-8"), digest_size=8).hexdigest() + ".bin"
+    return p.parent / getattr(CFG, "PARSE_CACHE_DIR", ".recipe_cache") / name
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_read(cache_file: Path, path: str):
+    """Voce della cache per `path` (versione e percorso verificati) o None."""
+    try:
+        with open(cache_file, "rb") as f:
+            entry = marshal.loads(f.read())  # marshal.load(f) legge a piccoli pezzi: ~10x più lento
+        if len(entry) != 10:
+            return None
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if entry[0] != _CACHE_VERSION or entry[1] != str(Path(path).resolve()):
+        return None
+    return entry
+
+
+def _stat_trusted(entry, st: os.stat_result) -> bool:
+    """Dimensione e mtime uguali alla voce, e mtime abbastanza più vecchia del salvataggio della voce:
+    una modifica nello stesso "tick" dell'orologio del file system non passerebbe inosservata."""
+    _v, _src, size, mtime_ns, stored_ns = entry[:5]
+    slack_ns = int(getattr(CFG, "PARSE_CACHE_MTIME_SLACK_S", 2.0) * 1e9)
+    return size == st.st_size and mtime_ns == st.st_mtime_ns and stored_ns - mtime_ns > slack_ns
+
+
+def _cache_result(cache_file: Path, path: str, entry, st: os.stat_result):
+    _v, _src, _size, _mtime_ns, _stored_ns, _digest, keys, values, idxs, lines = entry
+    try: os.utime(cache_file)  # LRU: usato di recente
+    except OSError: pass
+    if isinstance(lines, bytes):  # offset di RecipeLines: validi perché il contenuto è lo stesso
+        lines = RecipeLines(path, array("Q", lines), (st.st_size, st.st_mtime_ns))
+    return dict(zip(keys, values)), lines, dict(zip(keys, idxs))
+
+
+def _cache_store(cache_file: Path, path: str, st: os.stat_result, digest: str, result):
+    data, lines, key_to_line = result
+    keys = list(data)
+    lines_payload = lines.offsets.tobytes() if isinstance(lines, RecipeLines) else list(lines)
+    entry = (_CACHE_VERSION, str(Path(path).resolve()), st.st_size, st.st_mtime_ns, time.time_ns(), digest,
+             keys, [data[k] for k in keys], [key_to_line[k] for k in keys], lines_payload)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(marshal.dumps(entry))
+        os.replace(tmp, cache_file)
+        _cache_evict(cache_file.parent)
+    except (OSError, ValueError):
+        pass
+
+
+def _cache_evict(cache_dir: Path):
+    max_entries = getattr(CFG, "PARSE_CACHE_MAX_ENTRIES", 8)
+    try:
+        entries = sorted(cache_dir.glob("*.bin"), key=lambda p: p.stat().st_mtime, reverse=True)
+    except OSError:
+        return
+    for old in entries[max_entries:]:
+        try: old.unlink()
+        except OSError: pass
+
+
+def _parse_recipe_file(path: str, prefixes: Optional[Tuple[str, ...]] = None) -> Tuple[Dict[str, Any], List[str] | RecipeLines, Dict[str, int]]:
+    with perf.phase("scan"):
+        result = _parse_recipe_lines(path, prefixes)
+    perf.count("parse.lines", len(result[1]))
+    return result
+
+
+def _parse_recipe_lines(path: str, prefixes: Optional[Tuple[str, ...]]) -> Tuple[Dict[str, Any], List[str] | RecipeLines, Dict[str, int]]:
+    if getattr(CFG, "RECIPE_MMAP", True):
+        result = _parse_recipe_mmap(path, prefixes)
+        if result is not None:
+            return result
     data: Dict[str, Any] = {}
     key_to_line: Dict[str, int] = {}
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         lines = f.readlines()
+    for idx, key, val in _scan(lines, prefixes, None):
+        data[key] = val
+        key_to_line[key] = idx
+    return data, lines, key_to_line
+
+
+def _scan(lines: Iterable[str], prefixes: Optional[Sequence[str]],
+          key_filter: Optional[Callable[[str], bool]]) -> Iterator[Tuple[int, str, Any]]:
+    """Tokenizer di riga condiviso: (indice, chiave, valore) per ogni assegnazione valida."""
+    find, key_ok, classify = str.find, _KEY_OK, _classify
+    prefixes = tuple(prefixes) if prefixes else None
     for idx, raw in enumerate(lines):
-        line = raw.strip()
-        if not line or line.startswith("//") or line.startswith("#"):
+        # una sola passata per riga: "chiave := valore // commento"
+        pos = find(raw, ":=")
+        if pos < 0:
             continue
-        m = _KEY_RE.match(line)
-        if not m:
+        key = raw[:pos].strip()
+        # filtri prima di validare e convertire: le chiavi scartate costano solo lo strip
+        if prefixes is not None and not key.startswith(prefixes):
             continue
-        key, raw_val = m.group(1), m.group(2)
-        data[key] = parse_value(raw_val)  # <<— adesso “282 // note” diventa numero 282
-        key_to_line[key] = idx
-    return data, lines, key_to_line
+        if not key_ok(key):  # esclude anche le righe commentate con // o #
+            continue
+        if key_filter is not None and not key_filter(key):
+            continue
+        val = raw[pos + 2:].strip()
+        if not val:
+            continue
+        # casi più comuni senza chiamate: \d della vecchia regex == isdecimal()
+        if val.isdecimal():
+            yield idx, key, int(val)
+        elif val == "FALSE" or val == "TRUE":
+            yield idx, key, val == "TRUE"
+        else:
+            yield idx, key, classify(_clean_value(val))  # <<— adesso “282 // note” diventa numero 282
+
+
+def _parse_recipe_mmap(path: str, prefixes: Optional[Tuple[str, ...]]):
+    """Come _parse_recipe_file ma sui byte del file mappato, senza tenere le righe come str.
+
+    Ritorna None se il file ha \r isolati (la lettura in testo li tratta come fine riga).
+    Le righe con chiave non ASCII o spazi Unicode passano dal tokenizer su str: output identico.
+    """
+    fp = file_fingerprint(path)
+    data: Dict[str, Any] = {}
+    key_to_line: Dict[str, int] = {}
+    offsets = array("Q", [0])
+    if fp[0] == 0:
+        return data, RecipeLines(path, offsets, fp), key_to_line
+    pb = tuple(p.encode("utf-8") for p in prefixes) if prefixes else None
+    key_ok, classify, append = _KEY_OK_B, _classify, offsets.append
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if _LONE_CR(mm):
+            return None
+        pos = 0
+        for idx, raw in enumerate(iter(mm.readline, b"")):
+            pos += len(raw); append(pos)
+            p = raw.find(b":=")
+            if p < 0:
+                continue
+            key = raw[:p].strip()
+            # se la chiave inizia con un carattere ammesso, lo strip su str darebbe lo stesso inizio
+            if pb is not None and not key.startswith(pb) and (key[:1].isalnum() or key[:1] in b"_.[]"):
+                continue
+            if not key_ok(key):
+                k0 = raw[:p]
+                if k0.isascii() and not any(c in k0 for c in (b"\x1c", b"\x1d", b"\x1e", b"\x1f")):
+                    continue  # scartata anche dal tokenizer su str
+                for _i, k, v in _scan((raw.decode("utf-8", "ignore"),), prefixes, None):
+                    data[k] = v; key_to_line[k] = idx
+                continue
+            val = raw[p + 2:].strip()
+            if not val:
+                continue
+            if val.isdigit():  # bytes: solo 0-9
+                v = int(val)
+            elif val == b"FALSE" or val == b"TRUE":
+                v = val == b"TRUE"
+            else:
+                sval = raw[p + 2:].decode("utf-8", "ignore").strip()
+                if not sval:
+                    continue
+                v = classify(_clean_value(sval))
+            k = key.decode("ascii")
+            data[k] = v; key_to_line[k] = idx
+    return data, RecipeLines(path, offsets, fp), key_to_line
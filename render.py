@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Rendering headless (Agg) di ricette GRID+IO in PNG/SVG, anche molte insieme su un pool di processi.
+
+Stessi livelli del viewer (celle Included, griglia, perimetro, punti di riferimento, numeri nelle
+celle) costruiti con le funzioni di plot_view, senza Tk, popup, FTP né journal delle modifiche.
+Ogni processo tiene una figura sola: tra un file e l'altro con la stessa geometria (N, passo,
+lato) si aggiornano gli artisti, come nel reload del viewer; la figura si ricrea solo se la
+geometria cambia.
+
+L'IO di una griglia si cerca accanto al file (pair_io): stesso nome con "GPS_Grid" -> "IO", poi il
+backup IO_<timestamp> più vicino (entro RENDER_PAIR_MAX_S), infine l'IO locale corrente.
+"""
+from __future__ import annotations
+import os, re, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import matplotlib
+matplotlib.use("Agg")  # prima di pyplot (anche nei processi figli avviati con spawn)
+import matplotlib.pyplot as plt
+import numpy as np
+
+import config as CFG
+from config import FIG_SIZE, FIG_BG, AX_BG, PERIMETER_COLOR, PERIMETER_WIDTH, Z_PERIMETER, \
+    POINT_COLOR, POINT_SIZE, Z_POINTS, POINTS_LABEL_COLOR
+from grid_model import validate_included_centers
+from plot_view import _view_params, _add_included_cells, _included_verts, _OverlayLayer, _add_grid_lines
+from recipe import load_io_recipe, load_grid_recipe
+
+Job = Tuple[str, str, str]                       # (griglia, io, uscita)
+Result = Tuple[str, str, Dict[str, float], Optional[str]]  # (griglia, uscita, tempi s, errore)
+
+
+class _Renderer:
+    """Una figura Agg riusata per più ricette."""
+
+    def __init__(self, flags: Tuple[bool, bool, bool], dpi: float):
+        self.flags = tuple(flags)
+        self.dpi = dpi
+        self.fig = None
+        self.geometry = None
+
+    def _setup(self, grid, extent_dm: float, N: int, step: float, easts, norths, title: str):
+        if self.fig is not None:
+            plt.close(self.fig)
+        self.fig = fig = plt.figure(figsize=FIG_SIZE, facecolor=FIG_BG, dpi=self.dpi)
+        self.ax = ax = fig.add_subplot(); ax.set_facecolor(AX_BG)
+        self.included = _add_included_cells(ax, grid, step)
+        self.overlay = _OverlayLayer(ax, grid, N, step, self.flags)
+        self.perimeter, = ax.plot(easts + easts[:1], norths + norths[:1], linewidth=PERIMETER_WIDTH,
+                                  color=PERIMETER_COLOR, zorder=Z_PERIMETER)
+        self.points = ax.scatter(easts, norths, s=POINT_SIZE, color=POINT_COLOR, zorder=Z_POINTS)
+        self.point_labels = [ax.annotate(str(i), (x0, y0), xytext=(4, 4), textcoords="offset points",
+                                         color=POINTS_LABEL_COLOR, zorder=Z_POINTS + 1)
+                             for i, (x0, y0) in enumerate(zip(easts, norths), start=1)]
+        _add_grid_lines(ax, N, step)
+        ax.set_xlim(0, extent_dm); ax.set_ylim(0, extent_dm)
+        ax.set_aspect("equal", adjustable="box")
+        ax.set_xlabel("East (dm)"); ax.set_ylabel("North (dm)")
+        ax.set_title(title)
+        fig.tight_layout()
+        self.geometry = (N, step, extent_dm)
+
+    def render(self, grid_path: str, io_path: str, out_path: str) -> Dict[str, float]:
+        """Disegna la coppia di ricette in out_path (formato dall'estensione); ritorna i tempi per fase."""
+        t0 = time.perf_counter()
+        io = load_io_recipe(io_path)
+        grid = load_grid_recipe(grid_path)[0]
+        if not grid.present.any():
+            raise SystemExit("nessuna chiave GVL.GPS_Grid_data[..] nel file (non è una ricetta GRIGLIA?)")
+        extent_dm, N, step, easts, norths = _view_params(io)
+        grid = grid.resized(N)
+        validate_included_centers(grid)
+        t1 = time.perf_counter()
+        title = f"Grid, Included Cells and Perimeter (dm)\n{Path(grid_path).name}"
+        if (N, step, extent_dm) != self.geometry:
+            self._setup(grid, extent_dm, N, step, easts, norths, title)
+        else:
+            self.ax.set_title(title)
+            self.included.set_verts(_included_verts(grid, step))
+            self.overlay.set_grid(grid)
+            self.perimeter.set_data(easts + easts[:1], norths + norths[:1])
+            self.points.set_offsets(np.column_stack([easts, norths]))
+            for lab, xy in zip(self.point_labels, zip(easts, norths)):
+                lab.xy = xy
+        self.overlay.update()
+        t2 = time.perf_counter()
+        Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+        self.fig.savefig(out_path, facecolor=FIG_BG)
+        t3 = time.perf_counter()
+        return {"parse": t1 - t0, "draw": t2 - t1, "save": t3 - t2, "total": t3 - t0}
+
+
+# ----------------------------------------------------------- processi del pool
+_RENDERER: Optional[_Renderer] = None
+
+
+def _init_worker(flags: Tuple[bool, bool, bool], dpi: float):
+    global _RENDERER
+    _RENDERER = _Renderer(flags, dpi)
+
+
+def _render_job(job: Job) -> Result:
+    grid_path, io_path, out_path = job
+    try:
+        return grid_path, out_path, _RENDERER.render(grid_path, io_path, out_path), None
+    except SystemExit as e:  # require_* / validate_*: ricetta non valida
+        return grid_path, out_path, {}, str(e)
+    except Exception as e:
+        return grid_path, out_path, {}, f"{type(e).__name__}: {e}"
+
+
+# --------------------------------------------------------------- coppie GRID/IO
+_STAMP_RE = re.compile(r"_(\d{8}-\d{6})$")
+
+
+def _stamp(stem: str) -> Optional[datetime]:
+    m = _STAMP_RE.search(stem)
+    if not m:
+        return None
+    try: return datetime.strptime(m.group(1), "%Y%m%d-%H%M%S")
+    except ValueError: return None
+
+
+def pair_io(grid_path: str | Path) -> Optional[Path]:
+    """File IO da usare con la griglia grid_path (vedi docstring del modulo); None se non trovato."""
+    grid_path = Path(grid_path)
+    grid_stem = Path(getattr(CFG, "LOCAL_RECIPE_FILENAME", "GPS_Grid.txtrecipe")).stem
+    io_name = getattr(CFG, "LOCAL_IO_RECIPE_FILENAME", "IO.txtrecipe")
+    io_stem = Path(io_name).stem
+    if grid_stem in grid_path.stem:
+        same = grid_path.with_name(grid_path.name.replace(grid_stem, io_stem, 1))
+        if same.is_file():
+            return same
+    ts = _stamp(grid_path.stem)
+    if ts is not None:
+        best, best_dt = None, float(getattr(CFG, "RENDER_PAIR_MAX_S", 300))
+        for p in grid_path.parent.glob(f"{io_stem}_*{grid_path.suffix}"):
+            t = _stamp(p.stem)
+            if t is not None and abs((t - ts).total_seconds()) <= best_dt:
+                best, best_dt = p, abs((t - ts).total_seconds())
+        if best is not None:
+            return best
+    current = grid_path.with_name(io_name)
+    return current if current.is_file() else None
+
+
+# ------------------------------------------------------------------------ API
+def render_files(grid_paths: Sequence[str], io_path: str | None = None, out_dir: str | None = None,
+                 fmt: str | None = None, workers: int | None = None, dpi: float | None = None,
+                 flags: Tuple[bool, bool, bool] | None = None, verbose: bool = True) -> List[Result]:
+    """Rende ogni griglia (con io_path o con l'IO trovato da pair_io) in <out_dir>/<nome>.<fmt>.
+
+    workers (default RENDER_WORKERS, 0 = un processo per CPU) > 1 usa un ProcessPoolExecutor;
+    con 1 tutto gira nel processo corrente. Ritorna (griglia, uscita, tempi, errore) nell'ordine dei file.
+    """
+    fmt = (fmt or getattr(CFG, "RENDER_FORMAT", "png")).lower().lstrip(".")
+    dpi = dpi or getattr(CFG, "RENDER_DPI", 100)
+    if flags is None:
+        flags = (getattr(CFG, "SHOW_PATH_INDEX", True), getattr(CFG, "SHOW_LAST_DEPTH", False),
+                 getattr(CFG, "SHOW_TARGET_DEPTH", False))
+    workers = workers if workers is not None else getattr(CFG, "RENDER_WORKERS", 0)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(grid_paths) or 1))
+
+    jobs: List[Job] = []
+    results: Dict[str, Result] = {}
+    for g in grid_paths:
+        g = str(g)
+        io = io_path or pair_io(g)
+        out = str(Path(out_dir or Path(g).parent) / f"{Path(g).stem}.{fmt}")
+        if io is None:
+            results[g] = (g, out, {}, "file IO non trovato (usare --io)")
+            if verbose: _print_result(results[g])
+        else:
+            jobs.append((g, str(io), out))
+
+    t0 = time.perf_counter()
+    if workers == 1:
+        _init_worker(flags, dpi)
+        done = map(_render_job, jobs)
+    else:
+        ex = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(flags, dpi))
+        done = (f.result() for f in as_completed([ex.submit(_render_job, j) for j in jobs]))
+    try:
+        for res in done:
+            results[res[0]] = res
+            if verbose:
+                _print_result(res)
+    finally:
+        if workers > 1:
+            ex.shutdown()
+    ordered = [results[str(g)] for g in grid_paths]
+    if verbose:
+        ok = [r for r in ordered if r[3] is None]
+        busy = sum(r[2]["total"] for r in ok)
+        print(f"[render] {len(ok)}/{len(ordered)} file, processi={workers}, "
+              f"totale {time.perf_counter() - t0:.2f} s (somma per file {busy:.2f} s)")
+    return ordered
+
+
+def _print_result(res: Result):
+    grid_path, out, t, err = res
+    if err:
+        print(f"[render] ERRORE {grid_path}: {err}")
+    else:
+        print(f"[render] {Path(grid_path).name} -> {out}  parse {t['parse']:.2f} s, disegno {t['draw']:.2f} s, "
+              f"salvataggio {t['save']:.2f} s")
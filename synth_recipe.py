@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""Ricette sintetiche GPS_Grid / IO di qualsiasi dimensione (benchmark, prove su campi grandi).
+
+La griglia ha lo stesso formato del file del PLC: 9 righe GVL.GPS_Grid_data[x][y].* per cella,
+nello stesso ordine; centri = round((i + 0.5) * passo). Included = celle col centro dentro il
+quadrilatero dei 4 punti di riferimento (dimensionato per avvicinare included_ratio), Path_Index
+serpentino sulle celle incluse, profondità lette solo sulle celle incluse. Una frazione `noise`
+delle righe usa le altre forme che il parser accetta: commento di fine riga, esadecimale 16#..,
+TRUE/FALSE in minuscolo.
+L'IO contiene Cfg/Sts coerenti con la griglia più `extra` righe di altri moduli, come il dump reale.
+
+    python synth_recipe.py 400 --out /tmp/campo
+"""
+from __future__ import annotations
+import argparse, math
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+STEP_DM = 11.28          # passo della ricetta di esempio (25×25 su 282 dm)
+INCLUDED_RATIO = 0.58    # ~361/625 nella ricetta di esempio
+
+# ordine delle proprietà nel file del PLC
+_PROPS = ("Included", "Path_Index", "First_Depth_Read_cm", "Last_Depth_Read_cm", "Target_Depth_cm",
+          "Center_Relative_North_dm", "Center_Relative_East_dm", "Edges_Crossed", "Error")
+
+
+def ref_points(N: int, step: float = STEP_DM, included_ratio: float = INCLUDED_RATIO) -> List[Tuple[float, float]]:
+    """4 punti (east, north) di un quadrilatero leggermente irregolare con area ≈ included_ratio del campo."""
+    ext = N * step
+    half = math.sqrt(max(0.0, min(1.0, included_ratio))) * ext / 2.0
+    c = ext / 2.0
+    jitter = ((0.03, -0.02), (0.02, 0.03), (-0.03, 0.02), (-0.02, -0.03))  # quasi una rotazione: area invariata
+    corners = ((-1, -1), (1, -1), (1, 1), (-1, 1))
+    return [(round(min(ext, max(0.0, c + sx * half + jx * ext)), 1), round(min(ext, max(0.0, c + sy * half + jy * ext)), 1))
+            for (sx, sy), (jx, jy) in zip(corners, jitter)]
+
+
+def io_values(N: int, step: float = STEP_DM, included_ratio: float = INCLUDED_RATIO) -> Dict[str, Any]:
+    """Parametri IO.GPS.Cfg/Sts (già convertiti) per una griglia N×N."""
+    io: Dict[str, Any] = {
+        "IO.GPS.Cfg.Square_Width_Scale_dm": round(N * step),
+        "IO.GPS.Cfg.Num_Grid_Rows_Cols": N,
+        "IO.GPS.Sts.Grid_Cell_Size_dm": step,
+    }
+    for i, (e, n) in enumerate(ref_points(N, step, included_ratio), start=1):
+        io[f"IO.GPS.Cfg.stRef_Points.UTM_East[{i}]"] = e
+        io[f"IO.GPS.Cfg.stRef_Points.UTM_North[{i}]"] = n
+    return io
+
+
+def _inside(points: List[Tuple[float, float]], e: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Centri dentro il quadrilatero convesso (punti in senso antiorario)."""
+    ok = np.ones(e.shape, dtype=bool)
+    for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]):
+        ok &= (x1 - x0) * (n - y0) - (y1 - y0) * (e - x0) >= 0
+    return ok
+
+
+def grid_lines(N: int, step: float = STEP_DM, included_ratio: float = INCLUDED_RATIO,
+               noise: float = 0.02, seed: int = 0) -> Iterator[str]:
+    """Righe della ricetta GRID, una colonna x alla volta (memoria O(N) per le stringhe)."""
+    rng = np.random.default_rng(seed)
+    centers = np.rint((np.arange(N) + 0.5) * step).astype(np.int64)
+    pts = ref_points(N, step, included_ratio)
+    path = 0
+    for ix in range(N):
+        inc = _inside(pts, np.full(N, float(centers[ix])), centers.astype(float))
+        order = range(N) if ix % 2 == 0 else range(N - 1, -1, -1)
+        pidx = np.zeros(N, dtype=np.int64)
+        for iy in order:  # serpentino: colonne pari a salire, dispari a scendere
+            if inc[iy]:
+                path += 1; pidx[iy] = path
+        read = inc & (rng.random(N) < 0.7)
+        first = np.where(read, rng.integers(20, 300, N), 0)
+        last = np.where(read, first + rng.integers(-15, 16, N), 0)
+        target = np.where(inc, rng.choice((0, 0, 150, 200, 250), N), 0)
+        edges = np.where(inc, rng.integers(0, 5, N), 0)
+        error = inc & (rng.random(N) < 0.01)
+        odd = rng.random((N, len(_PROPS))) < noise
+        e = int(centers[ix])
+        for iy in range(N):
+            b = f"GVL.GPS_Grid_data[{ix}][{iy}]."
+            vals = ("TRUE" if inc[iy] else "FALSE", pidx[iy], first[iy], last[iy], target[iy],
+                    centers[iy], e, edges[iy], "TRUE" if error[iy] else "FALSE")
+            for j, (prop, v) in enumerate(zip(_PROPS, vals)):
+                v = str(v)
+                if odd[iy, j]:
+                    if v in ("TRUE", "FALSE"): v = v.lower()
+                    elif j == 1: v = f"16#{int(v):X}"
+                    else: v += " // letto"
+                yield f"{b}{prop}:={v}\n"
+
+
+def io_lines(N: int, step: float = STEP_DM, included_ratio: float = INCLUDED_RATIO, extra: int = 1000) -> Iterator[str]:
+    """Righe della ricetta IO: parametri GPS più `extra` righe di altri moduli (ignorate dal viewer)."""
+    for k, v in io_values(N, step, included_ratio).items():
+        yield f"{k}:={v}" + (" // calcolato" if k.startswith("IO.GPS.Sts.") else "") + "\n"
+    yield "IO.GPS.Vis.Show_Grid:=TRUE\n"
+    for i in range(extra):
+        yield (f"IO.Drive[{i % 8}].Param_{i}:=16#{i:04X}\n" if i % 3 == 0 else
+               f"IO.Pump.Log[{i}].Flag:={'TRUE' if i % 2 else 'FALSE'}\n" if i % 3 == 1 else
+               f"IO.Pump.Log[{i}].Value:={i * 0.25} // bar\n")
+
+
+def write_grid_recipe(path: str | Path, N: int, **kw) -> Path:
+    path = Path(path)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.writelines(grid_lines(N, **kw))
+    return path
+
+
+def write_io_recipe(path: str | Path, N: int, **kw) -> Path:
+    path = Path(path)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.writelines(io_lines(N, **kw))
+    return path
+
+
+def write_recipes(out_dir: str | Path, N: int, step: float = STEP_DM, included_ratio: float = INCLUDED_RATIO,
+                  seed: int = 0) -> Tuple[Path, Path]:
+    """Scrive GPS_Grid_<N>.txtrecipe e IO_<N>.txtrecipe in out_dir; ritorna (griglia, io)."""
+    out = Path(out_dir); out.mkdir(parents=True, exist_ok=True)
+    grid = write_grid_recipe(out / f"GPS_Grid_{N}.txtrecipe", N, step=step, included_ratio=included_ratio, seed=seed)
+    io = write_io_recipe(out / f"IO_{N}.txtrecipe", N, step=step, included_ratio=included_ratio)
+    return grid, io
+
+
+def main():
+    ap = argparse.ArgumentParser(prog="synth_recipe", description="Genera ricette GPS_Grid/IO sintetiche N×N")
+    ap.add_argument("n", type=int, nargs="+", help="Lato della griglia (una coppia di file per valore)")
+    ap.add_argument("--out", default=".", help="Cartella di uscita (default: corrente)")
+    ap.add_argument("--step", type=float, default=STEP_DM, help=f"Passo in dm (default: {STEP_DM})")
+    ap.add_argument("--included", type=float, default=INCLUDED_RATIO, help="Frazione di celle Included")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    for N in args.n:
+        grid, io = write_recipes(args.out, N, args.step, args.included, args.seed)
+        print(f"[synth] {grid} ({grid.stat().st_size / 1e6:.1f} MB), {io}")
+
+
+if __name__ == "__main__":
+    main()